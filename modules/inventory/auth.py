@@ -100,6 +100,16 @@ def logout():
     except Exception as e:
         st.warning(f"⚠️ Error al guardar carrito en logout: {str(e)}")
     
+    # Escribir los valores de formularios pendientes antes de cerrar la sesión
+    try:
+        try:
+            from .valores_persistencia import valores_persistencia
+        except ImportError:
+            from valores_persistencia import valores_persistencia
+        valores_persistencia.guardar_pendientes()
+    except Exception as e:
+        st.warning(f"⚠️ Error al guardar valores en logout: {str(e)}")
+    
     # Limpiar todas las variables de sesión relacionadas con autenticación
     keys_to_clear = [
         'usuario_autenticado',
@@ -3,54 +3,85 @@
 
 import json
 import os
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import Dict, List, Any, Optional
 
-# Archivo donde se almacenarán los carritos temporales
+try:
+    from .data.fragmentos import AlmacenFragmentado, bloqueo_archivo
+except ImportError:
+    from data.fragmentos import AlmacenFragmentado, bloqueo_archivo
+
+# Con el backend SQLite los carritos van a la tabla carritos_temporales (ver data/storage.py)
+try:
+    from .data.storage import get_storage_backend, BACKEND_POR_DEFECTO
+except ImportError:
+    from data.storage import get_storage_backend, BACKEND_POR_DEFECTO
+
+# Directorio con un archivo de carritos por (usuario, tienda)
+CARRITOS_DIR = "carritos_temporales"
+# Archivo único de versiones anteriores: se reparte en fragmentos al iniciar
 CARRITOS_FILE = "carritos_temporales.json"
 
 class CarritoPersistencia:
     """
     Maneja la persistencia de carritos temporales por usuario y tienda.
     Permite que los datos del carrito sobrevivan al cierre de sesión.
+    
+    Cada (usuario, tienda) tiene su propio archivo con sus carritos por fecha;
+    las escrituras toman un bloqueo solo de ese archivo y lo reemplazan de
+    forma atómica, así empleados de distintas tiendas no se bloquean ni se
+    pisan los cambios. Con el backend SQLite seleccionado cada carrito es una
+    fila de la base y no se usan los archivos.
     """
     
     def __init__(self):
         self.archivo_carritos = CARRITOS_FILE
-        self._asegurar_archivo_existe()
+        self.almacen = AlmacenFragmentado(CARRITOS_DIR)
+        self.backend = get_storage_backend("sqlite") if BACKEND_POR_DEFECTO == "sqlite" else None
+        if self.backend is None:
+            self._migrar_archivo_unico()
     
-    def _asegurar_archivo_existe(self):
-        """Crea el archivo de carritos si no existe"""
+    def _migrar_archivo_unico(self):
+        """Reparte el archivo único anterior en fragmentos (una sola vez)"""
         if not os.path.exists(self.archivo_carritos):
-            data_inicial = {
-                "version": "1.0",
-                "carritos": {},
-                "ultima_actualizacion": datetime.now().isoformat()
-            }
-            with open(self.archivo_carritos, 'w', encoding='utf-8') as f:
-                json.dump(data_inicial, f, indent=2, ensure_ascii=False)
-    
-    def _cargar_datos(self) -> Dict[str, Any]:
-        """Carga todos los datos de carritos desde el archivo"""
-        try:
-            with open(self.archivo_carritos, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            # Si hay error, recrear archivo
-            self._asegurar_archivo_existe()
-            with open(self.archivo_carritos, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    
-    def _guardar_datos(self, data: Dict[str, Any]) -> bool:
-        """Guarda todos los datos de carritos en el archivo"""
+            return
         try:
-            data["ultima_actualizacion"] = datetime.now().isoformat()
-            with open(self.archivo_carritos, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return True
+            with bloqueo_archivo(self.almacen.directorio_bloqueos / "migracion.lock"):
+                if not os.path.exists(self.archivo_carritos):
+                    return  # Otro proceso ya lo migró
+                with open(self.archivo_carritos, 'r', encoding='utf-8') as f:
+                    carritos = json.load(f).get("carritos", {})
+                
+                por_fragmento = {}
+                for carrito in carritos.values():
+                    if carrito.get("usuario") and carrito.get("tienda_id") and carrito.get("fecha"):
+                        clave = (carrito["usuario"], carrito["tienda_id"])
+                        por_fragmento.setdefault(clave, []).append(carrito)
+                
+                for (usuario, tienda_id), lista in por_fragmento.items():
+                    with self.almacen.modificar(usuario, tienda_id) as data:
+                        self._inicializar_fragmento(data, usuario, tienda_id)
+                        for carrito in lista:
+                            # Si el fragmento ya tiene ese carrito, se conserva el más reciente
+                            actual = data["carritos"].get(carrito["fecha"])
+                            if actual is None or actual.get("ultima_modificacion", "") < carrito.get("ultima_modificacion", ""):
+                                data["carritos"][carrito["fecha"]] = carrito
+                
+                os.replace(self.archivo_carritos, f"{self.archivo_carritos}.migrado")
+                print(f"✅ Carritos migrados a {CARRITOS_DIR}/: {len(carritos)} carritos en {len(por_fragmento)} archivos")
         except Exception as e:
-            print(f"Error guardando carritos: {e}")
-            return False
+            print(f"Error migrando carritos a fragmentos: {e}")
+    
+    @staticmethod
+    def _inicializar_fragmento(data: Dict[str, Any], usuario: str, tienda_id: str):
+        data.setdefault("version", "2.0")
+        data.setdefault("usuario", usuario)
+        data.setdefault("tienda_id", tienda_id)
+        data.setdefault("carritos", {})
+    
+    @staticmethod
+    def _fecha_str(fecha) -> str:
+        return fecha.strftime("%Y-%m-%d") if isinstance(fecha, date) else str(fecha)
     
     def _generar_clave_carrito(self, usuario: str, tienda_id: str, fecha: str) -> str:
         """Genera clave única para identificar un carrito específico"""
@@ -70,9 +101,7 @@ class CarritoPersistencia:
             bool: True si se guardó exitosamente
         """
         try:
-            data = self._cargar_datos()
-            fecha_str = fecha.strftime("%Y-%m-%d") if isinstance(fecha, date) else str(fecha)
-            clave_carrito = self._generar_clave_carrito(usuario, tienda_id, fecha_str)
+            fecha_str = self._fecha_str(fecha)
             
             # Crear estructura del carrito con metadatos
             carrito_completo = {
@@ -85,10 +114,15 @@ class CarritoPersistencia:
                 "activo": True
             }
             
-            # Guardar en la estructura principal
-            data["carritos"][clave_carrito] = carrito_completo
+            if self.backend:
+                return self.backend.save_cart(carrito_completo)
             
-            return self._guardar_datos(data)
+            # Guardar en el fragmento del usuario y la tienda
+            with self.almacen.modificar(usuario, tienda_id) as data:
+                self._inicializar_fragmento(data, usuario, tienda_id)
+                data["carritos"][fecha_str] = carrito_completo
+                data["ultima_actualizacion"] = carrito_completo["ultima_modificacion"]
+            return True
             
         except Exception as e:
             print(f"Error guardando carrito para {usuario}: {e}")
@@ -107,13 +141,13 @@ class CarritoPersistencia:
             List[Dict]: Lista de productos del carrito, vacía si no existe
         """
         try:
-            data = self._cargar_datos()
-            fecha_str = fecha.strftime("%Y-%m-%d") if isinstance(fecha, date) else str(fecha)
-            clave_carrito = self._generar_clave_carrito(usuario, tienda_id, fecha_str)
+            fecha_str = self._fecha_str(fecha)
+            if self.backend:
+                carrito_data = self.backend.get_cart(usuario, tienda_id, fecha_str)
+            else:
+                carrito_data = self.almacen.leer(usuario, tienda_id).get("carritos", {}).get(fecha_str)
             
-            if clave_carrito in data["carritos"]:
-                carrito_data = data["carritos"][clave_carrito]
-                
+            if carrito_data is not None:
                 # Verificar que esté activo y sea de la fecha correcta
                 if carrito_data.get("activo", True) and carrito_data.get("fecha") == fecha_str:
                     return carrito_data.get("productos", [])
@@ -137,16 +171,24 @@ class CarritoPersistencia:
             bool: True si se limpió exitosamente
         """
         try:
-            data = self._cargar_datos()
-            fecha_str = fecha.strftime("%Y-%m-%d") if isinstance(fecha, date) else str(fecha)
-            clave_carrito = self._generar_clave_carrito(usuario, tienda_id, fecha_str)
+            fecha_str = self._fecha_str(fecha)
+            if self.backend:
+                carrito = self.backend.get_cart(usuario, tienda_id, fecha_str)
+                if carrito is None:
+                    return True
+                carrito["activo"] = False
+                carrito["fecha_limpieza"] = datetime.now().isoformat()
+                return self.backend.save_cart(carrito)
             
-            if clave_carrito in data["carritos"]:
-                data["carritos"][clave_carrito]["activo"] = False
-                data["carritos"][clave_carrito]["fecha_limpieza"] = datetime.now().isoformat()
-                return self._guardar_datos(data)
+            if fecha_str not in self.almacen.leer(usuario, tienda_id).get("carritos", {}):
+                return True  # Si no existe, consideramos que ya está "limpio"
             
-            return True  # Si no existe, consideramos que ya está "limpio"
+            with self.almacen.modificar(usuario, tienda_id) as data:
+                carrito = data.get("carritos", {}).get(fecha_str)
+                if carrito is not None:
+                    carrito["activo"] = False
+                    carrito["fecha_limpieza"] = datetime.now().isoformat()
+            return True
             
         except Exception as e:
             print(f"Error limpiando carrito para {usuario}: {e}")
@@ -163,22 +205,20 @@ class CarritoPersistencia:
             Dict con estadísticas de carritos
         """
         try:
-            data = self._cargar_datos()
             carritos_activos = []
             total_productos = 0
             
-            for clave, carrito in data["carritos"].items():
+            for usuario_fragmento, tienda_id, fecha_str, carrito in self._todos_los_carritos(usuario):
                 if carrito.get("activo", True):
-                    if usuario is None or carrito.get("usuario") == usuario:
-                        carritos_activos.append({
-                            "clave": clave,
-                            "usuario": carrito.get("usuario"),
-                            "tienda_id": carrito.get("tienda_id"),
-                            "fecha": carrito.get("fecha"),
-                            "total_productos": carrito.get("total_productos", 0),
-                            "ultima_modificacion": carrito.get("ultima_modificacion")
-                        })
-                        total_productos += carrito.get("total_productos", 0)
+                    carritos_activos.append({
+                        "clave": self._generar_clave_carrito(usuario_fragmento, tienda_id, fecha_str),
+                        "usuario": carrito.get("usuario"),
+                        "tienda_id": carrito.get("tienda_id"),
+                        "fecha": carrito.get("fecha"),
+                        "total_productos": carrito.get("total_productos", 0),
+                        "ultima_modificacion": carrito.get("ultima_modificacion")
+                    })
+                    total_productos += carrito.get("total_productos", 0)
             
             return {
                 "carritos_activos": len(carritos_activos),
@@ -194,6 +234,11 @@ class CarritoPersistencia:
         """
         Limpia carritos más antiguos que el número de días especificado
         
+        Recorre los fragmentos por su fecha de modificación (sin abrirlos): un
+        fragmento sin cambios desde antes del límite se elimina entero; solo
+        los fragmentos más recientes se revisan carrito por carrito, y solo se
+        reescriben los que tenían carritos vencidos.
+        
         Args:
             dias_antiguedad: Número de días para considerar un carrito como antiguo
             
@@ -201,36 +246,61 @@ class CarritoPersistencia:
             int: Número de carritos limpiados
         """
         try:
-            from datetime import timedelta
-            
-            data = self._cargar_datos()
             fecha_limite = datetime.now() - timedelta(days=dias_antiguedad)
+            limite_ts = fecha_limite.timestamp()
             carritos_eliminados = 0
             
-            claves_a_eliminar = []
-            
-            for clave, carrito in data["carritos"].items():
-                try:
-                    fecha_carrito = datetime.fromisoformat(carrito.get("ultima_modificacion", ""))
-                    if fecha_carrito < fecha_limite:
-                        claves_a_eliminar.append(clave)
-                except:
-                    # Si no se puede parsear la fecha, eliminar por seguridad
-                    claves_a_eliminar.append(clave)
-            
-            # Eliminar carritos antiguos
-            for clave in claves_a_eliminar:
-                del data["carritos"][clave]
-                carritos_eliminados += 1
+            if self.backend:
+                vencidos = [(c.get("usuario"), c.get("tienda_id"), c.get("fecha"))
+                            for c in self.backend.query_carts()
+                            if self._carrito_vencido(c, fecha_limite)]
+                return self.backend.delete_carts(vencidos)
             
-            if carritos_eliminados > 0:
-                self._guardar_datos(data)
+            for usuario, tienda_id, entrada in self.almacen.fragmentos():
+                ruta = self.almacen.ruta(usuario, tienda_id)
+                # El archivo se reescribe con cada cambio: su mtime es la última modificación de sus carritos
+                if entrada.stat().st_mtime < limite_ts:
+                    with self.almacen.bloquear(ruta):
+                        if os.path.exists(ruta) and os.stat(ruta).st_mtime < limite_ts:
+                            carritos_eliminados += len(self.almacen.leer_entrada(entrada).get("carritos", {}))
+                            os.remove(ruta)
+                    continue
+                
+                if not any(self._carrito_vencido(c, fecha_limite)
+                           for c in self.almacen.leer_entrada(entrada).get("carritos", {}).values()):
+                    continue
+                
+                with self.almacen.modificar(usuario, tienda_id) as data:
+                    carritos = data.get("carritos", {})
+                    for fecha_str in [f for f, c in carritos.items() if self._carrito_vencido(c, fecha_limite)]:
+                        del carritos[fecha_str]
+                        carritos_eliminados += 1
+                    if not carritos:
+                        data.clear()  # Fragmento vacío: se elimina el archivo
             
             return carritos_eliminados
             
         except Exception as e:
             print(f"Error limpiando carritos antiguos: {e}")
             return 0
+    
+    def _todos_los_carritos(self, usuario: Optional[str] = None):
+        """Genera (usuario, tienda_id, fecha, carrito); con usuario solo se leen sus carritos"""
+        if self.backend:
+            for carrito in self.backend.query_carts(usuario):
+                yield carrito.get("usuario"), carrito.get("tienda_id"), carrito.get("fecha"), carrito
+            return
+        for usuario_fragmento, tienda_id, entrada in self.almacen.fragmentos(usuario):
+            for fecha_str, carrito in self.almacen.leer_entrada(entrada).get("carritos", {}).items():
+                yield usuario_fragmento, tienda_id, fecha_str, carrito
+    
+    @staticmethod
+    def _carrito_vencido(carrito: Dict[str, Any], fecha_limite: datetime) -> bool:
+        try:
+            return datetime.fromisoformat(carrito.get("ultima_modificacion", "")) < fecha_limite
+        except (TypeError, ValueError):
+            # Si no se puede parsear la fecha, eliminar por seguridad
+            return True
 
 # Instancia global del gestor de persistencia
 carrito_persistencia = CarritoPersistencia()
\ No newline at end of file
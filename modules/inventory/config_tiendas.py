@@ -5,11 +5,19 @@ Sistema de Configuración de Tiendas - Netw@rd 2.0
 Gestión de múltiples ubicaciones con IDs únicos
 """
 
+import copy
 import json
 import streamlit as st
 from datetime import datetime
 import os
 
+try:
+    from shared.data_cache import data_cache
+except ImportError:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from shared.data_cache import data_cache
+
 class GestorTiendas:
     def __init__(self, archivo_inventario="inventario.json"):
         self.archivo_inventario = archivo_inventario
@@ -19,9 +27,11 @@ class GestorTiendas:
     def cargar_configuracion(self):
         """Carga la configuración de tiendas desde el JSON"""
         try:
-            with open(self.archivo_inventario, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get("configuracion", {})
+            data = data_cache.load_json(self.archivo_inventario)
+            if data is None:
+                raise FileNotFoundError(self.archivo_inventario)
+            # Copia: la configuración se modifica y se vuelve a guardar
+            return copy.deepcopy(data.get("configuracion", {}))
         except FileNotFoundError:
             return self.crear_configuracion_default()
         except Exception as e:
@@ -139,6 +149,7 @@ class GestorTiendas:
             
             with open(self.archivo_inventario, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
+            data_cache.invalidate(self.archivo_inventario)
                 
         except Exception as e:
             st.error(f"Error guardando configuración: {str(e)}")
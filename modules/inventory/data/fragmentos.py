@@ -0,0 +1,154 @@
+"""
+Almacén JSON fragmentado por (usuario, tienda) con bloqueo de archivos.
+
+Cada par (usuario, tienda) tiene su propio archivo dentro del directorio del
+almacén, así los empleados de distintas tiendas no compiten por un único JSON
+ni se pisan las escrituras. Cada modificación toma un bloqueo exclusivo del
+fragmento (flock en Linux/macOS, msvcrt.locking en Windows), relee, aplica el
+cambio y reemplaza el archivo de forma atómica (temporal + os.replace). Las
+lecturas no necesitan bloqueo: siempre ven un archivo completo.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import quote, unquote
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+SEPARADOR = "__"
+EXTENSION = ".json"
+DIRECTORIO_BLOQUEOS = ".locks"
+
+
+def _codificar(valor: Any) -> str:
+    # "_" también se codifica para que el separador "__" no sea ambiguo
+    return quote(str(valor), safe="").replace("_", "%5F")
+
+
+@contextmanager
+def bloqueo_archivo(ruta: Path):
+    """Bloqueo exclusivo (advisory) sobre un archivo de lock, entre procesos e hilos"""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with open(ruta, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class AlmacenFragmentado:
+    """Documentos JSON, uno por (usuario, tienda), dentro de un directorio"""
+
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self.directorio_bloqueos = self.directorio / DIRECTORIO_BLOQUEOS
+        # Un lock de hilo por fragmento: las sesiones de Streamlit son hilos del
+        # mismo proceso y sin fcntl/msvcrt es la única exclusión disponible
+        self._locks_locales: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def ruta(self, usuario: str, tienda_id: str) -> Path:
+        return self.directorio / f"{_codificar(usuario)}{SEPARADOR}{_codificar(tienda_id)}{EXTENSION}"
+
+    @staticmethod
+    def _identificar(nombre: str) -> Optional[Tuple[str, str]]:
+        """(usuario, tienda_id) a partir del nombre del fragmento"""
+        if not nombre.endswith(EXTENSION):
+            return None
+        partes = nombre[:-len(EXTENSION)].split(SEPARADOR)
+        if len(partes) != 2:
+            return None
+        return unquote(partes[0]), unquote(partes[1])
+
+    @staticmethod
+    def _leer_ruta(ruta: Path) -> Dict[str, Any]:
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def leer(self, usuario: str, tienda_id: str) -> Dict[str, Any]:
+        """Documento del fragmento ({} si no existe)"""
+        return self._leer_ruta(self.ruta(usuario, tienda_id))
+
+    @contextmanager
+    def bloquear(self, ruta: Path):
+        """Bloqueo exclusivo de un fragmento (solo ese fragmento, no el almacén)"""
+        with self._locks_guard:
+            lock_local = self._locks_locales.setdefault(ruta.name, threading.Lock())
+        with lock_local, bloqueo_archivo(self.directorio_bloqueos / f"{ruta.name}.lock"):
+            yield
+
+    def _escribir(self, ruta: Path, data: Dict[str, Any]):
+        """Escritura atómica: temporal en el mismo directorio + os.replace"""
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, ruta)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    @contextmanager
+    def modificar(self, usuario: str, tienda_id: str):
+        """
+        Lectura-modificación-escritura del fragmento bajo bloqueo exclusivo
+
+        El bloque recibe el documento y lo modifica en el lugar; al salir se
+        guarda. Si el documento queda vacío ({}), el fragmento se elimina.
+        """
+        ruta = self.ruta(usuario, tienda_id)
+        with self.bloquear(ruta):
+            data = self._leer_ruta(ruta)
+            yield data
+            if data:
+                self._escribir(ruta, data)
+            elif ruta.exists():
+                os.remove(ruta)
+
+    def fragmentos(self, usuario: Optional[str] = None) -> Iterator[Tuple[str, str, os.DirEntry]]:
+        """
+        Fragmentos existentes como (usuario, tienda_id, entrada del directorio)
+
+        La entrada trae el stat (mtime, tamaño) sin abrir el archivo.
+        """
+        prefijo = f"{_codificar(usuario)}{SEPARADOR}" if usuario is not None else ""
+        try:
+            entradas = list(os.scandir(self.directorio))
+        except FileNotFoundError:
+            return
+        for entrada in entradas:
+            if not entrada.name.startswith(prefijo) or not entrada.is_file():
+                continue
+            identidad = self._identificar(entrada.name)
+            if identidad:
+                yield identidad[0], identidad[1], entrada
+
+    def leer_entrada(self, entrada: os.DirEntry) -> Dict[str, Any]:
+        return self._leer_ruta(Path(entrada.path))
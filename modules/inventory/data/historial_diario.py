@@ -0,0 +1,176 @@
+"""
+Resumen diario del historial de inventario para el backend JSON.
+
+Las métricas del historial (registros, usuarios y productos únicos, días con
+actividad) recorrían todos los registros en cada consulta. Este índice guarda,
+por (día, tienda, tipo de inventario), la cantidad de registros y los
+registros por usuario y por producto: las mismas tablas historial_dia* del
+backend SQLite. Las métricas sin filtro de usuario ni producto se arman con
+los días del rango, sin leer registros.
+
+Igual que el índice de últimos modos, se persiste junto al historial con la
+firma (mtime, tamaño) del archivo que refleja, se actualiza con cada registro
+que se agrega y se reconstruye en una pasada si el historial cambió por otro
+camino.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .ultimo_modo import firma_archivo, iterar_registros
+except ImportError:
+    from ultimo_modo import firma_archivo, iterar_registros
+
+Clave = Tuple[str, Any, Any]
+
+
+class IndiceHistorialDiario:
+    """Registros, usuarios y productos por (día, tienda, tipo de inventario)"""
+
+    def __init__(self, history_file, index_file=None):
+        self.history_file = Path(history_file)
+        self.index_file = Path(index_file) if index_file else self.history_file.with_name("historial_resumen_diario.json")
+        self._lock = threading.RLock()
+        self._dias: Optional[Dict[Clave, Dict[str, Any]]] = None
+        self._firma: Optional[Tuple[int, int]] = None
+
+    def firma_historial(self) -> Optional[Tuple[int, int]]:
+        return firma_archivo(self.history_file)
+
+    @staticmethod
+    def _aplicar(dias: Dict[Clave, Dict[str, Any]], registros: Iterable[Dict[str, Any]]):
+        for registro in registros:
+            if not isinstance(registro, dict):
+                continue
+            # Mismos criterios que el filtro del historial JSON
+            clave = (str(registro.get("fecha", ""))[:10], registro.get("tienda_id"),
+                     registro.get("tipo_inventario", "Diario"))
+            datos = dias.get(clave)
+            if datos is None:
+                datos = dias[clave] = {"registros": 0, "usuarios": {}, "productos": {}}
+            datos["registros"] += 1
+            usuario = str(registro.get("usuario") or "")
+            datos["usuarios"][usuario] = datos["usuarios"].get(usuario, 0) + 1
+            if registro.get("producto"):
+                producto = str(registro["producto"])
+                datos["productos"][producto] = datos["productos"].get(producto, 0) + 1
+
+    def _leer_persistido(self, firma_esperada) -> bool:
+        """Carga el índice guardado si corresponde a firma_esperada"""
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            firma = tuple(data["firma"]) if data.get("firma") else None
+            if firma != firma_esperada:
+                return False
+            self._dias = {
+                (dia, tienda, tipo): {"registros": registros, "usuarios": usuarios, "productos": productos}
+                for dia, tienda, tipo, registros, usuarios, productos in data["dias"]
+            }
+            self._firma = firma
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def _persistir(self):
+        data = {
+            "firma": list(self._firma) if self._firma else None,
+            "dias": [[dia, tienda, tipo, d["registros"], d["usuarios"], d["productos"]]
+                     for (dia, tienda, tipo), d in self._dias.items()]
+        }
+        try:
+            tmp = self.index_file.with_name(self.index_file.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.index_file)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el resumen diario del historial: {e}")
+
+    def reconstruir(self) -> int:
+        """
+        Reconstruye el índice con una pasada por el historial completo
+
+        Returns:
+            Cantidad de días (por tienda y tipo) en el índice
+        """
+        with self._lock:
+            firma = self.firma_historial()
+            dias: Dict[Clave, Dict[str, Any]] = {}
+            if firma is not None:
+                try:
+                    self._aplicar(dias, iterar_registros(self.history_file))
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ No se pudo leer el historial para el resumen diario: {e}")
+            self._dias, self._firma = dias, firma
+            self._persistir()
+            return len(dias)
+
+    def _vigente(self):
+        """Deja en memoria un índice que refleje el historial actual"""
+        if self._dias is not None and self._firma == self.firma_historial():
+            return
+        if not self._leer_persistido(self.firma_historial()):
+            self.reconstruir()
+
+    def registrar(self, registros: Iterable[Dict[str, Any]], firma_previa: Optional[Tuple[int, int]]):
+        """
+        Actualiza el índice después de agregar registros al historial
+
+        Args:
+            registros: Registros recién agregados (ya escritos en el historial)
+            firma_previa: Firma del historial antes de escribirlos
+        """
+        with self._lock:
+            if self._dias is None:
+                self._leer_persistido(firma_previa)
+            if self._dias is not None and self._firma == firma_previa:
+                self._aplicar(self._dias, registros)
+                self._firma = self.firma_historial()
+                self._persistir()
+            else:
+                self.reconstruir()
+
+    def _dias_filtrados(self, tienda_id: Optional[str], inicio: Optional[str], fin: Optional[str],
+                        tipo_inventario: Optional[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        """(día, totales) de las claves dentro del filtro; fin es inclusivo"""
+        self._vigente()
+        return [
+            (dia, datos) for (dia, tienda, tipo), datos in self._dias.items()
+            if (not tienda_id or tienda == tienda_id)
+            and (inicio is None or dia >= inicio)
+            and (fin is None or dia <= fin)
+            and (not tipo_inventario or tipo == tipo_inventario)
+        ]
+
+    def metricas(self, tienda_id: Optional[str] = None, inicio: Optional[str] = None,
+                 fin: Optional[str] = None, tipo_inventario: Optional[str] = None) -> Dict[str, int]:
+        """Totales, usuarios y productos únicos y días con actividad del rango"""
+        with self._lock:
+            total, usuarios, productos, dias = 0, set(), set(), set()
+            for dia, datos in self._dias_filtrados(tienda_id, inicio, fin, tipo_inventario):
+                total += datos["registros"]
+                usuarios.update(datos["usuarios"])
+                productos.update(datos["productos"])
+                dias.add(dia)
+            return {"total_records": total, "unique_users": len(usuarios),
+                    "unique_products": len(productos), "active_days": len(dias)}
+
+    def distintos(self, campo: str) -> List[str]:
+        """Valores distintos (no vacíos) de 'usuario', 'tienda_id' o 'producto'"""
+        if campo not in ("usuario", "tienda_id", "producto"):
+            raise ValueError(f"Campo no soportado: {campo}")
+        with self._lock:
+            self._vigente()
+            valores = set()
+            for (_, tienda, _), datos in self._dias.items():
+                if campo == "tienda_id":
+                    if tienda:
+                        valores.add(tienda)
+                elif campo == "usuario":
+                    valores.update(u for u in datos["usuarios"] if u)
+                else:
+                    valores.update(datos["productos"])
+            return sorted(valores)
@@ -2,36 +2,36 @@
 Sistema de gestión de historial.
 Maneja el registro y consulta del historial de operaciones.
 """
+import base64
 import json
 import os
+from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
 import pandas as pd
 
 from ..core.data_models import InventoryRecord, DeliveryRecord
+from .storage import get_storage_backend, StorageBackend
 
 class HistoryManager:
     """Gestor del historial de operaciones"""
     
-    def __init__(self, base_path: str = "."):
+    def __init__(self, base_path: str = ".", backend: Optional[str] = None):
         self.base_path = Path(base_path)
         self.history_file = self.base_path / "historial_inventario.json"
         self.delivery_history_file = self.base_path / "historial_delivery.json"
         
         # Asegurar que el directorio base existe
         self.base_path.mkdir(exist_ok=True)
+        
+        # Backend de almacenamiento ("json" o "sqlite", ver data/storage.py)
+        self.storage: StorageBackend = get_storage_backend(backend, str(self.base_path))
     
     def add_inventory_record(self, record: InventoryRecord) -> bool:
         """Añade registro al historial de inventario"""
         try:
-            history = self.load_inventory_history()
-            history.append(record.to_dict())
-            
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
-            
-            return True
+            return self.storage.append_history([record.to_dict()])
         
         except Exception as e:
             print(f"Error guardando en historial: {e}")
@@ -54,25 +54,35 @@ class HistoryManager:
     
     def load_inventory_history(self) -> List[Dict[str, Any]]:
         """Carga historial de inventario"""
-        if not self.history_file.exists():
-            return []
-        
         try:
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
+            return self.storage.query_history()
+        except Exception as e:
+            print(f"Error cargando historial: {e}")
             return []
     
+    def query_inventory_history(self, tienda_id: Optional[str] = None,
+                                start_date: Optional[date] = None,
+                                end_date: Optional[date] = None,
+                                user: Optional[str] = None,
+                                inventory_type: Optional[str] = None,
+                                product: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Consulta filtrada (indexada con el backend SQLite)"""
+        return self.storage.query_history(
+            tienda_id=tienda_id, fecha_inicio=start_date, fecha_fin=end_date,
+            usuario=user, tipo_inventario=inventory_type, producto=product
+        )
+    
+    def get_store_history(self, tienda_id: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Historial de una tienda en los últimos `days` días"""
+        end_date = date.today()
+        return self.query_inventory_history(
+            tienda_id=tienda_id, start_date=end_date - timedelta(days=days), end_date=end_date
+        )
+    
     def add_delivery_record(self, record: DeliveryRecord) -> bool:
         """Añade registro al historial de delivery"""
         try:
-            history = self.load_delivery_history()
-            history.append(record.to_dict())
-            
-            with open(self.delivery_history_file, "w", encoding="utf-8") as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
-            
-            return True
+            return self.storage.append_delivery(record.to_dict())
         
         except Exception as e:
             print(f"Error guardando venta delivery: {e}")
@@ -92,13 +102,10 @@ class HistoryManager:
     
     def load_delivery_history(self) -> List[Dict[str, Any]]:
         """Carga historial de delivery"""
-        if not self.delivery_history_file.exists():
-            return []
-        
         try:
-            with open(self.delivery_history_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
+            return self.storage.query_deliveries()
+        except Exception as e:
+            print(f"Error cargando historial de delivery: {e}")
             return []
     
     def get_inventory_dataframe(self) -> pd.DataFrame:
@@ -137,6 +144,80 @@ class HistoryManager:
         
         return df
 
+@dataclass
+class HistoryPage:
+    """Página de resultados del historial"""
+    records: List[Dict[str, Any]] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+class HistoryQueryService:
+    """
+    Consultas de historial con filtros aplicados en el backend.
+    
+    Los filtros (usuario, tipo de inventario, rango de fechas y tienda) y el
+    orden se resuelven en el almacenamiento; la paginación es por clave
+    (fecha, id) y devuelve un cursor opaco para pedir la página siguiente.
+    """
+    
+    def __init__(self, history_manager: Optional[HistoryManager] = None):
+        self._history = history_manager or HistoryManager()
+        self.storage = self._history.storage
+    
+    @staticmethod
+    def _build_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+        """Traduce los filtros de la UI a los del backend"""
+        return {
+            "usuario": filters.get("user"),
+            "tipo_inventario": filters.get("inventory_type"),
+            "fecha_inicio": filters.get("start_date"),
+            "fecha_fin": filters.get("end_date"),
+            "tienda_id": filters.get("store"),
+            "producto": filters.get("product"),
+        }
+    
+    @staticmethod
+    def encode_cursor(record: Dict[str, Any]) -> str:
+        clave = json.dumps([str(record.get("fecha", "")), record["_id"]])
+        return base64.urlsafe_b64encode(clave.encode("utf-8")).decode("ascii")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        fecha, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return fecha, record_id
+    
+    def query(self, filters: Dict[str, Any], newest_first: bool = True,
+              limit: int = 50, cursor: Optional[str] = None) -> HistoryPage:
+        """Devuelve una página de registros y el cursor de la siguiente"""
+        after = self.decode_cursor(cursor) if cursor else None
+        # Se pide un registro extra para saber si hay más páginas
+        records = self.storage.query_history_page(
+            self._build_filters(filters), descendente=newest_first,
+            limite=limit + 1, despues_de=after
+        )
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = self.encode_cursor(records[-1])
+        return HistoryPage(records=records, next_cursor=next_cursor)
+    
+    def metrics(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+        """Métricas del período desde los contadores pre-agregados"""
+        metrics = self.storage.history_metrics(self._build_filters(filters))
+        start_date, end_date = filters.get("start_date"), filters.get("end_date")
+        days = (end_date - start_date).days if start_date and end_date else metrics["active_days"]
+        metrics["avg_per_day"] = metrics["total_records"] / max(days, 1)
+        return metrics
+    
+    def users(self) -> List[str]:
+        return self.storage.history_distinct("usuario")
+    
+    def stores(self) -> List[str]:
+        return self.storage.history_distinct("tienda_id")
+
 class HistoryFilter:
     """Filtros para consultas de historial"""
     
@@ -0,0 +1,232 @@
+"""
+Journal del inventario: snapshot materializado + cola de cambios.
+
+inventario.json guarda el inventario materializado e inventario.log.jsonl los
+cambios posteriores, una línea JSON compacta por guardado. Todo el que escribe
+(persistencia.py y el backend JSON de storage.py) pasa por este módulo: un
+solo bloqueo por journal, reentrante dentro del proceso, que además toma un
+bloqueo de archivo para excluir a otros procesos. La compactación (reescribir
+el snapshot y vaciar el journal) se hace únicamente con `compactar`.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    from .fragmentos import bloqueo_archivo
+except ImportError:
+    from fragmentos import bloqueo_archivo
+
+try:
+    from shared.data_cache import data_cache
+except ImportError:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+    from shared.data_cache import data_cache
+
+CATEGORIAS = ["Impulsivo", "Por Kilos", "Extras"]
+# Nombre del journal, al lado del snapshot
+NOMBRE_JOURNAL = "inventario.log.jsonl"
+# Cantidad de registros en el journal a partir de la cual se materializa el snapshot
+UMBRAL_COMPACTACION = 200
+
+
+def estructura_vacia() -> Dict[str, Any]:
+    return {categoria: {} for categoria in CATEGORIAS}
+
+
+def ruta_journal(ruta_snapshot) -> Path:
+    """Journal que acompaña a un snapshot de inventario"""
+    return Path(ruta_snapshot).with_name(NOMBRE_JOURNAL)
+
+
+def aplicar_cambios_tienda(data: Dict[str, Any], tienda_id: str, inventario: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica ACUMULATIVAMENTE los productos de `inventario` sobre la tienda"""
+    tiendas = data.setdefault("inventario_por_tienda", {})
+    inventario_actual = tiendas.get(tienda_id)
+    if not isinstance(inventario_actual, dict):
+        inventario_actual = estructura_vacia()
+        tiendas[tienda_id] = inventario_actual
+
+    for categoria in CATEGORIAS:
+        if categoria not in inventario_actual:
+            inventario_actual[categoria] = {}
+        if categoria in inventario and isinstance(inventario[categoria], dict):
+            for producto, cantidad in inventario[categoria].items():
+                inventario_actual[categoria][producto] = cantidad
+    return inventario_actual
+
+
+def aplicar_registro(data: Dict[str, Any], registro: Dict[str, Any]):
+    """
+    Reaplica un registro del journal sobre el documento en memoria
+
+    Claves: "t" tienda (None = inventario global), "d" productos a fijar,
+    "b" productos a quitar por categoría, "f" fecha de guardado.
+    """
+    if registro.get("t"):
+        inventario = aplicar_cambios_tienda(data, registro["t"], registro.get("d", {}))
+        for categoria, productos in registro.get("b", {}).items():
+            for producto in productos:
+                inventario.get(categoria, {}).pop(producto, None)
+    else:
+        data["inventario_global"] = registro.get("d", {})
+    if registro.get("f"):
+        data["ultima_fecha_guardado"] = registro["f"]
+
+
+def parsear_journal(ruta) -> List[Dict[str, Any]]:
+    """Lee los registros del journal; ignora una última línea truncada por un corte"""
+    registros = []
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                registros.append(json.loads(linea))
+            except json.JSONDecodeError:
+                print(f"⚠️ Registro de journal inválido ignorado en {ruta}")
+    return registros
+
+
+class _BloqueoJournal:
+    """Lock reentrante de hilo + bloqueo de archivo, tomado solo en la primera entrada"""
+
+    def __init__(self, ruta_lock: Path):
+        self.ruta_lock = ruta_lock
+        self._lock = threading.RLock()
+        self._profundidad = 0
+        self._archivo = None
+        # Registros en el journal según este proceso (None = sin contar todavía)
+        self.registros: Optional[int] = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._profundidad == 0:
+            try:
+                self._archivo = bloqueo_archivo(self.ruta_lock)
+                self._archivo.__enter__()
+            except BaseException:
+                self._archivo = None
+                self._lock.release()
+                raise
+        self._profundidad += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._profundidad -= 1
+        try:
+            if self._profundidad == 0:
+                archivo, self._archivo = self._archivo, None
+                archivo.__exit__(*exc)
+        finally:
+            self._lock.release()
+        return False
+
+
+_bloqueos: Dict[str, _BloqueoJournal] = {}
+_bloqueos_guard = threading.Lock()
+
+
+def bloqueo_journal(ruta_log) -> _BloqueoJournal:
+    """Bloqueo exclusivo del journal (el mismo objeto para la misma ruta en todo el proceso)"""
+    clave = os.path.abspath(str(ruta_log))
+    with _bloqueos_guard:
+        bloqueo = _bloqueos.get(clave)
+        if bloqueo is None:
+            bloqueo = _BloqueoJournal(Path(f"{clave}.lock"))
+            _bloqueos[clave] = bloqueo
+        return bloqueo
+
+
+def agregar_registro(ruta_log, registro: Dict[str, Any]) -> int:
+    """
+    Agrega un registro compacto al final del journal
+
+    Returns:
+        Registros en el journal (estimación de este proceso, para decidir
+        cuándo compactar)
+    """
+    bloqueo = bloqueo_journal(ruta_log)
+    with bloqueo:
+        with open(ruta_log, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        data_cache.invalidate(ruta_log)
+        if bloqueo.registros is None:
+            bloqueo.registros = len(parsear_journal(ruta_log))
+        else:
+            bloqueo.registros += 1
+        return bloqueo.registros
+
+
+def escribir_snapshot(ruta_snapshot, data: Dict[str, Any]):
+    """Escribe el snapshot de forma atómica (archivo temporal + rename)"""
+    tmp_file = f"{ruta_snapshot}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, ruta_snapshot)
+    data_cache.invalidate(ruta_snapshot)
+
+
+def _leer_snapshot(ruta_snapshot) -> Optional[Dict[str, Any]]:
+    try:
+        with open(ruta_snapshot, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def cargar_documento(ruta_snapshot, ruta_log=None) -> Optional[Dict[str, Any]]:
+    """
+    Snapshot + cola del journal, leídos del disco (None si no hay ninguno)
+
+    El documento devuelto es propio del llamador: se puede modificar.
+    """
+    ruta_log = ruta_log or ruta_journal(ruta_snapshot)
+    with bloqueo_journal(ruta_log):
+        data = _leer_snapshot(ruta_snapshot)
+        registros = parsear_journal(ruta_log) if os.path.exists(ruta_log) else []
+    if data is None and not registros:
+        return None
+    data = data or {}
+    for registro in registros:
+        aplicar_registro(data, registro)
+    return data
+
+
+def compactar(ruta_snapshot, ruta_log=None, data: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Materializa el inventario en el snapshot y vacía el journal
+
+    Sin `data` se aplica el journal sobre el snapshot actual; con `data` el
+    documento recibido reemplaza al inventario completo. Es idempotente: si el
+    proceso se corta entre la escritura del snapshot y el truncado del journal,
+    reaplicar los registros produce el mismo resultado.
+
+    Returns:
+        Cantidad de registros del journal que se aplicaron
+    """
+    ruta_log = ruta_log or ruta_journal(ruta_snapshot)
+    bloqueo = bloqueo_journal(ruta_log)
+    with bloqueo:
+        registros = parsear_journal(ruta_log) if os.path.exists(ruta_log) else []
+        if data is None:
+            data = _leer_snapshot(ruta_snapshot) or {}
+            for registro in registros:
+                aplicar_registro(data, registro)
+            if registros or not os.path.exists(ruta_snapshot):
+                escribir_snapshot(ruta_snapshot, data)
+        else:
+            escribir_snapshot(ruta_snapshot, data)
+        if os.path.exists(ruta_log):
+            open(ruta_log, "w", encoding="utf-8").close()
+            data_cache.invalidate(ruta_log)
+        bloqueo.registros = 0
+        return len(registros)
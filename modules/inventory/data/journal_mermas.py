@@ -0,0 +1,139 @@
+"""
+Journal de mermas: snapshot + cola de altas y bajas.
+
+mermas_rupturas.json guarda los registros por tienda (listas, el formato de
+siempre) con los contadores de ID y los resúmenes; mermas_rupturas.log.jsonl
+los cambios posteriores, una línea compacta por alta ("a") o baja ("d").
+Registrar o eliminar una merma agrega una línea: el snapshot se reescribe
+solo al compactar. El bloqueo, la escritura de líneas y la compactación son
+los del journal del inventario.
+
+En memoria los registros de cada tienda son un diccionario id → registro
+(en orden de alta), así una baja no corre posiciones.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .journal_inventario import bloqueo_journal
+except ImportError:
+    from journal_inventario import bloqueo_journal
+
+# Nombre del journal, al lado del snapshot
+NOMBRE_JOURNAL = "mermas_rupturas.log.jsonl"
+# Cantidad de cambios en el journal a partir de la cual se reescribe el snapshot
+UMBRAL_COMPACTACION = 200
+
+
+def ruta_journal(ruta_snapshot) -> Path:
+    """Journal que acompaña al archivo de mermas"""
+    return Path(ruta_snapshot).with_name(NOMBRE_JOURNAL)
+
+
+def leer_snapshot(ruta_snapshot) -> Optional[Dict[str, Any]]:
+    try:
+        with open(ruta_snapshot, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def indexar_snapshot(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Estado en memoria a partir del snapshot (listas → diccionarios por ID)
+
+    Los IDs repetidos de la numeración anterior (len + 1) conservan el primer
+    registro; los siguientes reciben un ID nuevo de la tienda.
+    """
+    estado = {clave: valor for clave, valor in data.items() if clave != "mermas_por_tienda"}
+    siguientes = estado["siguiente_id"] = dict(data.get("siguiente_id", {}))
+    por_tienda = estado["mermas_por_tienda"] = {}
+    for tienda_id, lista in data.get("mermas_por_tienda", {}).items():
+        ids = [m.get("id") for m in lista if isinstance(m.get("id"), int)]
+        siguientes[tienda_id] = max(siguientes.get(tienda_id, 1), max(ids, default=0) + 1)
+        mermas = por_tienda[tienda_id] = {}
+        for merma in lista:
+            merma_id = merma.get("id")
+            if merma_id in mermas:
+                merma_id = siguientes[tienda_id]
+                siguientes[tienda_id] += 1
+                merma = dict(merma, id=merma_id)
+            mermas[merma_id] = merma
+    return estado
+
+
+def documento_snapshot(estado: Dict[str, Any]) -> Dict[str, Any]:
+    """Formato del archivo (listas por tienda) a partir del estado en memoria"""
+    data = {clave: valor for clave, valor in estado.items() if clave != "mermas_por_tienda"}
+    data["mermas_por_tienda"] = {
+        tienda_id: list(mermas.values()) for tienda_id, mermas in estado["mermas_por_tienda"].items()
+    }
+    data["total_registros"] = sum(len(mermas) for mermas in estado["mermas_por_tienda"].values())
+    return data
+
+
+def aplicar_registro(estado: Dict[str, Any], registro: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any], int]]:
+    """
+    Reaplica un registro del journal sobre el estado en memoria
+
+    Claves: "o" operación ("a" alta, "d" baja), "t" tienda, "m" merma (alta),
+    "i" ID (baja).
+
+    Returns:
+        (tienda_id, merma, signo) del cambio aplicado, para los resúmenes;
+        None si el registro no cambió nada
+    """
+    tienda_id = registro.get("t")
+    mermas = estado["mermas_por_tienda"].setdefault(tienda_id, {})
+    if registro.get("o") == "a":
+        merma = registro["m"]
+        mermas[merma["id"]] = merma
+        siguientes = estado["siguiente_id"]
+        siguientes[tienda_id] = max(siguientes.get(tienda_id, 1), merma["id"] + 1)
+        return tienda_id, merma, 1
+    if registro.get("o") == "d":
+        merma = mermas.pop(registro.get("i"), None)
+        if merma is not None:
+            return tienda_id, merma, -1
+    return None
+
+
+def leer_registros(ruta_log, desde: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Registros del journal a partir de la posición `desde` (en bytes)
+
+    Solo se consumen líneas completas: una última línea a medio escribir se
+    vuelve a leer en la próxima llamada.
+
+    Returns:
+        (registros, posición hasta la que se leyó)
+    """
+    try:
+        with open(ruta_log, "rb") as f:
+            f.seek(desde)
+            contenido = f.read()
+    except FileNotFoundError:
+        return [], 0
+    fin = contenido.rfind(b"\n") + 1
+    registros = []
+    for linea in contenido[:fin].splitlines():
+        if not linea.strip():
+            continue
+        try:
+            registros.append(json.loads(linea))
+        except json.JSONDecodeError:
+            print(f"⚠️ Registro de journal inválido ignorado en {ruta_log}")
+    return registros, desde + fin
+
+
+def cargar_documento(ruta_snapshot) -> Dict[str, Any]:
+    """Estado en memoria (snapshot + journal) leído del disco; vacío si no hay archivos"""
+    ruta_log = ruta_journal(ruta_snapshot)
+    with bloqueo_journal(ruta_log):
+        estado = indexar_snapshot(leer_snapshot(ruta_snapshot) or {})
+        registros, _ = leer_registros(ruta_log) if os.path.exists(ruta_log) else ([], 0)
+    for registro in registros:
+        aplicar_registro(estado, registro)
+    return estado
@@ -24,10 +24,15 @@ except ImportError:
         class DeliveryRecord:
             pass
 
+try:
+    from .storage import get_storage_backend, StorageBackend
+except ImportError:
+    from storage import get_storage_backend, StorageBackend
+
 class DataPersistence:
     """Gestor principal de persistencia de datos"""
     
-    def __init__(self, base_path: str = "."):
+    def __init__(self, base_path: str = ".", backend: Optional[str] = None):
         self.base_path = Path(base_path)
         self.inventory_file = self.base_path / "inventario.json"
         self.delivery_catalog_file = self.base_path / "catalogo_delivery.json"
@@ -35,30 +40,45 @@ class DataPersistence:
         
         # Asegurar que el directorio base existe
         self.base_path.mkdir(exist_ok=True)
+        
+        # Backend de almacenamiento ("json" o "sqlite", ver data/storage.py)
+        self.storage: StorageBackend = get_storage_backend(backend, str(self.base_path))
     
     def load_inventory(self) -> Dict[str, Any]:
-        """Carga inventario desde archivo"""
-        if not self.inventory_file.exists():
-            return self._create_default_inventory()
+        """
+        Carga inventario desde el backend configurado
         
+        Si no hay datos (snapshot y journal vacíos, o base sin stock) o la
+        lectura falla, devuelve el inventario por defecto SIN guardarlo: un
+        guardado completo reemplazaría el snapshot y vaciaría el journal.
+        """
         try:
-            with open(self.inventory_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
+            data = self.storage.load_inventory_document()
+        except Exception as e:
+            print(f"Error cargando inventario: {e}")
+            return self._create_default_inventory()
+        if not any(data.values()):
             return self._create_default_inventory()
+        return data
     
     def save_inventory(self, inventory: Dict[str, Any]) -> bool:
-        """Guarda inventario en archivo"""
+        """Guarda inventario en el backend configurado"""
         try:
-            with open(self.inventory_file, "w", encoding="utf-8") as f:
-                json.dump(inventory, f, indent=2, ensure_ascii=False)
-            return True
+            return self.storage.save_inventory_document(inventory)
         except Exception as e:
             print(f"Error guardando inventario: {e}")
             return False
     
+    def load_store_inventory(self, tienda_id: str) -> Dict[str, Any]:
+        """Carga el inventario de una sola tienda"""
+        return self.storage.load_store_inventory(tienda_id)
+    
+    def save_store_inventory(self, tienda_id: str, cambios: Dict[str, Any]) -> bool:
+        """Actualiza solo los productos indicados de una tienda"""
+        return self.storage.update_store_inventory(tienda_id, cambios)
+    
     def _create_default_inventory(self) -> Dict[str, Any]:
-        """Crea inventario por defecto"""
+        """Inventario por defecto (no se guarda)"""
         default = {
             "Impulsivo": {
                 "Caja almendrado": 0,
@@ -79,9 +99,6 @@ class DataPersistence:
                 "Cucharitas": 0
             }
         }
-        
-        # Guardar inventario por defecto
-        self.save_inventory(default)
         return default
     
     def load_delivery_catalog(self) -> List[Dict[str, Any]]:
@@ -0,0 +1,1188 @@
+"""
+Backends de almacenamiento para el módulo de inventario.
+Permite elegir entre archivos JSON (instalaciones pequeñas) y SQLite.
+
+Con SQLite también van a la base las mermas (MermasManager), los carritos
+temporales (CarritoPersistencia) y los valores de formularios
+(ValoresPersistencia); con JSON cada uno de esos gestores conserva sus
+propios archivos, por eso esos métodos solo los implementa el backend SQLite.
+"""
+import heapq
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable
+
+try:
+    from shared.data_cache import data_cache
+except ImportError:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+    from shared.data_cache import data_cache
+
+try:
+    from .ultimo_modo import IndiceUltimoModo, MODOS_UME, SIN_MODO
+    from .historial_diario import IndiceHistorialDiario
+except ImportError:
+    from ultimo_modo import IndiceUltimoModo, MODOS_UME, SIN_MODO
+    from historial_diario import IndiceHistorialDiario
+
+try:
+    from .fragmentos import AlmacenFragmentado
+except ImportError:
+    from fragmentos import AlmacenFragmentado
+
+try:
+    from . import journal_inventario
+    from . import journal_mermas
+except ImportError:
+    import journal_inventario
+    import journal_mermas
+
+# Backend por defecto: "json" o "sqlite"
+BACKEND_POR_DEFECTO = os.getenv("INVENTARIO_BACKEND", "json")
+SQLITE_FILE = "inventario.db"
+
+CATEGORIAS = ["Impulsivo", "Por Kilos", "Extras"]
+
+# Campos con columna propia en la tabla de historial
+CAMPOS_HISTORIAL = ["fecha", "usuario", "categoria", "producto", "cantidad",
+                    "modo", "tipo_inventario", "tienda_id"]
+
+def _estructura_vacia() -> Dict[str, Any]:
+    return {categoria: {} for categoria in CATEGORIAS}
+
+def _fecha_str(valor: Any) -> Optional[str]:
+    if valor is None:
+        return None
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime("%Y-%m-%d")
+    return str(valor)
+
+def _fecha_fin_exclusiva(valor: Any) -> Optional[str]:
+    """Convierte una fecha fin inclusiva en el inicio del día siguiente"""
+    if valor is None:
+        return None
+    if not isinstance(valor, date):
+        valor = datetime.strptime(str(valor)[:10], "%Y-%m-%d").date()
+    elif isinstance(valor, datetime):
+        valor = valor.date()
+    return str(valor + timedelta(days=1))
+
+class StorageBackend:
+    """Interfaz común de los backends de almacenamiento"""
+
+    nombre = "base"
+
+    # Inventario
+    def load_inventory_document(self) -> Dict[str, Any]:
+        """Documento completo: inventario_por_tienda, inventario_global, fechas"""
+        raise NotImplementedError
+
+    def save_inventory_document(self, data: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def load_store_inventory(self, tienda_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def update_store_inventory(self, tienda_id: str, cambios: Dict[str, Any]) -> bool:
+        """Actualiza ACUMULATIVAMENTE solo los productos recibidos"""
+        raise NotImplementedError
+
+    def commit_cart(self, tienda_id: str, cambios: Dict[str, Any],
+                    registros: List[Dict[str, Any]]) -> bool:
+        """Aplica inventario + historial de un carrito en una sola transacción"""
+        raise NotImplementedError
+
+    # Historial
+    def append_history(self, registros: List[Dict[str, Any]]) -> bool:
+        raise NotImplementedError
+
+    def query_history(self, tienda_id: Optional[str] = None, fecha_inicio: Any = None,
+                      fecha_fin: Any = None, usuario: Optional[str] = None,
+                      tipo_inventario: Optional[str] = None,
+                      producto: Optional[str] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def query_history_page(self, filtros: Dict[str, Any], descendente: bool = True,
+                           limite: int = 50, despues_de: Optional[tuple] = None
+                           ) -> List[Dict[str, Any]]:
+        """
+        Página de historial ordenada por (fecha, id) con paginación por clave.
+
+        `despues_de` es la clave (fecha, id) del último registro de la página
+        anterior. Cada registro devuelto incluye "_id" para armar el cursor.
+        """
+        raise NotImplementedError
+
+    def history_metrics(self, filtros: Dict[str, Any]) -> Dict[str, Any]:
+        """Totales, usuarios y productos únicos y días con actividad"""
+        raise NotImplementedError
+
+    def history_distinct(self, campo: str) -> List[str]:
+        """Valores distintos de 'usuario', 'tienda_id' o 'producto'"""
+        raise NotImplementedError
+
+    def last_history_mode(self, tienda_id: Optional[str], categoria: str, producto: str) -> str:
+        """Último UME (Unidad, Caja, Tira) del producto, o "N/A"; sin tienda, entre todas"""
+        raise NotImplementedError
+
+    # Delivery (origen "historial" = historial_delivery.json, "ventas" = ventas_delivery.json)
+    def append_delivery(self, registro: Dict[str, Any], origen: str = "historial") -> bool:
+        raise NotImplementedError
+
+    def query_deliveries(self, fecha_inicio: Any = None, fecha_fin: Any = None,
+                         usuario: Optional[str] = None,
+                         origen: str = "historial") -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    # Mermas (solo SQLite; con JSON las guarda MermasManager)
+    def append_merma(self, registro: Dict[str, Any]) -> Optional[int]:
+        """Agrega la merma con el próximo ID de su tienda (nunca reutilizado); devuelve el ID"""
+        raise NotImplementedError
+
+    def query_mermas(self, tienda_id: Optional[str] = None, fecha_inicio: Any = None,
+                     fecha_fin: Any = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def mermas_summary(self, tienda_id: Optional[str] = None, fecha_inicio: Any = None,
+                       fecha_fin: Any = None) -> Dict[str, Any]:
+        """Totales con desglose por categoría, motivo y producto"""
+        raise NotImplementedError
+
+    def delete_merma(self, tienda_id: str, merma_id: int) -> bool:
+        raise NotImplementedError
+
+    # Carritos temporales (solo SQLite; con JSON los guarda CarritoPersistencia)
+    def get_cart(self, usuario: str, tienda_id: str, fecha: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def save_cart(self, carrito: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def query_carts(self, usuario: Optional[str] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete_carts(self, claves: List[tuple]) -> int:
+        """Elimina carritos por (usuario, tienda_id, fecha)"""
+        raise NotImplementedError
+
+    # Valores de formularios (solo SQLite; con JSON los guarda ValoresPersistencia)
+    def get_values(self, clave: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def save_values(self, valores: Dict[str, Dict[str, Any]]) -> bool:
+        """Guarda varios valores (clave usuario_tienda_fecha) en una sola transacción"""
+        raise NotImplementedError
+
+    def query_values(self) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete_values(self, claves: List[str]) -> int:
+        raise NotImplementedError
+
+class JSONStorageBackend(StorageBackend):
+    """Backend sobre los archivos JSON históricos (mismo formato y nombres)"""
+
+    nombre = "json"
+
+    def __init__(self, base_path: str = "."):
+        self.base_path = Path(base_path)
+        self.inventory_file = self.base_path / "inventario.json"
+        self.inventory_log_file = self.base_path / "inventario.log.jsonl"
+        self.history_file = self.base_path / "historial_inventario.json"
+        self.delivery_file = self.base_path / "historial_delivery.json"
+        self.sales_file = self.base_path / "ventas_delivery.json"
+        self._lock = threading.RLock()
+        self._ultimo_modo = IndiceUltimoModo(self.history_file)
+        # Contadores por día para las métricas (equivalente a las tablas historial_dia* de SQLite)
+        self._historial_diario = IndiceHistorialDiario(self.history_file)
+
+    def _read(self, path: Path, default: Any, fresh: bool = False) -> Any:
+        """
+        Lee un JSON a través de la caché compartida.
+        
+        El resultado cacheado es de solo lectura: quien lo vaya a modificar
+        debe pedir `fresh=True`.
+        """
+        try:
+            return data_cache.load_json(path, default, fresh=fresh)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return default
+
+    def _write(self, path: Path, data: Any) -> bool:
+        """Escritura atómica: archivo temporal + rename"""
+        try:
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, path)
+            data_cache.invalidate(path)
+            return True
+        except Exception as e:
+            print(f"Error guardando {path.name}: {e}")
+            return False
+
+    def _inventory_lock(self):
+        """Bloqueo del journal de inventario, compartido con persistencia.py y otros procesos"""
+        return journal_inventario.bloqueo_journal(self.inventory_log_file)
+
+    def load_inventory_document(self) -> Dict[str, Any]:
+        # Snapshot + cola del journal de persistencia.py
+        try:
+            data = journal_inventario.cargar_documento(self.inventory_file, self.inventory_log_file)
+        except (json.JSONDecodeError, OSError):
+            data = None
+        return data or {
+            "inventario_por_tienda": {},
+            "inventario_global": {},
+        }
+
+    def save_inventory_document(self, data: Dict[str, Any]) -> bool:
+        """Reemplaza el inventario completo (snapshot nuevo y journal vacío)"""
+        try:
+            journal_inventario.compactar(self.inventory_file, self.inventory_log_file, data)
+            return True
+        except Exception as e:
+            print(f"Error guardando {self.inventory_file.name}: {e}")
+            return False
+
+    def load_store_inventory(self, tienda_id: str) -> Dict[str, Any]:
+        data = self.load_inventory_document()
+        return data.get("inventario_por_tienda", {}).get(tienda_id, _estructura_vacia())
+
+    def update_store_inventory(self, tienda_id: str, cambios: Dict[str, Any]) -> bool:
+        # Un registro al final del journal, igual que persistencia.guardar_inventario
+        registro = {"t": tienda_id, "d": cambios, "f": str(date.today())}
+        try:
+            if journal_inventario.agregar_registro(self.inventory_log_file, registro) >= journal_inventario.UMBRAL_COMPACTACION:
+                journal_inventario.compactar(self.inventory_file, self.inventory_log_file)
+            return True
+        except OSError as e:
+            print(f"Error guardando {self.inventory_log_file.name}: {e}")
+            return False
+
+    def commit_cart(self, tienda_id: str, cambios: Dict[str, Any],
+                    registros: List[Dict[str, Any]]) -> bool:
+        with self._lock, self._inventory_lock():
+            historial_previo = self._read(self.history_file, [], fresh=True)
+            if not self.append_history(registros):
+                return False
+            if not self.update_store_inventory(tienda_id, cambios):
+                # Revertir historial para no dejar estado parcial
+                self._write(self.history_file, historial_previo)
+                return False
+            return True
+
+    def append_history(self, registros: List[Dict[str, Any]]) -> bool:
+        with self._lock:
+            historial = self._read(self.history_file, [], fresh=True)
+            historial.extend(registros)
+            firma_previa = self._ultimo_modo.firma_historial()
+            if not self._write(self.history_file, historial):
+                return False
+            self._ultimo_modo.registrar(registros, firma_previa)
+            self._historial_diario.registrar(registros, firma_previa)
+            return True
+
+    def _filtered_history(self, filtros: Dict[str, Any]):
+        """Genera (posición en el archivo, registro) del historial filtrado, sin copiar registros"""
+        inicio = _fecha_str(filtros.get("fecha_inicio"))
+        fin = _fecha_fin_exclusiva(filtros.get("fecha_fin"))
+        for posicion, registro in enumerate(self._read(self.history_file, [])):
+            fecha = str(registro.get("fecha", ""))
+            if filtros.get("tienda_id") and registro.get("tienda_id") != filtros["tienda_id"]:
+                continue
+            if inicio and fecha < inicio:
+                continue
+            if fin and fecha >= fin:
+                continue
+            if filtros.get("usuario") and registro.get("usuario") != filtros["usuario"]:
+                continue
+            if (filtros.get("tipo_inventario")
+                    and registro.get("tipo_inventario", "Diario") != filtros["tipo_inventario"]):
+                continue
+            if filtros.get("producto") and registro.get("producto") != filtros["producto"]:
+                continue
+            yield posicion, registro
+
+    def query_history(self, tienda_id: Optional[str] = None, fecha_inicio: Any = None,
+                      fecha_fin: Any = None, usuario: Optional[str] = None,
+                      tipo_inventario: Optional[str] = None,
+                      producto: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [dict(registro) for _, registro in self._filtered_history({
+            "tienda_id": tienda_id, "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin,
+            "usuario": usuario, "tipo_inventario": tipo_inventario, "producto": producto
+        })]
+
+    def query_history_page(self, filtros: Dict[str, Any], descendente: bool = True,
+                           limite: int = 50, despues_de: Optional[tuple] = None
+                           ) -> List[Dict[str, Any]]:
+        # El archivo no tiene índice por fecha: una pasada por los registros, pero
+        # solo se guardan las claves y se seleccionan los `limite` primeros sin ordenar todo
+        claves = ((str(r.get("fecha", "")), posicion) for posicion, r in self._filtered_history(filtros))
+        if despues_de is not None:
+            despues_de = (despues_de[0], int(despues_de[1]))
+            claves = (c for c in claves if (c < despues_de if descendente else c > despues_de))
+        elegidas = (heapq.nlargest if descendente else heapq.nsmallest)(int(limite), claves)
+        historial = self._read(self.history_file, [])
+        return [dict(historial[posicion], _id=posicion) for _, posicion in elegidas]
+
+    def history_metrics(self, filtros: Dict[str, Any]) -> Dict[str, Any]:
+        if not (filtros.get("usuario") or filtros.get("producto")):
+            # Sin filtro de usuario/producto, todo sale del resumen diario
+            return self._historial_diario.metricas(
+                filtros.get("tienda_id"), _fecha_str(filtros.get("fecha_inicio")),
+                _fecha_str(filtros.get("fecha_fin")), filtros.get("tipo_inventario")
+            )
+        # El resumen diario no cruza usuario con producto: estos filtros recorren los registros
+        usuarios, productos, dias = set(), set(), set()
+        total = 0
+        for _, r in self._filtered_history(filtros):
+            total += 1
+            usuarios.add(r.get("usuario") or "")
+            if r.get("producto"):
+                productos.add(r["producto"])
+            dias.add(str(r.get("fecha", ""))[:10])
+        return {"total_records": total, "unique_users": len(usuarios),
+                "unique_products": len(productos), "active_days": len(dias)}
+
+    def history_distinct(self, campo: str) -> List[str]:
+        return self._historial_diario.distintos(campo)
+
+    def last_history_mode(self, tienda_id: Optional[str], categoria: str, producto: str) -> str:
+        return self._ultimo_modo.obtener(tienda_id, categoria, producto)
+
+    def _delivery_path(self, origen: str) -> Path:
+        return self.sales_file if origen == "ventas" else self.delivery_file
+
+    def append_delivery(self, registro: Dict[str, Any], origen: str = "historial") -> bool:
+        ruta = self._delivery_path(origen)
+        with self._lock:
+            historial = self._read(ruta, [], fresh=True)
+            historial.append(registro)
+            return self._write(ruta, historial)
+
+    def query_deliveries(self, fecha_inicio: Any = None, fecha_fin: Any = None,
+                         usuario: Optional[str] = None,
+                         origen: str = "historial") -> List[Dict[str, Any]]:
+        inicio = _fecha_str(fecha_inicio)
+        fin = _fecha_fin_exclusiva(fecha_fin)
+        return [
+            r for r in self._read(self._delivery_path(origen), [])
+            if (not inicio or str(r.get("fecha", "")) >= inicio)
+            and (not fin or str(r.get("fecha", "")) < fin)
+            and (not usuario or r.get("usuario") == usuario)
+        ]
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    tienda_id TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    producto TEXT NOT NULL,
+    cantidad TEXT NOT NULL,
+    fecha_actualizacion TEXT,
+    PRIMARY KEY (tienda_id, categoria, producto)
+);
+
+CREATE TABLE IF NOT EXISTS documentos (
+    clave TEXT PRIMARY KEY,
+    contenido TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS historial (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tienda_id TEXT,
+    fecha TEXT,
+    usuario TEXT,
+    categoria TEXT,
+    producto TEXT,
+    cantidad TEXT,
+    modo TEXT,
+    tipo_inventario TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_historial_tienda_fecha ON historial (tienda_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_historial_usuario ON historial (usuario);
+CREATE INDEX IF NOT EXISTS idx_historial_producto ON historial (producto);
+CREATE INDEX IF NOT EXISTS idx_historial_fecha ON historial (fecha);
+
+-- Resumen anterior (una fila por día, tienda, tipo, usuario y producto): reemplazado
+DROP TRIGGER IF EXISTS trg_historial_resumen_insert;
+DROP TRIGGER IF EXISTS trg_historial_resumen_delete;
+DROP TABLE IF EXISTS historial_resumen;
+
+-- Métricas del historial pre-agregadas por día: totales en una tabla angosta y,
+-- aparte, los usuarios y productos de cada día para contar los distintos
+CREATE TABLE IF NOT EXISTS historial_dia (
+    dia TEXT NOT NULL,
+    tienda_id TEXT NOT NULL DEFAULT '',
+    tipo_inventario TEXT NOT NULL,
+    registros INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, tienda_id, tipo_inventario)
+);
+CREATE INDEX IF NOT EXISTS idx_historial_dia_tienda ON historial_dia (tienda_id, dia);
+
+CREATE TABLE IF NOT EXISTS historial_dia_usuarios (
+    dia TEXT NOT NULL,
+    tienda_id TEXT NOT NULL DEFAULT '',
+    tipo_inventario TEXT NOT NULL,
+    usuario TEXT NOT NULL DEFAULT '',
+    registros INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, tienda_id, tipo_inventario, usuario)
+);
+CREATE INDEX IF NOT EXISTS idx_historial_dia_usuarios_tienda ON historial_dia_usuarios (tienda_id, dia);
+
+CREATE TABLE IF NOT EXISTS historial_dia_productos (
+    dia TEXT NOT NULL,
+    tienda_id TEXT NOT NULL DEFAULT '',
+    tipo_inventario TEXT NOT NULL,
+    producto TEXT NOT NULL,
+    registros INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, tienda_id, tipo_inventario, producto)
+);
+CREATE INDEX IF NOT EXISTS idx_historial_dia_productos_tienda ON historial_dia_productos (tienda_id, dia);
+
+CREATE TRIGGER IF NOT EXISTS trg_historial_dia_insert AFTER INSERT ON historial
+BEGIN
+    INSERT INTO historial_dia (dia, tienda_id, tipo_inventario, registros)
+    VALUES (substr(NEW.fecha, 1, 10), COALESCE(NEW.tienda_id, ''),
+            COALESCE(NEW.tipo_inventario, 'Diario'), 1)
+    ON CONFLICT (dia, tienda_id, tipo_inventario) DO UPDATE SET registros = registros + 1;
+    INSERT INTO historial_dia_usuarios (dia, tienda_id, tipo_inventario, usuario, registros)
+    VALUES (substr(NEW.fecha, 1, 10), COALESCE(NEW.tienda_id, ''),
+            COALESCE(NEW.tipo_inventario, 'Diario'), COALESCE(NEW.usuario, ''), 1)
+    ON CONFLICT (dia, tienda_id, tipo_inventario, usuario) DO UPDATE SET registros = registros + 1;
+    INSERT INTO historial_dia_productos (dia, tienda_id, tipo_inventario, producto, registros)
+    SELECT substr(NEW.fecha, 1, 10), COALESCE(NEW.tienda_id, ''),
+           COALESCE(NEW.tipo_inventario, 'Diario'), NEW.producto, 1
+    WHERE COALESCE(NEW.producto, '') != ''
+    ON CONFLICT (dia, tienda_id, tipo_inventario, producto) DO UPDATE SET registros = registros + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_historial_dia_delete AFTER DELETE ON historial
+BEGIN
+    UPDATE historial_dia SET registros = registros - 1
+    WHERE dia = substr(OLD.fecha, 1, 10) AND tienda_id = COALESCE(OLD.tienda_id, '')
+      AND tipo_inventario = COALESCE(OLD.tipo_inventario, 'Diario');
+    UPDATE historial_dia_usuarios SET registros = registros - 1
+    WHERE dia = substr(OLD.fecha, 1, 10) AND tienda_id = COALESCE(OLD.tienda_id, '')
+      AND tipo_inventario = COALESCE(OLD.tipo_inventario, 'Diario')
+      AND usuario = COALESCE(OLD.usuario, '');
+    UPDATE historial_dia_productos SET registros = registros - 1
+    WHERE dia = substr(OLD.fecha, 1, 10) AND tienda_id = COALESCE(OLD.tienda_id, '')
+      AND tipo_inventario = COALESCE(OLD.tipo_inventario, 'Diario')
+      AND producto = OLD.producto;
+    DELETE FROM historial_dia WHERE registros <= 0;
+    DELETE FROM historial_dia_usuarios WHERE registros <= 0;
+    DELETE FROM historial_dia_productos WHERE registros <= 0;
+END;
+
+-- Último UME (Unidad, Caja, Tira) por tienda, categoría y producto
+CREATE TABLE IF NOT EXISTS historial_ultimo_modo (
+    categoria TEXT NOT NULL,
+    producto TEXT NOT NULL,
+    tienda_id TEXT NOT NULL DEFAULT '',
+    modo TEXT NOT NULL,
+    historial_id INTEGER NOT NULL,
+    PRIMARY KEY (categoria, producto, tienda_id)
+);
+CREATE INDEX IF NOT EXISTS idx_ultimo_modo_historial ON historial_ultimo_modo (historial_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_historial_ultimo_modo_insert AFTER INSERT ON historial
+WHEN NEW.modo IN ('Unidad', 'Caja', 'Tira') AND NEW.categoria IS NOT NULL AND NEW.producto IS NOT NULL
+BEGIN
+    INSERT INTO historial_ultimo_modo (categoria, producto, tienda_id, modo, historial_id)
+    VALUES (NEW.categoria, NEW.producto, COALESCE(NEW.tienda_id, ''), NEW.modo, NEW.id)
+    ON CONFLICT (categoria, producto, tienda_id)
+    DO UPDATE SET modo = excluded.modo, historial_id = excluded.historial_id
+    WHERE excluded.historial_id > historial_ultimo_modo.historial_id;
+END;
+
+-- Si se borra el registro vigente, pasa a valer el anterior con UME del mismo producto
+CREATE TRIGGER IF NOT EXISTS trg_historial_ultimo_modo_delete AFTER DELETE ON historial
+WHEN OLD.modo IN ('Unidad', 'Caja', 'Tira')
+BEGIN
+    DELETE FROM historial_ultimo_modo WHERE historial_id = OLD.id;
+    INSERT OR IGNORE INTO historial_ultimo_modo (categoria, producto, tienda_id, modo, historial_id)
+    SELECT categoria, producto, COALESCE(tienda_id, ''), modo, id FROM historial
+    WHERE producto = OLD.producto AND categoria = OLD.categoria
+      AND COALESCE(tienda_id, '') = COALESCE(OLD.tienda_id, '')
+      AND modo IN ('Unidad', 'Caja', 'Tira')
+    ORDER BY id DESC LIMIT 1;
+END;
+
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    origen TEXT NOT NULL DEFAULT 'historial',
+    tienda_id TEXT,
+    fecha TEXT,
+    usuario TEXT,
+    producto TEXT,
+    contenido TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_tienda_fecha ON deliveries (tienda_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_deliveries_usuario ON deliveries (usuario);
+CREATE INDEX IF NOT EXISTS idx_deliveries_producto ON deliveries (producto);
+
+-- Mermas: rowid_merma conserva el orden de registro; (tienda_id, id) no es
+-- único porque los archivos anteriores pueden traer IDs repetidos
+CREATE TABLE IF NOT EXISTS mermas (
+    rowid_merma INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER,
+    tienda_id TEXT NOT NULL,
+    fecha TEXT,
+    usuario TEXT,
+    categoria TEXT,
+    producto TEXT,
+    cantidad REAL,
+    motivo TEXT,
+    contenido TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mermas_tienda_fecha ON mermas (tienda_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_mermas_tienda_id ON mermas (tienda_id, id);
+CREATE INDEX IF NOT EXISTS idx_mermas_fecha ON mermas (fecha);
+CREATE INDEX IF NOT EXISTS idx_mermas_usuario ON mermas (usuario);
+CREATE INDEX IF NOT EXISTS idx_mermas_producto ON mermas (producto);
+
+-- Próximo ID de merma por tienda: solo avanza, aunque se eliminen registros
+CREATE TABLE IF NOT EXISTS mermas_secuencia (
+    tienda_id TEXT PRIMARY KEY,
+    siguiente INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS carritos_temporales (
+    usuario TEXT NOT NULL,
+    tienda_id TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    ultima_modificacion TEXT,
+    contenido TEXT NOT NULL,
+    PRIMARY KEY (usuario, tienda_id, fecha)
+);
+CREATE INDEX IF NOT EXISTS idx_carritos_temporales_tienda_fecha ON carritos_temporales (tienda_id, fecha);
+
+CREATE TABLE IF NOT EXISTS valores (
+    clave TEXT PRIMARY KEY,
+    usuario TEXT,
+    tienda_id TEXT,
+    fecha TEXT,
+    contenido TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_valores_tienda_fecha ON valores (tienda_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_valores_usuario ON valores (usuario);
+"""
+
+class SQLiteStorageBackend(StorageBackend):
+    """Backend SQLite con tablas normalizadas e índices por tienda/fecha, usuario y producto"""
+
+    nombre = "sqlite"
+
+    def __init__(self, base_path: str = ".", db_file: str = SQLITE_FILE):
+        self.base_path = Path(base_path)
+        self.base_path.mkdir(exist_ok=True)
+        self.db_path = self.base_path / db_file
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+            # Bases creadas antes de existir el resumen: reconstruirlo una vez
+            resumen_vacio = conn.execute("SELECT 1 FROM historial_dia LIMIT 1").fetchone() is None
+            if resumen_vacio and conn.execute("SELECT 1 FROM historial LIMIT 1").fetchone():
+                self._rebuild_history_rollup(conn)
+            # Ídem para el índice de últimos modos
+            modos_vacio = conn.execute("SELECT 1 FROM historial_ultimo_modo LIMIT 1").fetchone() is None
+            if modos_vacio and conn.execute("SELECT 1 FROM historial LIMIT 1").fetchone():
+                self._rebuild_last_modes(conn)
+
+    @staticmethod
+    def _rebuild_history_rollup(conn: sqlite3.Connection):
+        claves = "substr(fecha, 1, 10), COALESCE(tienda_id, ''), COALESCE(tipo_inventario, 'Diario')"
+        for tabla in ("historial_dia", "historial_dia_usuarios", "historial_dia_productos"):
+            conn.execute(f"DELETE FROM {tabla}")
+        conn.execute(
+            "INSERT INTO historial_dia (dia, tienda_id, tipo_inventario, registros) "
+            f"SELECT {claves}, COUNT(*) FROM historial GROUP BY 1, 2, 3"
+        )
+        conn.execute(
+            "INSERT INTO historial_dia_usuarios (dia, tienda_id, tipo_inventario, usuario, registros) "
+            f"SELECT {claves}, COALESCE(usuario, ''), COUNT(*) FROM historial GROUP BY 1, 2, 3, 4"
+        )
+        conn.execute(
+            "INSERT INTO historial_dia_productos (dia, tienda_id, tipo_inventario, producto, registros) "
+            f"SELECT {claves}, producto, COUNT(*) FROM historial "
+            "WHERE COALESCE(producto, '') != '' GROUP BY 1, 2, 3, 4"
+        )
+
+    @staticmethod
+    def _rebuild_last_modes(conn: sqlite3.Connection):
+        # Con MAX(id), SQLite toma modo de la misma fila que el máximo
+        marcadores = ", ".join("?" for _ in MODOS_UME)
+        conn.execute("DELETE FROM historial_ultimo_modo")
+        conn.execute(
+            "INSERT INTO historial_ultimo_modo (categoria, producto, tienda_id, modo, historial_id) "
+            "SELECT categoria, producto, COALESCE(tienda_id, ''), modo, MAX(id) FROM historial "
+            f"WHERE modo IN ({marcadores}) AND categoria IS NOT NULL AND producto IS NOT NULL "
+            "GROUP BY 1, 2, 3",
+            MODOS_UME
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # Una conexión por hilo (Streamlit atiende cada sesión en su propio hilo)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Inventario
+    def load_inventory_document(self) -> Dict[str, Any]:
+        conn = self._connection()
+        tiendas: Dict[str, Any] = {}
+        for row in conn.execute("SELECT tienda_id, categoria, producto, cantidad FROM stock"):
+            tienda = tiendas.setdefault(row["tienda_id"], _estructura_vacia())
+            tienda.setdefault(row["categoria"], {})[row["producto"]] = json.loads(row["cantidad"])
+        data = {"inventario_por_tienda": tiendas}
+        for row in conn.execute("SELECT clave, contenido FROM documentos"):
+            data[row["clave"]] = json.loads(row["contenido"])
+        data.setdefault("inventario_global", {})
+        return data
+
+    def save_inventory_document(self, data: Dict[str, Any]) -> bool:
+        try:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM stock")
+                for tienda_id, inventario in data.get("inventario_por_tienda", {}).items():
+                    self._upsert_stock(conn, tienda_id, inventario)
+                for clave, valor in data.items():
+                    if clave != "inventario_por_tienda":
+                        conn.execute(
+                            "INSERT OR REPLACE INTO documentos (clave, contenido) VALUES (?, ?)",
+                            (clave, json.dumps(valor, ensure_ascii=False))
+                        )
+            return True
+        except Exception as e:
+            print(f"Error guardando inventario en SQLite: {e}")
+            return False
+
+    def load_store_inventory(self, tienda_id: str) -> Dict[str, Any]:
+        inventario = _estructura_vacia()
+        rows = self._connection().execute(
+            "SELECT categoria, producto, cantidad FROM stock WHERE tienda_id = ?", (tienda_id,)
+        )
+        for row in rows:
+            inventario.setdefault(row["categoria"], {})[row["producto"]] = json.loads(row["cantidad"])
+        return inventario
+
+    def _upsert_stock(self, conn: sqlite3.Connection, tienda_id: str, cambios: Dict[str, Any]):
+        ahora = datetime.now().isoformat()
+        conn.executemany(
+            "INSERT OR REPLACE INTO stock (tienda_id, categoria, producto, cantidad, fecha_actualizacion) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (tienda_id, categoria, producto, json.dumps(cantidad, ensure_ascii=False), ahora)
+                for categoria, productos in cambios.items() if isinstance(productos, dict)
+                for producto, cantidad in productos.items()
+            ]
+        )
+
+    def update_store_inventory(self, tienda_id: str, cambios: Dict[str, Any]) -> bool:
+        try:
+            with self._transaction() as conn:
+                self._upsert_stock(conn, tienda_id, cambios)
+            return True
+        except Exception as e:
+            print(f"Error guardando inventario en SQLite: {e}")
+            return False
+
+    def commit_cart(self, tienda_id: str, cambios: Dict[str, Any],
+                    registros: List[Dict[str, Any]]) -> bool:
+        try:
+            with self._transaction() as conn:
+                self._upsert_stock(conn, tienda_id, cambios)
+                self._insert_history(conn, registros)
+            return True
+        except Exception as e:
+            print(f"Error confirmando carrito en SQLite: {e}")
+            return False
+
+    # Historial
+    def _insert_history(self, conn: sqlite3.Connection, registros: Iterable[Dict[str, Any]]):
+        filas = []
+        for registro in registros:
+            extra = {k: v for k, v in registro.items() if k not in CAMPOS_HISTORIAL}
+            filas.append((
+                registro.get("tienda_id"), str(registro.get("fecha", "")), registro.get("usuario"),
+                registro.get("categoria"), registro.get("producto"),
+                json.dumps(registro.get("cantidad"), ensure_ascii=False),
+                registro.get("modo"), registro.get("tipo_inventario"),
+                json.dumps(extra, ensure_ascii=False) if extra else None
+            ))
+        conn.executemany(
+            "INSERT INTO historial (tienda_id, fecha, usuario, categoria, producto, cantidad, "
+            "modo, tipo_inventario, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            filas
+        )
+
+    def append_history(self, registros: List[Dict[str, Any]]) -> bool:
+        try:
+            with self._transaction() as conn:
+                self._insert_history(conn, registros)
+            return True
+        except Exception as e:
+            print(f"Error guardando historial en SQLite: {e}")
+            return False
+
+    @staticmethod
+    def _row_to_history(row: sqlite3.Row) -> Dict[str, Any]:
+        registro = {
+            "fecha": row["fecha"],
+            "usuario": row["usuario"],
+            "categoria": row["categoria"],
+            "producto": row["producto"],
+            "cantidad": json.loads(row["cantidad"]) if row["cantidad"] is not None else None,
+            "modo": row["modo"],
+            "tipo_inventario": row["tipo_inventario"],
+            "tienda_id": row["tienda_id"],
+        }
+        # Registros antiguos sin tipo/tienda se devuelven igual que en el JSON
+        if registro["tipo_inventario"] is None:
+            del registro["tipo_inventario"]
+        if registro["tienda_id"] is None:
+            del registro["tienda_id"]
+        if row["extra"]:
+            registro.update(json.loads(row["extra"]))
+        return registro
+
+    @staticmethod
+    def _history_conditions(filtros: Dict[str, Any]) -> tuple:
+        condiciones, parametros = [], []
+        if filtros.get("tienda_id"):
+            condiciones.append("tienda_id = ?")
+            parametros.append(filtros["tienda_id"])
+        if filtros.get("fecha_inicio") is not None:
+            condiciones.append("fecha >= ?")
+            parametros.append(_fecha_str(filtros["fecha_inicio"]))
+        if filtros.get("fecha_fin") is not None:
+            condiciones.append("fecha < ?")
+            parametros.append(_fecha_fin_exclusiva(filtros["fecha_fin"]))
+        if filtros.get("usuario"):
+            condiciones.append("usuario = ?")
+            parametros.append(filtros["usuario"])
+        if filtros.get("tipo_inventario"):
+            condiciones.append("COALESCE(tipo_inventario, 'Diario') = ?")
+            parametros.append(filtros["tipo_inventario"])
+        if filtros.get("producto"):
+            condiciones.append("producto = ?")
+            parametros.append(filtros["producto"])
+        return condiciones, parametros
+
+    def query_history(self, tienda_id: Optional[str] = None, fecha_inicio: Any = None,
+                      fecha_fin: Any = None, usuario: Optional[str] = None,
+                      tipo_inventario: Optional[str] = None,
+                      producto: Optional[str] = None) -> List[Dict[str, Any]]:
+        condiciones, parametros = self._history_conditions({
+            "tienda_id": tienda_id, "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin,
+            "usuario": usuario, "tipo_inventario": tipo_inventario, "producto": producto
+        })
+        sql = "SELECT * FROM historial"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY id"
+        return [self._row_to_history(row) for row in self._connection().execute(sql, parametros)]
+
+    def query_history_page(self, filtros: Dict[str, Any], descendente: bool = True,
+                           limite: int = 50, despues_de: Optional[tuple] = None
+                           ) -> List[Dict[str, Any]]:
+        condiciones, parametros = self._history_conditions(filtros)
+        if despues_de is not None:
+            condiciones.append(f"(fecha, id) {'<' if descendente else '>'} (?, ?)")
+            parametros.extend([despues_de[0], int(despues_de[1])])
+        orden = "DESC" if descendente else "ASC"
+        sql = "SELECT * FROM historial"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += f" ORDER BY fecha {orden}, id {orden} LIMIT ?"
+        parametros.append(int(limite))
+        return [dict(self._row_to_history(row), _id=row["id"])
+                for row in self._connection().execute(sql, parametros)]
+
+    def history_metrics(self, filtros: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._connection()
+        if filtros.get("usuario") or filtros.get("producto"):
+            # El resumen diario no cruza usuario con producto: estos filtros van
+            # contra historial, acotados por sus índices de usuario y producto
+            condiciones, parametros = self._history_conditions(filtros)
+            row = conn.execute(
+                "SELECT COUNT(*) AS total, COUNT(DISTINCT COALESCE(usuario, '')) AS usuarios, "
+                "COUNT(DISTINCT NULLIF(producto, '')) AS productos, "
+                "COUNT(DISTINCT substr(fecha, 1, 10)) AS dias FROM historial WHERE "
+                + " AND ".join(condiciones), parametros
+            ).fetchone()
+            return {"total_records": row["total"], "unique_users": row["usuarios"],
+                    "unique_products": row["productos"], "active_days": row["dias"]}
+
+        # Sin filtro de usuario/producto, todo sale de las tablas diarias
+        condiciones, parametros = [], []
+        if filtros.get("tienda_id"):
+            condiciones.append("tienda_id = ?")
+            parametros.append(filtros["tienda_id"])
+        if filtros.get("fecha_inicio") is not None:
+            condiciones.append("dia >= ?")
+            parametros.append(_fecha_str(filtros["fecha_inicio"]))
+        if filtros.get("fecha_fin") is not None:
+            condiciones.append("dia <= ?")
+            parametros.append(_fecha_str(filtros["fecha_fin"]))
+        if filtros.get("tipo_inventario"):
+            condiciones.append("tipo_inventario = ?")
+            parametros.append(filtros["tipo_inventario"])
+        where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+        row = conn.execute(
+            "SELECT COALESCE(SUM(registros), 0) AS total, COUNT(DISTINCT dia) AS dias "
+            f"FROM historial_dia{where}", parametros
+        ).fetchone()
+        usuarios = conn.execute(
+            f"SELECT COUNT(DISTINCT usuario) FROM historial_dia_usuarios{where}", parametros
+        ).fetchone()[0]
+        productos = conn.execute(
+            f"SELECT COUNT(DISTINCT producto) FROM historial_dia_productos{where}", parametros
+        ).fetchone()[0]
+        return {"total_records": row["total"], "unique_users": usuarios,
+                "unique_products": productos, "active_days": row["dias"]}
+
+    def history_distinct(self, campo: str) -> List[str]:
+        tablas = {"usuario": "historial_dia_usuarios", "tienda_id": "historial_dia",
+                  "producto": "historial_dia_productos"}
+        if campo not in tablas:
+            raise ValueError(f"Campo no soportado: {campo}")
+        rows = self._connection().execute(
+            f"SELECT DISTINCT {campo} FROM {tablas[campo]} WHERE {campo} != '' ORDER BY {campo}"
+        )
+        return [row[0] for row in rows]
+
+    def last_history_mode(self, tienda_id: Optional[str], categoria: str, producto: str) -> str:
+        sql = "SELECT modo FROM historial_ultimo_modo WHERE categoria = ? AND producto = ?"
+        parametros = [categoria, producto]
+        if tienda_id:
+            sql += " AND tienda_id = ?"
+            parametros.append(tienda_id)
+        row = self._connection().execute(sql + " ORDER BY historial_id DESC LIMIT 1", parametros).fetchone()
+        return row[0] if row else SIN_MODO
+
+    # Delivery
+    def append_delivery(self, registro: Dict[str, Any], origen: str = "historial") -> bool:
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO deliveries (origen, tienda_id, fecha, usuario, producto, contenido) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (origen, registro.get("tienda_id"), str(registro.get("fecha", "")),
+                     registro.get("usuario"), registro.get("producto"),
+                     json.dumps(registro, ensure_ascii=False))
+                )
+            return True
+        except Exception as e:
+            print(f"Error guardando delivery en SQLite: {e}")
+            return False
+
+    def query_deliveries(self, fecha_inicio: Any = None, fecha_fin: Any = None,
+                         usuario: Optional[str] = None,
+                         origen: str = "historial") -> List[Dict[str, Any]]:
+        sql = "SELECT contenido FROM deliveries WHERE origen = ?"
+        parametros: List[Any] = [origen]
+        if fecha_inicio is not None:
+            sql += " AND fecha >= ?"
+            parametros.append(_fecha_str(fecha_inicio))
+        if fecha_fin is not None:
+            sql += " AND fecha < ?"
+            parametros.append(_fecha_fin_exclusiva(fecha_fin))
+        if usuario:
+            sql += " AND usuario = ?"
+            parametros.append(usuario)
+        sql += " ORDER BY id"
+        return [json.loads(row["contenido"]) for row in self._connection().execute(sql, parametros)]
+
+    # Mermas
+    def _insert_mermas(self, conn: sqlite3.Connection, registros: Iterable[Dict[str, Any]]):
+        conn.executemany(
+            "INSERT INTO mermas (id, tienda_id, fecha, usuario, categoria, producto, cantidad, "
+            "motivo, contenido) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (m.get("id"), m.get("tienda_id"), m.get("fecha"), m.get("usuario"),
+                 m.get("categoria"), m.get("producto"), m.get("cantidad", 0), m.get("motivo"),
+                 json.dumps(m, ensure_ascii=False))
+                for m in registros
+            ]
+        )
+
+    def append_merma(self, registro: Dict[str, Any]) -> Optional[int]:
+        tienda_id = registro["tienda_id"]
+        try:
+            with self._transaction() as conn:
+                # Tiendas sin secuencia (bases migradas antes): seguir después del mayor ID
+                conn.execute(
+                    "INSERT INTO mermas_secuencia (tienda_id, siguiente) "
+                    "SELECT ?, COALESCE(MAX(id), 0) + 1 FROM mermas WHERE tienda_id = ? "
+                    "ON CONFLICT (tienda_id) DO NOTHING",
+                    (tienda_id, tienda_id)
+                )
+                merma_id = conn.execute(
+                    "UPDATE mermas_secuencia SET siguiente = siguiente + 1 WHERE tienda_id = ? "
+                    "RETURNING siguiente - 1", (tienda_id,)
+                ).fetchone()[0]
+                self._insert_mermas(conn, [dict(registro, id=merma_id)])
+            return merma_id
+        except Exception as e:
+            print(f"Error guardando merma en SQLite: {e}")
+            return None
+
+    @staticmethod
+    def _mermas_conditions(tienda_id: Optional[str], fecha_inicio: Any, fecha_fin: Any) -> tuple:
+        condiciones, parametros = [], []
+        if tienda_id:
+            condiciones.append("tienda_id = ?")
+            parametros.append(tienda_id)
+        if fecha_inicio is not None:
+            condiciones.append("fecha >= ?")
+            parametros.append(_fecha_str(fecha_inicio))
+        if fecha_fin is not None:
+            condiciones.append("fecha <= ?")
+            parametros.append(_fecha_str(fecha_fin))
+        return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), parametros
+
+    def query_mermas(self, tienda_id: Optional[str] = None, fecha_inicio: Any = None,
+                     fecha_fin: Any = None) -> List[Dict[str, Any]]:
+        where, parametros = self._mermas_conditions(tienda_id, fecha_inicio, fecha_fin)
+        sql = f"SELECT contenido FROM mermas{where} ORDER BY tienda_id, rowid_merma"
+        return [json.loads(row["contenido"]) for row in self._connection().execute(sql, parametros)]
+
+    def mermas_summary(self, tienda_id: Optional[str] = None, fecha_inicio: Any = None,
+                       fecha_fin: Any = None) -> Dict[str, Any]:
+        # Agregados en SQL sobre el índice (tienda_id, fecha): no se cargan los registros
+        where, parametros = self._mermas_conditions(tienda_id, fecha_inicio, fecha_fin)
+        conn = self._connection()
+        total = conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(cantidad), 0) FROM mermas{where}", parametros
+        ).fetchone()
+        resumen = {"registros": total[0], "cantidad": total[1]}
+        for campo, columna, defecto in (("por_categoria", "categoria", "Sin categoría"),
+                                        ("por_motivo", "motivo", "Sin motivo"),
+                                        ("por_producto", "producto", "Sin producto")):
+            resumen[campo] = {
+                row[0]: {"registros": row[1], "cantidad": row[2]}
+                for row in conn.execute(
+                    f"SELECT COALESCE({columna}, ?), COUNT(*), COALESCE(SUM(cantidad), 0) "
+                    f"FROM mermas{where} GROUP BY 1", [defecto] + parametros
+                )
+            }
+        return resumen
+
+    def delete_merma(self, tienda_id: str, merma_id: int) -> bool:
+        try:
+            with self._transaction() as conn:
+                # IDs repetidos de la numeración anterior: se elimina el primero
+                borrados = conn.execute(
+                    "DELETE FROM mermas WHERE rowid_merma = (SELECT MIN(rowid_merma) FROM mermas "
+                    "WHERE tienda_id = ? AND id = ?)", (tienda_id, merma_id)
+                ).rowcount
+            return borrados > 0
+        except Exception as e:
+            print(f"Error eliminando merma en SQLite: {e}")
+            return False
+
+    # Carritos temporales
+    @staticmethod
+    def _insert_carts(conn: sqlite3.Connection, carritos: Iterable[Dict[str, Any]]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO carritos_temporales "
+            "(usuario, tienda_id, fecha, ultima_modificacion, contenido) VALUES (?, ?, ?, ?, ?)",
+            [(c["usuario"], c["tienda_id"], c["fecha"], c.get("ultima_modificacion"),
+              json.dumps(c, ensure_ascii=False)) for c in carritos]
+        )
+
+    def get_cart(self, usuario: str, tienda_id: str, fecha: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT contenido FROM carritos_temporales WHERE usuario = ? AND tienda_id = ? AND fecha = ?",
+            (usuario, tienda_id, fecha)
+        ).fetchone()
+        return json.loads(row["contenido"]) if row else None
+
+    def save_cart(self, carrito: Dict[str, Any]) -> bool:
+        try:
+            with self._transaction() as conn:
+                self._insert_carts(conn, [carrito])
+            return True
+        except Exception as e:
+            print(f"Error guardando carrito en SQLite: {e}")
+            return False
+
+    def query_carts(self, usuario: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT contenido FROM carritos_temporales"
+        parametros: List[Any] = []
+        if usuario is not None:
+            sql += " WHERE usuario = ?"
+            parametros.append(usuario)
+        return [json.loads(row["contenido"]) for row in self._connection().execute(sql, parametros)]
+
+    def delete_carts(self, claves: List[tuple]) -> int:
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM carritos_temporales WHERE usuario = ? AND tienda_id = ? AND fecha = ?",
+                claves
+            )
+        return len(claves)
+
+    # Valores de formularios
+    @staticmethod
+    def _insert_values(conn: sqlite3.Connection, valores: Dict[str, Dict[str, Any]]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO valores (clave, usuario, tienda_id, fecha, contenido) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(clave, v.get("usuario"), v.get("tienda_id"), v.get("fecha"),
+              json.dumps(v, ensure_ascii=False)) for clave, v in valores.items()]
+        )
+
+    def get_values(self, clave: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT contenido FROM valores WHERE clave = ?", (clave,)
+        ).fetchone()
+        return json.loads(row["contenido"]) if row else None
+
+    def save_values(self, valores: Dict[str, Dict[str, Any]]) -> bool:
+        try:
+            with self._transaction() as conn:
+                self._insert_values(conn, valores)
+            return True
+        except Exception as e:
+            print(f"Error guardando valores en SQLite: {e}")
+            return False
+
+    def query_values(self) -> Dict[str, Dict[str, Any]]:
+        return {row["clave"]: json.loads(row["contenido"])
+                for row in self._connection().execute("SELECT clave, contenido FROM valores")}
+
+    def delete_values(self, claves: List[str]) -> int:
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM valores WHERE clave = ?", [(clave,) for clave in claves])
+        return len(claves)
+
+_BACKENDS = {
+    "json": JSONStorageBackend,
+    "sqlite": SQLiteStorageBackend,
+}
+_instancias: Dict[Any, StorageBackend] = {}
+_instancias_lock = threading.Lock()
+
+def get_storage_backend(tipo: Optional[str] = None, base_path: str = ".") -> StorageBackend:
+    """Devuelve (y reutiliza) el backend configurado para el directorio dado"""
+    tipo = (tipo or BACKEND_POR_DEFECTO).lower()
+    if tipo not in _BACKENDS:
+        raise ValueError(f"Backend de almacenamiento desconocido: {tipo}")
+    clave = (tipo, str(Path(base_path).resolve()))
+    with _instancias_lock:
+        if clave not in _instancias:
+            _instancias[clave] = _BACKENDS[tipo](base_path)
+        return _instancias[clave]
+
+def _leer_carritos_json(base_path: Path) -> List[Dict[str, Any]]:
+    """Carritos de CarritoPersistencia: fragmentos y, si sigue ahí, el archivo único anterior"""
+    carritos = {}
+    try:
+        with open(base_path / "carritos_temporales.json", "r", encoding="utf-8") as f:
+            anteriores = json.load(f).get("carritos", {}).values()
+    except (FileNotFoundError, json.JSONDecodeError):
+        anteriores = []
+    for carrito in anteriores:
+        if carrito.get("usuario") and carrito.get("tienda_id") and carrito.get("fecha"):
+            carritos[(carrito["usuario"], carrito["tienda_id"], carrito["fecha"])] = carrito
+    almacen = AlmacenFragmentado(base_path / "carritos_temporales")
+    for usuario, tienda_id, entrada in almacen.fragmentos():
+        for fecha, carrito in almacen.leer_entrada(entrada).get("carritos", {}).items():
+            carritos[(usuario, tienda_id, fecha)] = dict(carrito, usuario=usuario,
+                                                         tienda_id=tienda_id, fecha=fecha)
+    return list(carritos.values())
+
+def migrar_json_a_sqlite(base_path: str = ".", db_file: str = SQLITE_FILE) -> Dict[str, int]:
+    """
+    Migración única de los archivos JSON existentes a SQLite.
+
+    Lee inventario y mermas (snapshot + journal), historial, delivery, ventas,
+    carritos temporales y valores de formularios de `base_path` y los inserta
+    en una sola transacción. Devuelve la cantidad de registros migrados por tabla.
+    """
+    origen = JSONStorageBackend(base_path)
+    destino = SQLiteStorageBackend(base_path, db_file)
+    totales = {"stock": 0, "historial": 0, "deliveries": 0, "mermas": 0,
+               "carritos_temporales": 0, "valores": 0}
+
+    inventario = origen.load_inventory_document()
+    historial = origen._read(origen.history_file, [])
+    delivery = origen._read(origen.delivery_file, [])
+    ventas = origen._read(origen.sales_file, [])
+    mermas_estado = journal_mermas.cargar_documento(origen.base_path / "mermas_rupturas.json")
+    mermas = [m for por_id in mermas_estado["mermas_por_tienda"].values() for m in por_id.values()]
+    carritos = _leer_carritos_json(origen.base_path)
+    valores = origen._read(origen.base_path / "valores_formularios.json", {}).get("valores", {})
+
+    with destino._transaction() as conn:
+        for tabla in totales:
+            conn.execute(f"DELETE FROM {tabla}")
+        conn.execute("DELETE FROM mermas_secuencia")
+        for tabla in ("historial_dia", "historial_dia_usuarios", "historial_dia_productos"):
+            conn.execute(f"DELETE FROM {tabla}")
+        conn.execute("DELETE FROM documentos")
+
+        for tienda_id, inv in inventario.get("inventario_por_tienda", {}).items():
+            if isinstance(inv, dict):
+                destino._upsert_stock(conn, tienda_id, inv)
+                totales["stock"] += sum(len(p) for p in inv.values() if isinstance(p, dict))
+        for clave, valor in inventario.items():
+            if clave != "inventario_por_tienda":
+                conn.execute("INSERT INTO documentos (clave, contenido) VALUES (?, ?)",
+                             (clave, json.dumps(valor, ensure_ascii=False)))
+
+        destino._insert_history(conn, historial)
+        totales["historial"] = len(historial)
+
+        for origen_delivery, registros in (("historial", delivery), ("ventas", ventas)):
+            conn.executemany(
+                "INSERT INTO deliveries (origen, tienda_id, fecha, usuario, producto, contenido) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(origen_delivery, r.get("tienda_id"), str(r.get("fecha", "")), r.get("usuario"),
+                  r.get("producto"), json.dumps(r, ensure_ascii=False)) for r in registros]
+            )
+            totales["deliveries"] += len(registros)
+
+        destino._insert_mermas(conn, mermas)
+        totales["mermas"] = len(mermas)
+        # La secuencia sigue después del mayor ID usado (o del contador guardado)
+        conn.executemany("INSERT INTO mermas_secuencia (tienda_id, siguiente) VALUES (?, ?)",
+                         list(mermas_estado["siguiente_id"].items()))
+
+        destino._insert_carts(conn, carritos)
+        totales["carritos_temporales"] = len(carritos)
+
+        destino._insert_values(conn, valores)
+        totales["valores"] = len(valores)
+
+    print(f"✅ Migración a {destino.db_path} completada: {totales}")
+    return totales
+
+if __name__ == "__main__":
+    import sys
+    migrar_json_a_sqlite(sys.argv[1] if len(sys.argv) > 1 else ".")
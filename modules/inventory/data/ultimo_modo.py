@@ -0,0 +1,187 @@
+"""
+Índice del último UME (Unidad, Caja, Tira) por tienda, categoría y producto.
+
+obtener_ultimo_modo recorría el historial completo de la tienda hacia atrás
+por cada producto de la tabla de administración. Este índice guarda el último
+modo de cada (tienda, categoría, producto), se actualiza con cada registro que
+se agrega al historial y responde con una búsqueda en un diccionario.
+
+El índice se persiste junto al historial con la firma (mtime, tamaño) del
+archivo que refleja. Si el historial cambió por otro camino (otro proceso,
+edición manual, una reversión) la firma no coincide y el índice se reconstruye
+leyendo el historial en una sola pasada, registro por registro.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+MODOS_UME = ("Unidad", "Caja", "Tira")
+SIN_MODO = "N/A"
+
+Clave = Tuple[Optional[str], str, str]
+
+
+def firma_archivo(path) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, tamaño) del archivo, o None si no existe"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def iterar_registros(path, tam_bloque: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre un arreglo JSON de registros sin cargarlo completo en memoria
+
+    Lee el archivo por bloques y decodifica un elemento a la vez; en memoria
+    queda solo el bloque actual y el registro en curso.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer, pos = "", 0
+        iniciado = fin_archivo = False
+        while True:
+            # Saltar espacios y separadores, leyendo más si hace falta
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n" + ("," if iniciado else ""):
+                    pos += 1
+                if pos < len(buffer) or fin_archivo:
+                    break
+                bloque = f.read(tam_bloque)
+                fin_archivo = not bloque
+                buffer, pos = buffer[pos:] + bloque, 0
+            if pos >= len(buffer):
+                return
+
+            if not iniciado:
+                if buffer[pos] != "[":
+                    raise ValueError(f"{path} no contiene un arreglo JSON")
+                iniciado = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+
+            try:
+                registro, fin = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if fin_archivo:
+                    raise
+                # Registro cortado por el bloque: leer más y reintentar
+                bloque = f.read(tam_bloque)
+                fin_archivo = not bloque
+                buffer, pos = buffer[pos:] + bloque, 0
+                continue
+            yield registro
+            pos = fin
+
+
+class IndiceUltimoModo:
+    """Último UME por (tienda, categoría, producto) del historial de inventario"""
+
+    def __init__(self, history_file, index_file=None):
+        self.history_file = Path(history_file)
+        self.index_file = Path(index_file) if index_file else self.history_file.with_name("historial_ultimo_modo.json")
+        self._lock = threading.RLock()
+        self._modos: Optional[Dict[Clave, str]] = None
+        self._firma: Optional[Tuple[int, int]] = None
+
+    def firma_historial(self) -> Optional[Tuple[int, int]]:
+        return firma_archivo(self.history_file)
+
+    @staticmethod
+    def _aplicar(modos: Dict[Clave, str], registros: Iterable[Dict[str, Any]]):
+        for registro in registros:
+            if not isinstance(registro, dict):
+                continue
+            modo = registro.get("modo")
+            if modo not in MODOS_UME:
+                continue
+            categoria, producto = registro.get("categoria"), registro.get("producto")
+            if not isinstance(categoria, str) or not isinstance(producto, str):
+                continue
+            tienda_id = registro.get("tienda_id")
+            if isinstance(tienda_id, str):
+                modos[(tienda_id, categoria, producto)] = modo
+            # Clave sin tienda: el último modo entre todas las tiendas
+            modos[(None, categoria, producto)] = modo
+
+    def _leer_persistido(self, firma_esperada) -> bool:
+        """Carga el índice guardado si corresponde a firma_esperada"""
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            firma = tuple(data["firma"]) if data.get("firma") else None
+            if firma != firma_esperada:
+                return False
+            self._modos = {(t, c, p): m for t, c, p, m in data["modos"]}
+            self._firma = firma
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def _persistir(self):
+        data = {
+            "firma": list(self._firma) if self._firma else None,
+            "modos": [[t, c, p, m] for (t, c, p), m in self._modos.items()]
+        }
+        try:
+            tmp = self.index_file.with_name(self.index_file.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.index_file)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el índice de últimos modos: {e}")
+
+    def reconstruir(self) -> int:
+        """
+        Reconstruye el índice con una pasada por el historial completo
+
+        Returns:
+            Cantidad de claves en el índice
+        """
+        with self._lock:
+            firma = self.firma_historial()
+            modos: Dict[Clave, str] = {}
+            if firma is not None:
+                try:
+                    self._aplicar(modos, iterar_registros(self.history_file))
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ No se pudo leer el historial para el índice de modos: {e}")
+            self._modos, self._firma = modos, firma
+            self._persistir()
+            return len(modos)
+
+    def _vigente(self):
+        """Deja en memoria un índice que refleje el historial actual"""
+        if self._modos is not None and self._firma == self.firma_historial():
+            return
+        if not self._leer_persistido(self.firma_historial()):
+            self.reconstruir()
+
+    def registrar(self, registros: Iterable[Dict[str, Any]], firma_previa: Optional[Tuple[int, int]]):
+        """
+        Actualiza el índice después de agregar registros al historial
+
+        Args:
+            registros: Registros recién agregados (ya escritos en el historial)
+            firma_previa: Firma del historial antes de escribirlos
+        """
+        with self._lock:
+            if self._modos is None:
+                self._leer_persistido(firma_previa)
+            if self._modos is not None and self._firma == firma_previa:
+                self._aplicar(self._modos, registros)
+                self._firma = self.firma_historial()
+                self._persistir()
+            else:
+                self.reconstruir()
+
+    def obtener(self, tienda_id: Optional[str], categoria: str, producto: str) -> str:
+        """Último UME registrado para el producto, o "N/A" si no hay ninguno"""
+        with self._lock:
+            self._vigente()
+            return self._modos.get((tienda_id or None, categoria, producto), SIN_MODO)
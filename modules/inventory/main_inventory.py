@@ -35,7 +35,8 @@ try:
         guardar_historial, 
         cargar_catalogo_delivery, 
         guardar_venta_delivery, 
-        cargar_ventas_delivery
+        cargar_ventas_delivery,
+        cargar_documento_inventario
     )
     persistencia_available = True
 except ImportError:
@@ -43,6 +44,7 @@ except ImportError:
     persistencia_available = False
     cargar_inventario = guardar_inventario = cargar_historial = guardar_historial = None
     cargar_catalogo_delivery = guardar_venta_delivery = cargar_ventas_delivery = None
+    cargar_documento_inventario = None
 
 # Import config_tiendas
 try:
@@ -540,9 +542,9 @@ def show_admin_stores_view(tiendas_opciones):
         if st.button("🔍 Diagnóstico de Inventario", help="Muestra información detallada sobre el estado del inventario"):
             with st.expander("📋 Información de Diagnóstico", expanded=True):
                 try:
-                    if os.path.exists("inventario.json"):
-                        with open("inventario.json", "r", encoding="utf-8") as f:
-                            data_debug = json.load(f)
+                    # Snapshot + journal: inventario.json solo no incluye los últimos guardados
+                    data_debug = cargar_documento_inventario() if cargar_documento_inventario else None
+                    if data_debug is not None:
                         st.json(data_debug)
                         
                         # Mostrar fechas por tienda
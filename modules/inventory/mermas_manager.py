@@ -4,21 +4,124 @@
 import json
 import os
 from datetime import datetime, date
-from typing import Dict, List, Any, Optional
-import pandas as pd
+from typing import Dict, List, Any, Optional, Iterator
+
+try:
+    from shared.streaming_export import Columna, Hoja, exportar_excel, exportar_csv
+except ImportError:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from shared.streaming_export import Columna, Hoja, exportar_excel, exportar_csv
+
+# Con el backend SQLite las mermas van a la tabla mermas (ver data/storage.py)
+try:
+    from .data.storage import get_storage_backend, BACKEND_POR_DEFECTO
+    from .data import journal_mermas
+    from .data.journal_inventario import agregar_registro, bloqueo_journal, compactar
+except ImportError:
+    from data.storage import get_storage_backend, BACKEND_POR_DEFECTO
+    from data import journal_mermas
+    from data.journal_inventario import agregar_registro, bloqueo_journal, compactar
 
 # Archivo donde se almacenarán las mermas
 MERMAS_FILE = "mermas_rupturas.json"
 
+# Columnas de las exportaciones (clave del registro, columna)
+COLUMNAS_EXPORTACION = [
+    ("id", Columna("ID", 8)),
+    ("fecha", Columna("Fecha", 12)),
+    ("hora", Columna("Hora", 10)),
+    ("tienda_id", Columna("Tienda", 10)),
+    ("usuario", Columna("Usuario", 16)),
+    ("categoria", Columna("Categoría", 14)),
+    ("producto", Columna("Producto", 30)),
+    ("cantidad", Columna("Cantidad", 10, "entero")),
+    ("motivo", Columna("Motivo", 14)),
+    ("observaciones", Columna("Observaciones", 40)),
+]
+
+# Resúmenes pre-agregados que se guardan junto a los registros (estado["resumen"]):
+#   "global": totales de todas las tiendas
+#   "tiendas": {tienda_id: totales}
+#   "meses": {tienda_id: {"AAAA-MM": totales}}
+#   "dias": {tienda_id: {fecha: totales}}
+# Cada bloque de totales tiene registros, cantidad y desgloses por categoría,
+# motivo y producto. Se actualizan con cada alta y baja del journal.
+
+def _bloque_vacio() -> Dict[str, Any]:
+    return {"registros": 0, "cantidad": 0, "por_categoria": {}, "por_motivo": {}, "por_producto": {}}
+
+def _acumular_bloque(bloque: Dict[str, Any], merma: Dict[str, Any], signo: int):
+    """Suma (signo=1) o resta (signo=-1) una merma a un bloque de totales"""
+    cantidad = merma.get("cantidad", 0)
+    bloque["registros"] += signo
+    bloque["cantidad"] += signo * cantidad
+    for campo, clave in (("por_categoria", merma.get("categoria", "Sin categoría")),
+                         ("por_motivo", merma.get("motivo", "Sin motivo")),
+                         ("por_producto", merma.get("producto", "Sin producto"))):
+        grupo = bloque[campo].setdefault(clave, {"registros": 0, "cantidad": 0})
+        grupo["registros"] += signo
+        grupo["cantidad"] += signo * cantidad
+        if grupo["registros"] <= 0:
+            del bloque[campo][clave]
+
+def _acumular_resumen(resumen: Dict[str, Any], tienda_id: str, merma: Dict[str, Any], signo: int = 1):
+    """Suma o resta una merma de la lista de tienda_id a los resúmenes global, de tienda, del mes y del día"""
+    fecha = merma.get("fecha", "")
+    _acumular_bloque(resumen["global"], merma, signo)
+    _acumular_bloque(resumen["tiendas"].setdefault(tienda_id, _bloque_vacio()), merma, signo)
+    for nivel, clave in (("meses", fecha[:7]), ("dias", fecha)):
+        periodos = resumen[nivel].setdefault(tienda_id, {})
+        _acumular_bloque(periodos.setdefault(clave, _bloque_vacio()), merma, signo)
+        if periodos[clave]["registros"] <= 0:
+            del periodos[clave]
+
+def _combinar_bloques(bloques) -> Dict[str, Any]:
+    total = _bloque_vacio()
+    for bloque in bloques:
+        total["registros"] += bloque["registros"]
+        total["cantidad"] += bloque["cantidad"]
+        for campo in ("por_categoria", "por_motivo", "por_producto"):
+            destino = total[campo]
+            for clave, datos in bloque[campo].items():
+                grupo = destino.get(clave)
+                if grupo is None:
+                    destino[clave] = dict(datos)
+                else:
+                    grupo["registros"] += datos["registros"]
+                    grupo["cantidad"] += datos["cantidad"]
+    return total
+
+def _construir_resumen(mermas_por_tienda: Dict[str, Dict[Any, Dict]]) -> Dict[str, Any]:
+    """Resúmenes completos a partir de los registros (una pasada)"""
+    resumen = {"global": _bloque_vacio(), "tiendas": {}, "meses": {}, "dias": {}}
+    for tienda_id, mermas in mermas_por_tienda.items():
+        for merma in mermas.values():
+            _acumular_resumen(resumen, tienda_id, merma)
+    return resumen
+
 class MermasManager:
     """
     Gestiona el registro de mermas y rupturas de productos.
     Mantiene un registro separado del inventario normal.
+    
+    Con el backend SQLite seleccionado las mermas se guardan y consultan en la
+    base. Con JSON se guardan en mermas_rupturas.json más su journal (ver
+    data/journal_mermas.py): cada alta o baja agrega una línea y el archivo se
+    reescribe solo al compactar. El estado en memoria (registros por ID y
+    resúmenes) se actualiza con cada cambio, propio o de otro proceso.
     """
     
     def __init__(self):
         self.archivo_mermas = MERMAS_FILE
-        self._asegurar_archivo_existe()
+        self.ruta_log = journal_mermas.ruta_journal(MERMAS_FILE)
+        self.backend = get_storage_backend("sqlite") if BACKEND_POR_DEFECTO == "sqlite" else None
+        # Estado sincronizado con el disco: firma del snapshot y bytes leídos del journal
+        self._estado = None
+        self._firma_snapshot = None
+        self._posicion_journal = 0
+        if self.backend is None:
+            self._asegurar_archivo_existe()
     
     def _asegurar_archivo_existe(self):
         """Crea el archivo de mermas si no existe"""
@@ -27,32 +130,133 @@ class MermasManager:
                 "version": "1.0",
                 "mermas_por_tienda": {},
                 "ultima_actualizacion": datetime.now().isoformat(),
-                "total_registros": 0
+                "total_registros": 0,
+                "siguiente_id": {},
+                "resumen": _construir_resumen({})
             }
             with open(self.archivo_mermas, 'w', encoding='utf-8') as f:
                 json.dump(data_inicial, f, indent=2, ensure_ascii=False)
     
-    def _cargar_datos(self) -> Dict[str, Any]:
-        """Carga todos los datos de mermas desde el archivo"""
+    @staticmethod
+    def _firma(ruta):
         try:
-            with open(self.archivo_mermas, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            # Si hay error, recrear archivo
-            self._asegurar_archivo_existe()
-            with open(self.archivo_mermas, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            stat = os.stat(ruta)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
     
-    def _guardar_datos(self, data: Dict[str, Any]) -> bool:
-        """Guarda todos los datos de mermas en el archivo"""
+    @staticmethod
+    def _tamano(ruta) -> int:
         try:
-            data["ultima_actualizacion"] = datetime.now().isoformat()
-            with open(self.archivo_mermas, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return True
+            return os.path.getsize(ruta)
+        except OSError:
+            return 0
+    
+    @staticmethod
+    def _resumen_vigente(estado: Dict[str, Any]) -> bool:
+        """True si estado["resumen"] refleja todos los registros"""
+        resumen = estado.get("resumen")
+        if not isinstance(resumen, dict) or not {"global", "tiendas", "meses", "dias"} <= resumen.keys():
+            return False
+        total = sum(len(mermas) for mermas in estado["mermas_por_tienda"].values())
+        return resumen["global"].get("registros") == total
+    
+    def _cargar_datos(self) -> Dict[str, Any]:
+        """
+        Estado actual de las mermas (solo lectura): registros por tienda e ID,
+        contadores de ID y resúmenes.
+        
+        Si ni el snapshot ni el journal cambiaron desde la última lectura se
+        devuelve el estado en memoria sin tocar los archivos.
+        """
+        if (self._estado is not None
+                and self._firma(self.archivo_mermas) == self._firma_snapshot
+                and self._tamano(self.ruta_log) == self._posicion_journal):
+            return self._estado
+        with bloqueo_journal(self.ruta_log):
+            return self._sincronizar()
+    
+    def _sincronizar(self) -> Dict[str, Any]:
+        """
+        Pone al día el estado en memoria (con el bloqueo del journal tomado)
+        
+        Si el snapshot cambió (compactación, archivo nuevo) se vuelve a leer
+        entero; si no, solo se aplican las líneas nuevas del journal.
+        """
+        firma = self._firma(self.archivo_mermas)
+        if (self._estado is None or firma != self._firma_snapshot
+                or self._tamano(self.ruta_log) < self._posicion_journal):
+            data = journal_mermas.leer_snapshot(self.archivo_mermas)
+            if data is None:
+                self._asegurar_archivo_existe()
+                data = journal_mermas.leer_snapshot(self.archivo_mermas)
+                firma = self._firma(self.archivo_mermas)
+            estado = journal_mermas.indexar_snapshot(data)
+            if not self._resumen_vigente(estado):
+                # Archivos anteriores sin resúmenes (o modificados por otro camino)
+                estado["resumen"] = _construir_resumen(estado["mermas_por_tienda"])
+            self._estado, self._firma_snapshot, self._posicion_journal = estado, firma, 0
+        
+        registros, self._posicion_journal = journal_mermas.leer_registros(self.ruta_log, self._posicion_journal)
+        for registro in registros:
+            self._aplicar(registro)
+        return self._estado
+    
+    def _aplicar(self, registro: Dict[str, Any]) -> bool:
+        """Aplica un registro del journal al estado y a los resúmenes"""
+        cambio = journal_mermas.aplicar_registro(self._estado, registro)
+        if cambio is None:
+            return False
+        _acumular_resumen(self._estado["resumen"], *cambio)
+        return True
+    
+    def _agregar_cambio(self, registro: Dict[str, Any]) -> bool:
+        """
+        Agrega un alta o baja al journal y la aplica al estado en memoria
+        (con el bloqueo del journal tomado y el estado sincronizado)
+        """
+        try:
+            registros_journal = agregar_registro(self.ruta_log, registro)
         except Exception as e:
             print(f"Error guardando mermas: {e}")
             return False
+        self._aplicar(registro)
+        self._posicion_journal = self._tamano(self.ruta_log)
+        if registros_journal >= journal_mermas.UMBRAL_COMPACTACION:
+            self._compactar()
+        return True
+    
+    def _compactar(self):
+        """Reescribe el snapshot con el estado en memoria y vacía el journal"""
+        try:
+            data = journal_mermas.documento_snapshot(self._estado)
+            data["ultima_actualizacion"] = datetime.now().isoformat()
+            compactar(self.archivo_mermas, self.ruta_log, data=data)
+        except Exception as e:
+            # El journal sigue completo: se compactará con el próximo cambio
+            print(f"Error compactando mermas: {e}")
+            self._estado = None
+            return
+        self._firma_snapshot = self._firma(self.archivo_mermas)
+        self._posicion_journal = 0
+    
+    @staticmethod
+    def _nuevo_registro(merma_id: Optional[int], tienda_id: str, usuario: str, fecha_str: str,
+                        categoria: str, producto: str, cantidad: int, motivo: str,
+                        observaciones: str) -> Dict[str, Any]:
+        return {
+            "id": merma_id,
+            "fecha": fecha_str,
+            "hora": datetime.now().strftime("%H:%M:%S"),
+            "tienda_id": tienda_id,
+            "usuario": usuario,
+            "categoria": categoria,
+            "producto": producto,
+            "cantidad": cantidad,
+            "motivo": motivo,
+            "observaciones": observaciones,
+            "timestamp": datetime.now().isoformat()
+        }
     
     def registrar_merma(self, tienda_id: str, usuario: str, fecha: date, 
                        categoria: str, producto: str, cantidad: int, 
@@ -74,37 +278,21 @@ class MermasManager:
             bool: True si se registró exitosamente
         """
         try:
-            data = self._cargar_datos()
             fecha_str = fecha.strftime("%Y-%m-%d") if isinstance(fecha, date) else str(fecha)
-            
-            # Asegurar estructura de tienda
-            if "mermas_por_tienda" not in data:
-                data["mermas_por_tienda"] = {}
-            
-            if tienda_id not in data["mermas_por_tienda"]:
-                data["mermas_por_tienda"][tienda_id] = []
-            
-            # Crear registro de merma
-            registro_merma = {
-                "id": len(data["mermas_por_tienda"][tienda_id]) + 1,
-                "fecha": fecha_str,
-                "hora": datetime.now().strftime("%H:%M:%S"),
-                "tienda_id": tienda_id,
-                "usuario": usuario,
-                "categoria": categoria,
-                "producto": producto,
-                "cantidad": cantidad,
-                "motivo": motivo,
-                "observaciones": observaciones,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            # Agregar registro
-            data["mermas_por_tienda"][tienda_id].append(registro_merma)
-            data["total_registros"] = data.get("total_registros", 0) + 1
-            
-            return self._guardar_datos(data)
-            
+            if self.backend:
+                # La base asigna el ID con la secuencia de la tienda
+                registro = self._nuevo_registro(None, tienda_id, usuario, fecha_str, categoria,
+                                                producto, cantidad, motivo, observaciones)
+                return self.backend.append_merma(registro) is not None
+            
+            with bloqueo_journal(self.ruta_log):
+                estado = self._sincronizar()
+                # Los IDs nunca se reutilizan: el contador de la tienda solo avanza
+                merma_id = estado["siguiente_id"].get(tienda_id, 1)
+                registro_merma = self._nuevo_registro(merma_id, tienda_id, usuario, fecha_str,
+                                                      categoria, producto, cantidad, motivo,
+                                                      observaciones)
+                return self._agregar_cambio({"o": "a", "t": tienda_id, "m": registro_merma})
         except Exception as e:
             print(f"Error registrando merma: {e}")
             return False
@@ -123,8 +311,10 @@ class MermasManager:
             List[Dict]: Lista de registros de mermas
         """
         try:
+            if self.backend:
+                return self.backend.query_mermas(tienda_id, fecha_inicio, fecha_fin)
             data = self._cargar_datos()
-            mermas_tienda = data.get("mermas_por_tienda", {}).get(tienda_id, [])
+            mermas_tienda = data["mermas_por_tienda"].get(tienda_id, {}).values()
             
             # Filtrar por fechas si se especifica
             if fecha_inicio or fecha_fin:
@@ -139,7 +329,7 @@ class MermasManager:
                 
                 return mermas_filtradas
             
-            return mermas_tienda
+            return list(mermas_tienda)
             
         except Exception as e:
             print(f"Error obteniendo mermas de tienda: {e}")
@@ -158,11 +348,13 @@ class MermasManager:
             List[Dict]: Lista de todos los registros de mermas
         """
         try:
+            if self.backend:
+                return self.backend.query_mermas(None, fecha_inicio, fecha_fin)
             data = self._cargar_datos()
             todas_las_mermas = []
             
-            for tienda_id, mermas in data.get("mermas_por_tienda", {}).items():
-                todas_las_mermas.extend(mermas)
+            for tienda_id, mermas in data["mermas_por_tienda"].items():
+                todas_las_mermas.extend(mermas.values())
             
             # Filtrar por fechas si se especifica
             if fecha_inicio or fecha_fin:
@@ -183,61 +375,97 @@ class MermasManager:
             print(f"Error obteniendo todas las mermas: {e}")
             return []
     
-    def obtener_resumen_mermas(self, tienda_id: Optional[str] = None) -> Dict[str, Any]:
+    def iterar_mermas(self, tienda_id: Optional[str] = None, fecha_inicio: Optional[date] = None,
+                      fecha_fin: Optional[date] = None) -> Iterator[Dict]:
+        """
+        Recorre las mermas (de una tienda o de todas) sin armar listas intermedias
+        
+        Los registros vienen del estado en memoria: son de solo lectura.
+        """
+        if self.backend:
+            yield from self.backend.query_mermas(tienda_id, fecha_inicio, fecha_fin)
+            return
+        data = self._cargar_datos()
+        por_tienda = data["mermas_por_tienda"]
+        listas = [por_tienda.get(tienda_id, {})] if tienda_id else list(por_tienda.values())
+        fecha_inicio_str = fecha_inicio.strftime("%Y-%m-%d") if fecha_inicio else "1900-01-01"
+        fecha_fin_str = fecha_fin.strftime("%Y-%m-%d") if fecha_fin else "2100-12-31"
+        filtrar = bool(fecha_inicio or fecha_fin)
+        for mermas in listas:
+            for merma in list(mermas.values()):
+                if not filtrar or fecha_inicio_str <= merma.get("fecha", "") <= fecha_fin_str:
+                    yield merma
+    
+    def _filas_exportacion(self, tienda_id, fecha_inicio, fecha_fin) -> Iterator[list]:
+        for merma in self.iterar_mermas(tienda_id, fecha_inicio, fecha_fin):
+            yield [merma.get(clave, 0 if clave == "cantidad" else '') for clave, _ in COLUMNAS_EXPORTACION]
+    
+    def _bloque_resumen(self, tienda_id: Optional[str], fecha_inicio: Optional[date],
+                        fecha_fin: Optional[date]) -> Dict[str, Any]:
+        """Bloque de totales desde los resúmenes pre-agregados del estado JSON"""
+        resumen = self._cargar_datos()["resumen"]
+        if fecha_inicio or fecha_fin:
+            fecha_inicio_str = fecha_inicio.strftime("%Y-%m-%d") if fecha_inicio else "1900-01-01"
+            fecha_fin_str = fecha_fin.strftime("%Y-%m-%d") if fecha_fin else "2100-12-31"
+            tiendas = [tienda_id] if tienda_id else list(resumen["dias"])
+            bloques = []
+            for tienda in tiendas:
+                meses = resumen["meses"].get(tienda, {})
+                completos = {
+                    mes for mes in meses
+                    if fecha_inicio_str <= f"{mes}-01" and f"{mes}-31" <= fecha_fin_str
+                }
+                if len(completos) == len(meses):
+                    # El rango cubre todos los registros de la tienda
+                    bloques.append(resumen["tiendas"].get(tienda, _bloque_vacio()))
+                    continue
+                bloques.extend(meses[mes] for mes in completos)
+                # Meses parciales en los extremos: día por día
+                bloques.extend(
+                    datos for dia, datos in resumen["dias"].get(tienda, {}).items()
+                    if dia[:7] not in completos and fecha_inicio_str <= dia <= fecha_fin_str
+                )
+            bloque = _combinar_bloques(bloques)
+        elif tienda_id:
+            bloque = resumen["tiendas"].get(tienda_id, _bloque_vacio())
+        else:
+            bloque = resumen["global"]
+        return bloque
+    
+    def obtener_resumen_mermas(self, tienda_id: Optional[str] = None,
+                               fecha_inicio: Optional[date] = None,
+                               fecha_fin: Optional[date] = None) -> Dict[str, Any]:
         """
         Obtiene un resumen estadístico de las mermas
         
+        Con JSON usa los resúmenes pre-agregados: sin fechas es una lectura
+        directa, con fechas combina los totales de los meses y días del rango
+        (no recorre registros). Con SQLite son agregados en la base.
+        
         Args:
             tienda_id: ID de tienda específica (opcional, si no se especifica es global)
+            fecha_inicio: Fecha de inicio del filtro (opcional)
+            fecha_fin: Fecha de fin del filtro (opcional)
             
         Returns:
             Dict con estadísticas de mermas
         """
         try:
-            if tienda_id:
-                mermas = self.obtener_mermas_tienda(tienda_id)
+            if self.backend:
+                bloque = self.backend.mermas_summary(tienda_id, fecha_inicio, fecha_fin)
             else:
-                mermas = self.obtener_todas_las_mermas()
-            
-            # Calcular estadísticas
-            total_registros = len(mermas)
-            total_cantidad = sum(m.get("cantidad", 0) for m in mermas)
-            
-            # Resumen por categoría
-            por_categoria = {}
-            for merma in mermas:
-                categoria = merma.get("categoria", "Sin categoría")
-                if categoria not in por_categoria:
-                    por_categoria[categoria] = {"registros": 0, "cantidad": 0}
-                por_categoria[categoria]["registros"] += 1
-                por_categoria[categoria]["cantidad"] += merma.get("cantidad", 0)
-            
-            # Resumen por motivo
-            por_motivo = {}
-            for merma in mermas:
-                motivo = merma.get("motivo", "Sin motivo")
-                if motivo not in por_motivo:
-                    por_motivo[motivo] = {"registros": 0, "cantidad": 0}
-                por_motivo[motivo]["registros"] += 1
-                por_motivo[motivo]["cantidad"] += merma.get("cantidad", 0)
-            
-            # Productos más afectados
-            productos_afectados = {}
-            for merma in mermas:
-                producto = merma.get("producto", "Sin producto")
-                if producto not in productos_afectados:
-                    productos_afectados[producto] = 0
-                productos_afectados[producto] += merma.get("cantidad", 0)
+                bloque = self._bloque_resumen(tienda_id, fecha_inicio, fecha_fin)
             
             # Ordenar productos por cantidad (top 10)
-            top_productos = sorted(productos_afectados.items(), 
+            top_productos = sorted(((producto, datos["cantidad"]) for producto, datos in bloque["por_producto"].items()),
                                  key=lambda x: x[1], reverse=True)[:10]
             
+            # Copias: los resúmenes vienen de la caché compartida
             return {
-                "total_registros": total_registros,
-                "total_cantidad": total_cantidad,
-                "por_categoria": por_categoria,
-                "por_motivo": por_motivo,
+                "total_registros": bloque["registros"],
+                "total_cantidad": bloque["cantidad"],
+                "por_categoria": {clave: dict(datos) for clave, datos in bloque["por_categoria"].items()},
+                "por_motivo": {clave: dict(datos) for clave, datos in bloque["por_motivo"].items()},
                 "top_productos_afectados": top_productos
             }
             
@@ -257,89 +485,65 @@ class MermasManager:
         """
         Exporta los datos de mermas a Excel
         
+        Las filas se escriben a medida que se recorren los registros (sin
+        DataFrame intermedio) en un archivo temporal.
+        
         Args:
             tienda_id: ID de tienda específica (opcional)
             fecha_inicio: Fecha de inicio del filtro (opcional)
             fecha_fin: Fecha de fin del filtro (opcional)
             
         Returns:
-            bytes: Contenido del archivo Excel
+            Contenido del archivo (bytes para st.download_button)
         """
         try:
-            # Obtener datos
-            if tienda_id:
-                mermas = self.obtener_mermas_tienda(tienda_id, fecha_inicio, fecha_fin)
-            else:
-                mermas = self.obtener_todas_las_mermas(fecha_inicio, fecha_fin)
-            
-            # Crear DataFrame
-            if not mermas:
-                # DataFrame vacío si no hay datos
-                df = pd.DataFrame(columns=[
-                    'ID', 'Fecha', 'Hora', 'Tienda', 'Usuario', 'Categoría', 
-                    'Producto', 'Cantidad', 'Motivo', 'Observaciones'
-                ])
-            else:
-                df = pd.DataFrame([
-                    {
-                        'ID': m.get('id', ''),
-                        'Fecha': m.get('fecha', ''),
-                        'Hora': m.get('hora', ''),
-                        'Tienda': m.get('tienda_id', ''),
-                        'Usuario': m.get('usuario', ''),
-                        'Categoría': m.get('categoria', ''),
-                        'Producto': m.get('producto', ''),
-                        'Cantidad': m.get('cantidad', 0),
-                        'Motivo': m.get('motivo', ''),
-                        'Observaciones': m.get('observaciones', '')
-                    }
-                    for m in mermas
-                ])
-            
-            # Crear Excel en memoria
-            from io import BytesIO
-            output = BytesIO()
-            
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                # Hoja principal con datos
-                df.to_excel(writer, sheet_name='Mermas y Rupturas', index=False)
+            hojas = [Hoja(
+                'Mermas y Rupturas',
+                [columna for _, columna in COLUMNAS_EXPORTACION],
+                self._filas_exportacion(tienda_id, fecha_inicio, fecha_fin)
+            )]
+            
+            # Hoja de resumen si hay datos (desde los resúmenes pre-agregados)
+            resumen = self.obtener_resumen_mermas(tienda_id, fecha_inicio, fecha_fin)
+            if resumen['total_registros']:
+                resumen_data = [
+                    ['Total de registros', resumen['total_registros']],
+                    ['Total cantidad afectada', resumen['total_cantidad']],
+                    ['', ''],  # Línea vacía
+                    ['RESUMEN POR CATEGORÍA', ''],
+                ]
+                
+                for categoria, datos in resumen['por_categoria'].items():
+                    resumen_data.append([f"{categoria}", f"{datos['cantidad']} unidades ({datos['registros']} registros)"])
+                
+                resumen_data.append(['', ''])  # Línea vacía
+                resumen_data.append(['RESUMEN POR MOTIVO', ''])
+                
+                for motivo, datos in resumen['por_motivo'].items():
+                    resumen_data.append([f"{motivo}", f"{datos['cantidad']} unidades ({datos['registros']} registros)"])
                 
-                # Hoja de resumen si hay datos
-                if not df.empty:
-                    resumen = self.obtener_resumen_mermas(tienda_id)
-                    
-                    # Crear DataFrame de resumen
-                    resumen_data = [
-                        ['Total de registros', resumen['total_registros']],
-                        ['Total cantidad afectada', resumen['total_cantidad']],
-                        ['', ''],  # Línea vacía
-                        ['RESUMEN POR CATEGORÍA', ''],
-                    ]
-                    
-                    for categoria, datos in resumen['por_categoria'].items():
-                        resumen_data.append([f"{categoria}", f"{datos['cantidad']} unidades ({datos['registros']} registros)"])
-                    
-                    resumen_data.append(['', ''])  # Línea vacía
-                    resumen_data.append(['RESUMEN POR MOTIVO', ''])
-                    
-                    for motivo, datos in resumen['por_motivo'].items():
-                        resumen_data.append([f"{motivo}", f"{datos['cantidad']} unidades ({datos['registros']} registros)"])
-                    
-                    resumen_df = pd.DataFrame(resumen_data, columns=['Concepto', 'Valor'])
-                    resumen_df.to_excel(writer, sheet_name='Resumen', index=False)
+                hojas.append(Hoja('Resumen', [Columna('Concepto', 30), Columna('Valor', 30)], resumen_data))
             
-            output.seek(0)
-            return output.getvalue()
+            return exportar_excel(hojas)
             
         except Exception as e:
             print(f"Error exportando a Excel: {e}")
             # Retornar Excel vacío en caso de error
-            from io import BytesIO
-            output = BytesIO()
-            df_vacio = pd.DataFrame(columns=['Error'])
-            df_vacio.to_excel(output, index=False)
-            output.seek(0)
-            return output.getvalue()
+            return exportar_excel([Hoja('Sheet1', [Columna('Error')], [])])
+    
+    def exportar_a_csv(self, tienda_id: Optional[str] = None,
+                       fecha_inicio: Optional[date] = None,
+                       fecha_fin: Optional[date] = None) -> bytes:
+        """
+        Exporta los datos de mermas a CSV, por bloques y en un archivo temporal
+        
+        Returns:
+            Contenido del archivo (bytes para st.download_button)
+        """
+        return exportar_csv(
+            [columna for _, columna in COLUMNAS_EXPORTACION],
+            self._filas_exportacion(tienda_id, fecha_inicio, fecha_fin)
+        )
     
     def eliminar_merma(self, tienda_id: str, merma_id: int) -> bool:
         """
@@ -353,18 +557,15 @@ class MermasManager:
             bool: True si se eliminó exitosamente
         """
         try:
-            data = self._cargar_datos()
-            
-            if tienda_id in data.get("mermas_por_tienda", {}):
-                mermas_tienda = data["mermas_por_tienda"][tienda_id]
-                # Buscar y eliminar el registro
-                for i, merma in enumerate(mermas_tienda):
-                    if merma.get("id") == merma_id:
-                        del mermas_tienda[i]
-                        data["total_registros"] = data.get("total_registros", 1) - 1
-                        return self._guardar_datos(data)
-            
-            return False
+            if self.backend:
+                return self.backend.delete_merma(tienda_id, merma_id)
+            
+            with bloqueo_journal(self.ruta_log):
+                estado = self._sincronizar()
+                # Búsqueda directa por ID; la baja no corre a los demás registros
+                if merma_id not in estado["mermas_por_tienda"].get(tienda_id, {}):
+                    return False
+                return self._agregar_cambio({"o": "d", "t": tienda_id, "i": merma_id})
             
         except Exception as e:
             print(f"Error eliminando merma: {e}")
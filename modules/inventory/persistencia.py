@@ -1,12 +1,53 @@
 import os
+import copy
 import json
 from datetime import date
 
+try:
+    from shared.data_cache import data_cache
+except ImportError:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from shared.data_cache import data_cache
+
 INVENTARIO_FILE = "inventario.json"
+# Journal de cambios (una línea JSON compacta por guardado)
+INVENTARIO_LOG_FILE = "inventario.log.jsonl"
 HISTORIAL_FILE = "historial_inventario.json"
 CATALOGO_DELIVERY_FILE = "catalogo_delivery.json"
 VENTAS_DELIVERY_FILE = "ventas_delivery.json"
 
+# Modo journal: cada guardado agrega un delta al log en lugar de reescribir el archivo
+MODO_JOURNAL = True
+# Journal compartido con el backend JSON: mismo bloqueo (hilos y procesos) y una sola compactación
+try:
+    from .data import journal_inventario
+except ImportError:
+    from data import journal_inventario
+
+# Cantidad de registros en el journal a partir de la cual se materializa el snapshot
+UMBRAL_COMPACTACION = journal_inventario.UMBRAL_COMPACTACION
+
+# Backend de almacenamiento: "json" (archivos + journal) o "sqlite" (ver data/storage.py)
+try:
+    from .data.storage import get_storage_backend, BACKEND_POR_DEFECTO
+except ImportError:
+    from data.storage import get_storage_backend, BACKEND_POR_DEFECTO
+BACKEND_ALMACENAMIENTO = BACKEND_POR_DEFECTO
+
+# Índice del último UME por (tienda, categoría, producto), al lado de HISTORIAL_FILE
+try:
+    from .data.ultimo_modo import IndiceUltimoModo
+except ImportError:
+    from data.ultimo_modo import IndiceUltimoModo
+_indice_ultimo_modo = IndiceUltimoModo(HISTORIAL_FILE)
+
+def _backend_sqlite():
+    """Backend SQLite si está seleccionado, None para el modo JSON clásico"""
+    if BACKEND_ALMACENAMIENTO == "sqlite":
+        return get_storage_backend("sqlite")
+    return None
+
 def migrar_estructura_inventario(inventario):
     """Migra inventario de estructura antigua a nueva estructura"""
     if not isinstance(inventario, dict):
@@ -34,135 +75,196 @@ def migrar_estructura_inventario(inventario):
     
     return inventario
 
+def _estructura_vacia():
+    return {"Impulsivo": {}, "Por Kilos": {}, "Extras": {}}
+
+def _datos_iniciales():
+    return {
+        "inventario_por_tienda": {},
+        "inventario_global": {},
+        "ultima_fecha_guardado": str(date.today())
+    }
+
+def _reparar_anidacion(data):
+    """Corrige tiendas con 'inventario_por_tienda' anidado (fix para datos corruptos)"""
+    if "inventario_por_tienda" not in data:
+        return data
+    inventario_tiendas = data["inventario_por_tienda"]
+    for tid in list(inventario_tiendas.keys()):
+        if isinstance(inventario_tiendas[tid], dict):
+            # Si la estructura de la tienda tiene "inventario_por_tienda" dentro, está mal
+            if "inventario_por_tienda" in inventario_tiendas[tid]:
+                # Extraer el inventario correcto del nivel más profundo
+                try:
+                    temp = inventario_tiendas[tid]
+                    while "inventario_por_tienda" in temp:
+                        temp = temp["inventario_por_tienda"][tid]
+                    # Ahora temp debería tener Impulsivo, Por Kilos, Extras
+                    if all(k in temp for k in ["Impulsivo", "Por Kilos", "Extras"]):
+                        inventario_tiendas[tid] = temp
+                except:
+                    # Si falla, inicializar vacío
+                    inventario_tiendas[tid] = _estructura_vacia()
+    return data
+
+# Formato del journal (ver data/journal_inventario.py)
+_aplicar_cambios_tienda = journal_inventario.aplicar_cambios_tienda
+_aplicar_registro = journal_inventario.aplicar_registro
+_parsear_journal = journal_inventario.parsear_journal
+
+def _bloqueo_journal():
+    """Bloqueo exclusivo del journal, el mismo que usa el backend JSON"""
+    return journal_inventario.bloqueo_journal(INVENTARIO_LOG_FILE)
+
+def _leer_snapshot(fresh=True):
+    """Snapshot materializado; con fresh=False se comparte desde la caché (solo lectura)"""
+    return data_cache.load_json(INVENTARIO_FILE, fresh=fresh)
+
+def _leer_journal(fresh=True):
+    return data_cache.load(INVENTARIO_LOG_FILE, _parsear_journal, default=[], fresh=fresh)
+
+def _agregar_al_journal(registro):
+    """Agrega un registro compacto al final del journal y devuelve su tamaño en registros"""
+    return journal_inventario.agregar_registro(INVENTARIO_LOG_FILE, registro)
+
+def compactar_inventario(data=None):
+    """
+    Materializa snapshot + journal en inventario.json y vacía el journal.
+    
+    Con `data` el documento completo reemplaza al inventario (modo clásico).
+    Es la única vía para reescribir el snapshot: ver journal_inventario.compactar.
+    """
+    try:
+        with _bloqueo_journal():
+            reemplazo = data is not None
+            if not reemplazo:
+                data = journal_inventario.cargar_documento(INVENTARIO_FILE, INVENTARIO_LOG_FILE) or _datos_iniciales()
+                _reparar_anidacion(data)
+                data.setdefault("fechas_por_tienda", {})
+            aplicados = journal_inventario.compactar(INVENTARIO_FILE, INVENTARIO_LOG_FILE, data)
+        if not reemplazo:
+            print(f"🗜️ Journal compactado: {aplicados} registros aplicados a {INVENTARIO_FILE}")
+        return True
+    except Exception as e:
+        print(f"❌ Error compactando inventario: {e}")
+        return False
+
+def _cargar_datos_tienda(tienda_id):
+    """
+    Snapshot + journal de una sola tienda.
+    
+    Snapshot y journal vienen de la caché compartida; solo se copia la tienda
+    pedida, así un rerun sin cambios en disco no vuelve a parsear el archivo.
+    """
+    snapshot = _leer_snapshot(fresh=False)
+    registros = _leer_journal(fresh=False) if MODO_JOURNAL else []
+    if snapshot is None and not registros:
+        return None
+    
+    tiendas = (snapshot or {}).get("inventario_por_tienda", {})
+    data = {"inventario_por_tienda": {}}
+    if tienda_id in tiendas:
+        data["inventario_por_tienda"][tienda_id] = copy.deepcopy(tiendas[tienda_id])
+    for registro in registros:
+        if registro.get("t") == tienda_id:
+            _aplicar_registro(data, copy.deepcopy(registro))
+    return _reparar_anidacion(data)
+
+def _cargar_datos_inventario():
+    """Snapshot materializado + cola del journal"""
+    data = _leer_snapshot()
+    registros = _leer_journal() if MODO_JOURNAL else []
+    if data is None and not registros:
+        return None
+    data = data or _datos_iniciales()
+    for registro in registros:
+        _aplicar_registro(data, registro)
+    return _reparar_anidacion(data)
+
+def cargar_documento_inventario():
+    """
+    Documento completo de inventario (snapshot + cola del journal), o None
+    
+    Para diagnósticos y lectores externos: leer inventario.json directamente
+    no ve los guardados que todavía están en el journal.
+    """
+    backend = _backend_sqlite()
+    if backend:
+        return backend.load_inventory_document()
+    data = journal_inventario.cargar_documento(INVENTARIO_FILE, INVENTARIO_LOG_FILE)
+    return _reparar_anidacion(data) if data is not None else None
+
 def cargar_inventario(tienda_id=None, fecha_carga=None):
     """Carga inventario específico de una tienda - SIEMPRE carga lo último guardado"""
-    productos_base = {
-        "Impulsivo": {},
-        "Por Kilos": {},
-        "Extras": {}
-    }
+    productos_base = _estructura_vacia()
+    
+    backend = _backend_sqlite()
+    if backend:
+        if tienda_id:
+            return migrar_estructura_inventario(backend.load_store_inventory(tienda_id))
+        return backend.load_inventory_document().get("inventario_global", productos_base)
     
-    if os.path.exists(INVENTARIO_FILE):
-        with open(INVENTARIO_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+    data = _cargar_datos_tienda(tienda_id) if tienda_id else _cargar_datos_inventario()
+    if data is not None:
+        if tienda_id:
+            print(f"🔍 Cargando inventario para tienda {tienda_id}")
             
-            if tienda_id:
-                print(f"🔍 Cargando inventario para tienda {tienda_id}")
-                
-                # Cargar inventario específico de la tienda - SIN VALIDAR FECHAS
-                inventario_tiendas = data.get("inventario_por_tienda", {})
-                inventario = inventario_tiendas.get(tienda_id, productos_base.copy())
-                
-                # Migrar datos antiguos a nueva estructura automáticamente
-                inventario = migrar_estructura_inventario(inventario)
-                
-                # Debug: contar productos cargados
-                total_productos = sum(
-                    len(cat) if isinstance(cat, dict) else 0 
-                    for cat in inventario.values() 
-                    if isinstance(cat, dict)
-                )
-                print(f"✅ Inventario cargado: {total_productos} productos en tienda {tienda_id}")
-                
-                return inventario
-            else:
-                # Cargar inventario global (para compatibilidad)
-                return data.get("inventario_global", productos_base.copy())
+            # Cargar inventario específico de la tienda - SIN VALIDAR FECHAS
+            inventario_tiendas = data.get("inventario_por_tienda", {})
+            inventario = inventario_tiendas.get(tienda_id, productos_base)
+            
+            # Migrar datos antiguos a nueva estructura automáticamente
+            inventario = migrar_estructura_inventario(inventario)
+            
+            # Debug: contar productos cargados
+            total_productos = sum(
+                len(cat) if isinstance(cat, dict) else 0 
+                for cat in inventario.values() 
+                if isinstance(cat, dict)
+            )
+            print(f"✅ Inventario cargado: {total_productos} productos en tienda {tienda_id}")
+            
+            return inventario
+        else:
+            # Cargar inventario global (para compatibilidad)
+            return data.get("inventario_global", productos_base)
     
     print(f"⚠️ Archivo {INVENTARIO_FILE} no existe, retornando estructura vacía")
-    return productos_base.copy()
+    return productos_base
 
 def guardar_inventario(inventario, tienda_id=None, fecha_carga=None):
-    """Guarda inventario - ACUMULATIVO Y SIMPLE, sin validación de fechas"""
+    """
+    Guarda inventario - ACUMULATIVO Y SIMPLE, sin validación de fechas.
+    
+    En modo journal solo se agrega el cambio al final de INVENTARIO_LOG_FILE, por
+    lo que el costo depende del tamaño del cambio y no del inventario completo.
+    El snapshot se compacta al superar UMBRAL_COMPACTACION registros.
+    """
     try:
         fecha_str = str(date.today())
         
-        # Cargar datos existentes del archivo
-        if os.path.exists(INVENTARIO_FILE):
-            with open(INVENTARIO_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        else:
-            data = {
-                "inventario_por_tienda": {},
-                "inventario_global": {},
-                "ultima_fecha_guardado": fecha_str
-            }
-        
-        # Verificar y limpiar estructura anidada incorrecta (fix para datos corruptos)
-        if "inventario_por_tienda" in data:
-            inventario_tiendas = data["inventario_por_tienda"]
-            # Verificar si hay anidación incorrecta
-            for tid in list(inventario_tiendas.keys()):
-                if isinstance(inventario_tiendas[tid], dict):
-                    # Si la estructura de la tienda tiene "inventario_por_tienda" dentro, está mal
-                    if "inventario_por_tienda" in inventario_tiendas[tid]:
-                        # Extraer el inventario correcto del nivel más profundo
-                        try:
-                            # Navegar hasta el nivel más profundo
-                            temp = inventario_tiendas[tid]
-                            while "inventario_por_tienda" in temp:
-                                temp = temp["inventario_por_tienda"][tid]
-                            # Ahora temp debería tener Impulsivo, Por Kilos, Extras
-                            if all(k in temp for k in ["Impulsivo", "Por Kilos", "Extras"]):
-                                inventario_tiendas[tid] = temp
-                        except:
-                            # Si falla, inicializar vacío
-                            inventario_tiendas[tid] = {
-                                "Impulsivo": {},
-                                "Por Kilos": {},
-                                "Extras": {}
-                            }
-            data["inventario_por_tienda"] = inventario_tiendas
-        
-        # Inicializar fechas_por_tienda si no existe
-        if "fechas_por_tienda" not in data:
-            data["fechas_por_tienda"] = {}
-        
-        if tienda_id:
-            # Asegurar que existe la estructura base
-            if "inventario_por_tienda" not in data:
-                data["inventario_por_tienda"] = {}
-            
-            # Obtener o crear inventario actual de la tienda
-            if tienda_id not in data["inventario_por_tienda"]:
-                data["inventario_por_tienda"][tienda_id] = {
-                    "Impulsivo": {},
-                    "Por Kilos": {},
-                    "Extras": {}
-                }
-            
-            inventario_actual = data["inventario_por_tienda"][tienda_id]
-            
-            # Actualizar ACUMULATIVAMENTE cada categoría
-            for categoria in ["Impulsivo", "Por Kilos", "Extras"]:
-                if categoria not in inventario_actual:
-                    inventario_actual[categoria] = {}
-                
-                if categoria in inventario and isinstance(inventario[categoria], dict):
-                    # Actualizar/agregar productos nuevos
-                    for producto, cantidad in inventario[categoria].items():
-                        inventario_actual[categoria][producto] = cantidad
-                        print(f"💾 Guardando: {categoria} -> {producto} = {cantidad}")
-            
-            # Guardar el inventario actualizado
-            data["inventario_por_tienda"][tienda_id] = inventario_actual
-            
-            # Debug: verificar que se guardó correctamente
-            productos_guardados = sum(len(cat.values()) if isinstance(cat, dict) else 0 for cat in inventario_actual.values() if isinstance(cat, dict))
-            print(f"✅ Total guardado: {productos_guardados} productos para tienda {tienda_id}")
-        else:
-            # Guardar inventario global (para compatibilidad)
+        backend = _backend_sqlite()
+        if backend:
+            if tienda_id:
+                return backend.update_store_inventory(tienda_id, inventario)
+            data = backend.load_inventory_document()
             data["inventario_global"] = inventario
+            data["ultima_fecha_guardado"] = fecha_str
+            return backend.save_inventory_document(data)
         
-        # Actualizar fecha de guardado general
-        data["ultima_fecha_guardado"] = fecha_str
-        
-        # Guardar en archivo
-        with open(INVENTARIO_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if MODO_JOURNAL:
+            registro = {"t": tienda_id, "d": inventario, "f": fecha_str}
+            if tienda_id:
+                productos = sum(len(cat) for cat in inventario.values() if isinstance(cat, dict))
+                print(f"💾 Journal: {productos} productos para tienda {tienda_id}")
+            
+            if _agregar_al_journal(registro) >= UMBRAL_COMPACTACION:
+                compactar_inventario()
+            return True
         
-        print(f"✅ Archivo guardado exitosamente en {INVENTARIO_FILE}")
-        return True
+        # Modo clásico: reescritura completa del archivo
+        with _bloqueo_journal():
+            return _guardar_inventario_completo(inventario, tienda_id, fecha_str)
             
     except Exception as e:
         print(f"❌ Error guardando inventario: {e}")
@@ -170,10 +272,38 @@ def guardar_inventario(inventario, tienda_id=None, fecha_carga=None):
         traceback.print_exc()
         return False
 
-def guardar_historial(fecha, usuario, categoria, producto, cantidad, modo, tipo_inventario="Diario", tienda_id=None):
-    """Guarda un registro detallado del movimiento de inventario."""
+def _guardar_inventario_completo(inventario, tienda_id, fecha_str):
+    """Reescribe inventario.json con el cambio aplicado (modo sin journal, bajo el bloqueo)"""
+    data = journal_inventario.cargar_documento(INVENTARIO_FILE, INVENTARIO_LOG_FILE) or _datos_iniciales()
+    _reparar_anidacion(data)
+    
+    # Inicializar fechas_por_tienda si no existe
+    if "fechas_por_tienda" not in data:
+        data["fechas_por_tienda"] = {}
+    
+    if tienda_id:
+        inventario_actual = _aplicar_cambios_tienda(data, tienda_id, inventario)
+        
+        # Debug: verificar que se guardó correctamente
+        productos_guardados = sum(len(cat.values()) if isinstance(cat, dict) else 0 for cat in inventario_actual.values() if isinstance(cat, dict))
+        print(f"✅ Total guardado: {productos_guardados} productos para tienda {tienda_id}")
+    else:
+        # Guardar inventario global (para compatibilidad)
+        data["inventario_global"] = inventario
+    
+    # Actualizar fecha de guardado general
+    data["ultima_fecha_guardado"] = fecha_str
+    
+    # Guardar en archivo (snapshot completo, el journal queda vacío)
+    if not compactar_inventario(data):
+        return False
+    
+    print(f"✅ Archivo guardado exitosamente en {INVENTARIO_FILE}")
+    return True
+
+def _crear_registro_historial(fecha, usuario, categoria, producto, cantidad, modo, tipo_inventario="Diario", tienda_id=None):
     # Crear registro con tipo de inventario explícito y tienda
-    registro = {
+    return {
         "fecha": str(fecha),
         "usuario": usuario,
         "categoria": categoria,
@@ -183,28 +313,190 @@ def guardar_historial(fecha, usuario, categoria, producto, cantidad, modo, tipo_
         "tipo_inventario": tipo_inventario,
         "tienda_id": tienda_id or "T001"  # Default por compatibilidad
     }
+
+def _preparar_historial(registros):
+    """Escribe historial + registros nuevos en un archivo temporal y devuelve su ruta"""
     historial = []
     if os.path.exists(HISTORIAL_FILE):
         with open(HISTORIAL_FILE, "r", encoding="utf-8") as f:
             historial = json.load(f)
-    historial.append(registro)
-    with open(HISTORIAL_FILE, "w", encoding="utf-8") as f:
+    historial.extend(registros)
+    tmp_file = f"{HISTORIAL_FILE}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
         json.dump(historial, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_file
+
+def guardar_historial(fecha, usuario, categoria, producto, cantidad, modo, tipo_inventario="Diario", tienda_id=None):
+    """Guarda un registro detallado del movimiento de inventario."""
+    registro = _crear_registro_historial(fecha, usuario, categoria, producto, cantidad, modo, tipo_inventario, tienda_id)
+    backend = _backend_sqlite()
+    if backend:
+        backend.append_history([registro])
+        return
+    tmp_file = _preparar_historial([registro])
+    firma_previa = _indice_ultimo_modo.firma_historial()
+    os.replace(tmp_file, HISTORIAL_FILE)
+    data_cache.invalidate(HISTORIAL_FILE)
+    _indice_ultimo_modo.registrar([registro], firma_previa)
+
+def _valores_previos(tienda_id, cambios):
+    """
+    Valores actuales solo de los productos de `cambios` en la tienda, para deshacer
+    
+    Returns:
+        (previos, nuevos): valores de los productos que ya existían y, por
+        categoría, los productos que el cambio agregaría a la tienda
+    """
+    actuales = {categoria: {} for categoria in cambios}
+    
+    def tomar(inventario):
+        for categoria, productos in cambios.items():
+            origen = inventario.get(categoria) if isinstance(inventario, dict) else None
+            if isinstance(origen, dict):
+                for producto in productos:
+                    if producto in origen:
+                        actuales[categoria][producto] = origen[producto]
+    
+    # Snapshot y journal compartidos desde la caché: solo se copian los productos afectados
+    snapshot = _leer_snapshot(fresh=False) or {}
+    tomar(snapshot.get("inventario_por_tienda", {}).get(tienda_id))
+    for registro in (_leer_journal(fresh=False) if MODO_JOURNAL else []):
+        if registro.get("t") == tienda_id:
+            tomar(registro.get("d", {}))
+            for categoria, productos in registro.get("b", {}).items():
+                for producto in productos:
+                    actuales.get(categoria, {}).pop(producto, None)
+    
+    nuevos = {
+        categoria: [producto for producto in productos if producto not in actuales[categoria]]
+        for categoria, productos in cambios.items()
+    }
+    return copy.deepcopy(actuales), {categoria: lista for categoria, lista in nuevos.items() if lista}
+
+def _inventario_global_actual():
+    """Inventario global vigente (el último registro global del journal o el snapshot)"""
+    global_actual = (_leer_snapshot(fresh=False) or {}).get("inventario_global", {})
+    for registro in (_leer_journal(fresh=False) if MODO_JOURNAL else []):
+        if not registro.get("t"):
+            global_actual = registro.get("d", {})
+    return copy.deepcopy(global_actual)
+
+def _revertir_tienda(tienda_id, previos, nuevos):
+    """Restaura los valores previos y quita los productos que agregó un carrito"""
+    registro = {"t": tienda_id, "d": previos, "b": nuevos}
+    if MODO_JOURNAL:
+        _agregar_al_journal(registro)
+        return
+    with _bloqueo_journal():
+        data = journal_inventario.cargar_documento(INVENTARIO_FILE, INVENTARIO_LOG_FILE) or _datos_iniciales()
+        _aplicar_registro(data, registro)
+        compactar_inventario(data)
+
+def guardar_carrito_inventario(carrito, usuario, fecha, tipo_inventario="Diario", tienda_id=None, modo="carga_inventario"):
+    """
+    Confirma un carrito completo en una sola transacción.
+    
+    Todos los productos se aplican al inventario en un único registro (un solo
+    append en modo journal) y todas las filas de historial en una única
+    lectura-escritura de HISTORIAL_FILE. Si algo falla no queda estado parcial:
+    el historial se reemplaza atómicamente y, si eso falla después de escribir
+    el inventario, la tienda vuelve a su estado previo (valores anteriores de
+    los productos afectados y sin los productos que agregó el carrito).
+    
+    Args:
+        carrito: Lista de entradas con claves 'categoria', 'producto' y 'cantidad'
+        
+    Returns:
+        bool: True si se guardó el carrito completo
+    """
+    if not carrito:
+        return False
+    
+    tmp_historial = None
+    try:
+        # Preparar deltas de inventario (la última entrada de un producto gana)
+        cambios = {}
+        registros = []
+        for entrada in carrito:
+            categoria = entrada["categoria"]
+            producto = entrada["producto"]
+            cambios.setdefault(categoria, {})[producto] = entrada["cantidad"]
+            registros.append(_crear_registro_historial(
+                fecha, usuario, categoria, producto, str(entrada["cantidad"]),
+                modo, tipo_inventario, tienda_id
+            ))
+        
+        backend = _backend_sqlite()
+        if backend and tienda_id:
+            # Inventario e historial en una sola transacción SQLite
+            if not backend.commit_cart(tienda_id, cambios, registros):
+                raise IOError("la transacción SQLite fue revertida")
+            print(f"✅ Carrito confirmado: {len(registros)} productos para tienda {tienda_id}")
+            return True
+        
+        with _bloqueo_journal():
+            # Valores previos de los productos afectados, para deshacer si falla el historial
+            if tienda_id:
+                previos, nuevos = _valores_previos(tienda_id, cambios)
+            else:
+                previo_global = _inventario_global_actual()
+            tmp_historial = _preparar_historial(registros)
+            
+            if not guardar_inventario(cambios, tienda_id, fecha):
+                raise IOError("no se pudo guardar el inventario")
+            
+            try:
+                firma_previa = _indice_ultimo_modo.firma_historial()
+                os.replace(tmp_historial, HISTORIAL_FILE)
+                data_cache.invalidate(HISTORIAL_FILE)
+                tmp_historial = None
+            except Exception:
+                if tienda_id:
+                    _revertir_tienda(tienda_id, previos, nuevos)
+                else:
+                    guardar_inventario(previo_global, None, fecha)
+                raise
+            _indice_ultimo_modo.registrar(registros, firma_previa)
+        
+        print(f"✅ Carrito confirmado: {len(registros)} productos para tienda {tienda_id}")
+        return True
+    
+    except Exception as e:
+        print(f"❌ Error confirmando carrito: {e}")
+        return False
+    finally:
+        if tmp_historial and os.path.exists(tmp_historial):
+            os.remove(tmp_historial)
 
 def cargar_historial(tienda_id=None):
     """Carga historial global o filtrado por tienda"""
-    if os.path.exists(HISTORIAL_FILE):
-        with open(HISTORIAL_FILE, "r", encoding="utf-8") as f:
-            historial_completo = json.load(f)
-            
-        if tienda_id:
-            # Filtrar por tienda específica
-            return [registro for registro in historial_completo 
-                   if registro.get("tienda_id") == tienda_id]
-        else:
-            # Retornar historial completo
-            return historial_completo
-    return []
+    backend = _backend_sqlite()
+    if backend:
+        return backend.query_history(tienda_id=tienda_id)
+    # Registros compartidos desde la caché: tratarlos como solo lectura
+    historial_completo = data_cache.load_json(HISTORIAL_FILE, default=[])
+    
+    if tienda_id:
+        # Filtrar por tienda específica
+        return [registro for registro in historial_completo 
+               if registro.get("tienda_id") == tienda_id]
+    else:
+        # Retornar historial completo
+        return list(historial_completo)
+
+def obtener_ultimo_modo_historial(tienda_id, categoria, producto):
+    """
+    Último UME (Unidad, Caja, Tira) registrado para un producto, o "N/A".
+    
+    Consulta el índice de últimos modos en lugar de recorrer el historial;
+    sin tienda_id busca entre todas las tiendas.
+    """
+    backend = _backend_sqlite()
+    if backend:
+        return backend.last_history_mode(tienda_id, categoria, producto)
+    return _indice_ultimo_modo.obtener(tienda_id, categoria, producto)
 
 def cargar_catalogo_delivery():
     if os.path.exists(CATALOGO_DELIVERY_FILE):
@@ -223,6 +515,11 @@ def guardar_venta_delivery(usuario, venta):
         "usuario": usuario,
         "venta": venta
     }
+    backend = _backend_sqlite()
+    if backend:
+        # Misma tabla deliveries que migró migrar_json_a_sqlite (origen "ventas")
+        backend.append_delivery(registro, origen="ventas")
+        return
     ventas = []
     if os.path.exists(VENTAS_DELIVERY_FILE):
         with open(VENTAS_DELIVERY_FILE, "r", encoding="utf-8") as f:
@@ -232,6 +529,9 @@ def guardar_venta_delivery(usuario, venta):
         json.dump(ventas, f, ensure_ascii=False, indent=2)
 
 def cargar_ventas_delivery():
+    backend = _backend_sqlite()
+    if backend:
+        return backend.query_deliveries(origen="ventas")
     if os.path.exists(VENTAS_DELIVERY_FILE):
         with open(VENTAS_DELIVERY_FILE, "r", encoding="utf-8") as f:
             return json.load(f)
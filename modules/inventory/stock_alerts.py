@@ -4,7 +4,171 @@
 import streamlit as st
 import json
 import os
-from typing import Dict, Tuple, Any
+from collections.abc import Sequence
+from typing import Dict, Tuple, Any, List
+
+import numpy as np
+
+# Códigos de estado en las tablas columnares (menor = más urgente)
+STATUS_CODES = ("critical", "warning", "success")
+STATUS_EMOJIS = ("🔴", "🟡", "🟢")
+STATUS_DESC_CONFIGURED = ("CRÍTICO", "MEDIO", "SUFICIENTE")
+STATUS_DESC_GENERIC = ("SIN STOCK", "STOCK BAJO", "STOCK OK")
+STATUS_DESC_BULTOS_UNIDAD = ("Crítico", "Atención", "OK")
+
+# Umbrales para productos sin configuración específica
+GENERIC_CRITICO = 0
+GENERIC_MEDIO = 5
+
+
+class ThresholdTable:
+    """
+    Umbrales en formato columnar: una fila por entrada de stock_thresholds.json
+    más una fila final con los umbrales genéricos. Las claves "X (Bultos)" y
+    "X (Unidad)" se indexan por nombre base para no formatear claves por producto.
+    """
+    
+    def __init__(self, thresholds: Dict[str, Dict[str, float]]):
+        names = list(thresholds.keys())
+        critico = [thresholds[name].get("critico", 0) for name in names]
+        medio = [thresholds[name].get("medio", c * 2) for name, c in zip(names, critico)]
+        
+        self.generic = len(names)
+        self.critico = np.array(critico + [GENERIC_CRITICO], dtype=np.float64)
+        self.medio = np.array(medio + [GENERIC_MEDIO], dtype=np.float64)
+        self.index = {name: i for i, name in enumerate(names)}
+        self.bultos_index = {}
+        self.unidad_index = {}
+        for i, name in enumerate(names):
+            if name.endswith(" (Bultos)"):
+                self.bultos_index[name[:-len(" (Bultos)")]] = i
+            elif name.endswith(" (Unidad)"):
+                self.unidad_index[name[:-len(" (Unidad)")]] = i
+    
+    def classify(self, cantidades: np.ndarray, filas: np.ndarray) -> np.ndarray:
+        """Código de estado (0=crítico, 1=medio, 2=suficiente) de cada cantidad"""
+        critico = self.critico[filas]
+        medio = self.medio[filas]
+        return np.where(cantidades <= critico, 0, np.where(cantidades <= medio, 1, 2)).astype(np.int8)
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _float_array(values: List[Any]) -> np.ndarray:
+    """Arreglo float; los valores no numéricos quedan en NaN (no cumplen ningún umbral)"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_as_float(v) for v in values], dtype=np.float64)
+
+
+class _StatusRows(Sequence):
+    """Filas de un estado; los diccionarios para mostrar se arman al accederlas"""
+    
+    def __init__(self, table: "StockStatusTable", positions: np.ndarray):
+        self._table = table
+        self._positions = positions
+    
+    def __len__(self) -> int:
+        return len(self._positions)
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._table.row(p) for p in self._positions[i].tolist()]
+        return self._table.row(int(self._positions[i]))
+    
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class StockStatusTable:
+    """
+    Estado de stock de un inventario completo en formato columnar
+
+    El inventario anidado {categoria: {producto: cantidad}} se aplana una vez
+    en arreglos y se clasifica con comparaciones vectoriales. Los productos
+    con estructura {"bultos", "unidad"} toman el estado más crítico de ambos.
+    """
+    
+    def __init__(self, inventario: Dict, thresholds: ThresholdTable):
+        self.categorias: List[str] = []
+        self.productos: List[str] = []
+        self.cantidades: List[Any] = []  # valor original: número o {"bultos", "unidad"}
+        dual: List[bool] = []
+        
+        for categoria, productos in inventario.items():
+            inicio = len(self.productos)
+            for producto, cantidad_data in productos.items():
+                if isinstance(cantidad_data, dict):
+                    if "bultos" in cantidad_data and "unidad" in cantidad_data:
+                        self.productos.append(producto)
+                        self.cantidades.append(cantidad_data)
+                        dual.append(True)
+                elif isinstance(cantidad_data, (int, float)) and cantidad_data >= 0:
+                    self.productos.append(producto)
+                    self.cantidades.append(cantidad_data)
+                    dual.append(False)
+            self.categorias.extend([categoria] * (len(self.productos) - inicio))
+        
+        # Unir con los umbrales: bultos/unidad usan "X (Bultos)" / "X (Unidad)"
+        generic = thresholds.generic
+        index, bultos_index, unidad_index = thresholds.index, thresholds.bultos_index, thresholds.unidad_index
+        filas_a = np.array([
+            (bultos_index if es_dual else index).get(producto, generic)
+            for producto, es_dual in zip(self.productos, dual)
+        ], dtype=np.intp)
+        filas_b = np.array([
+            unidad_index.get(producto, generic) if es_dual else generic
+            for producto, es_dual in zip(self.productos, dual)
+        ], dtype=np.intp)
+        valor_a = [c["bultos"] if es_dual else c for c, es_dual in zip(self.cantidades, dual)]
+        valor_b = [c["unidad"] if es_dual else float("inf") for c, es_dual in zip(self.cantidades, dual)]  # inf no afecta el mínimo
+        
+        self.dual = np.array(dual, dtype=bool)
+        self.configured = filas_a != generic
+        status_a = thresholds.classify(_float_array(valor_a), filas_a)
+        status_b = thresholds.classify(_float_array(valor_b), filas_b)
+        self.status = np.where(self.dual, np.minimum(status_a, status_b), status_a)
+    
+    def __len__(self) -> int:
+        return len(self.productos)
+    
+    def counts(self) -> Dict[str, int]:
+        """Cantidad de productos por estado"""
+        totals = np.bincount(self.status, minlength=3) if len(self) else np.zeros(3, dtype=int)
+        return {code: int(totals[i]) for i, code in enumerate(STATUS_CODES)}
+    
+    def groups(self) -> Dict[str, _StatusRows]:
+        """Filas agrupadas por estado, en el orden del inventario"""
+        return {code: _StatusRows(self, np.flatnonzero(self.status == i)) for i, code in enumerate(STATUS_CODES)}
+    
+    def row(self, i: int) -> Dict[str, Any]:
+        """Diccionario para mostrar una fila (mismo formato que get_products_by_status)"""
+        status = int(self.status[i])
+        if self.dual[i]:
+            bultos, unidad = self.cantidades[i]["bultos"], self.cantidades[i]["unidad"]
+            return {
+                "producto": self.productos[i],
+                "categoria": self.categorias[i],
+                "cantidad": f"B:{bultos}, U:{unidad}",
+                "bultos": bultos,
+                "unidad": unidad,
+                "emoji": STATUS_EMOJIS[status],
+                "descripcion": f"{STATUS_DESC_BULTOS_UNIDAD[status]} (B:{bultos}, U:{unidad})"
+            }
+        descripciones = STATUS_DESC_CONFIGURED if self.configured[i] else STATUS_DESC_GENERIC
+        return {
+            "producto": self.productos[i],
+            "categoria": self.categorias[i],
+            "cantidad": self.cantidades[i],
+            "emoji": STATUS_EMOJIS[status],
+            "descripcion": descripciones[status]
+        }
 
 class StockAlertSystem:
     """
@@ -15,6 +179,8 @@ class StockAlertSystem:
     def __init__(self, config_file="stock_thresholds.json"):
         self.config_file = config_file
         self.thresholds = self._load_thresholds()
+        self._threshold_table = None
+        self._threshold_table_key = None
     
     def _load_thresholds(self) -> Dict[str, Dict[str, float]]:
         """Cargar umbrales de stock desde archivo JSON"""
@@ -174,64 +340,28 @@ class StockAlertSystem:
             "critico": critico,
             "medio": medio
         }
+        self._threshold_table = None
     
-    def get_products_by_status(self, inventario: Dict) -> Dict[str, list]:
-        """Agrupar productos por estado de stock - ACTUALIZADO para bultos/unidad"""
-        status_groups = {
-            "critical": [],
-            "warning": [], 
-            "success": []
-        }
+    def get_threshold_table(self) -> ThresholdTable:
+        """Umbrales compilados en arreglos (se recompilan si cambian los umbrales)"""
+        key = (id(self.thresholds), len(self.thresholds))
+        if self._threshold_table is None or self._threshold_table_key != key:
+            self._threshold_table = ThresholdTable(self.thresholds)
+            self._threshold_table_key = key
+        return self._threshold_table
+    
+    def evaluate_inventory(self, inventario: Dict) -> StockStatusTable:
+        """Clasificar todo el inventario de una tienda en una sola pasada columnar"""
+        return StockStatusTable(inventario, self.get_threshold_table())
+    
+    def get_products_by_status(self, inventario: Dict) -> Dict[str, Sequence]:
+        """
+        Agrupar productos por estado de stock - ACTUALIZADO para bultos/unidad
         
-        for categoria, productos in inventario.items():
-            for producto, cantidad_data in productos.items():
-                # Manejar nueva estructura bultos/unidad para Impulsivo y Extras
-                if isinstance(cantidad_data, dict) and "bultos" in cantidad_data and "unidad" in cantidad_data:
-                    # Nueva estructura: {"bultos": X, "unidad": Y}
-                    bultos = cantidad_data.get("bultos", 0)
-                    unidad = cantidad_data.get("unidad", 0)
-                    
-                    # Para alertas, evaluamos bultos y unidades por separado
-                    # Pero mostramos el estado más crítico
-                    emoji_bultos, status_bultos, desc_bultos = self.get_stock_status(f"{producto} (Bultos)", bultos)
-                    emoji_unidad, status_unidad, desc_unidad = self.get_stock_status(f"{producto} (Unidad)", unidad)
-                    
-                    # Determinar el estado más crítico
-                    if status_bultos == "critical" or status_unidad == "critical":
-                        estado_final = "critical"
-                        emoji_final = "🔴"
-                        desc_final = f"Crítico (B:{bultos}, U:{unidad})"
-                    elif status_bultos == "warning" or status_unidad == "warning":
-                        estado_final = "warning"
-                        emoji_final = "🟡"
-                        desc_final = f"Atención (B:{bultos}, U:{unidad})"
-                    else:
-                        estado_final = "success"
-                        emoji_final = "🟢"
-                        desc_final = f"OK (B:{bultos}, U:{unidad})"
-                    
-                    status_groups[estado_final].append({
-                        "producto": producto,
-                        "categoria": categoria,
-                        "cantidad": f"B:{bultos}, U:{unidad}",
-                        "bultos": bultos,
-                        "unidad": unidad,
-                        "emoji": emoji_final,
-                        "descripcion": desc_final
-                    })
-                    
-                elif isinstance(cantidad_data, (int, float)) and cantidad_data >= 0:
-                    # Estructura simple (Por Kilos o datos antiguos)
-                    emoji, status, desc = self.get_stock_status(producto, cantidad_data)
-                    status_groups[status].append({
-                        "producto": producto,
-                        "categoria": categoria,
-                        "cantidad": cantidad_data,
-                        "emoji": emoji,
-                        "descripcion": desc
-                    })
-        
-        return status_groups
+        Cada grupo es una secuencia de diccionarios que se arman recién al
+        recorrerla; contar productos con len() no formatea nada.
+        """
+        return self.evaluate_inventory(inventario).groups()
     
     def render_stock_alert_badge(self, producto: str, cantidad: float, 
                                 show_details: bool = True) -> str:
@@ -10,7 +10,7 @@ import json
 from ...core.inventory_types import InventoryType
 from ...core.data_models import InventoryRecord
 from ...data.persistence import DataPersistence
-from ...data.history import HistoryManager, HistoryFilter, HistoryAnalyzer
+from ...data.history import HistoryManager, HistoryFilter, HistoryAnalyzer, HistoryQueryService
 from ..components.widgets import (
     FilterPanel, MetricCards, StatusIndicators, 
     NotificationManager, ActionButtons, LoadingManager
@@ -24,6 +24,7 @@ class AdminHistoryUI:
         self._history = HistoryManager()
         self._filter = HistoryFilter()
         self._analyzer = HistoryAnalyzer()
+        self._query = HistoryQueryService(self._history)
         
         # Inicializar en session_state
         if "admin_history_ui" not in st.session_state:
@@ -62,11 +63,11 @@ class AdminHistoryUI:
         
         # Panel de filtros
         with st.expander("🔧 Filtros de Búsqueda", expanded=True):
-            col1, col2, col3 = st.columns(3)
+            col1, col2, col3, col4 = st.columns(4)
             
             with col1:
                 # Filtro por usuario
-                all_users = self._history.get_all_users()
+                all_users = self._query.users()
                 selected_user = FilterPanel.render_user_filter(
                     all_users, "history_user_filter"
                 )
@@ -76,6 +77,12 @@ class AdminHistoryUI:
                 selected_type = FilterPanel.render_type_filter("history_type_filter")
             
             with col3:
+                # Filtro por tienda
+                selected_store = st.selectbox(
+                    "🏪 Tienda", ["Todas"] + self._query.stores(), key="history_store_filter"
+                )
+            
+            with col4:
                 # Filtro por período
                 period = st.selectbox(
                     "📅 Período", 
@@ -99,39 +106,33 @@ class AdminHistoryUI:
         filters = {
             "user": selected_user if selected_user != "Todos" else None,
             "inventory_type": selected_type if selected_type != "Todos" else None,
+            "store": selected_store if selected_store != "Todas" else None,
             "start_date": start_date,
             "end_date": end_date
         }
         
-        # Cargar registros filtrados
-        with LoadingManager.spinner("Cargando historial..."):
-            records = self._filter.apply_filters(filters)
+        # Métricas del período (contadores pre-agregados)
+        metrics = self._query.metrics(filters)
         
-        if not records:
+        if not metrics["total_records"]:
             st.info("No se encontraron registros con los filtros aplicados")
             return
         
-        # Métricas del período
         st.markdown("### 📊 Métricas del Período")
         
-        total_records = len(records)
-        unique_users = len(set(r.get('usuario', '') for r in records))
-        unique_products = len(set(r.get('producto', '') for r in records if r.get('producto')))
-        
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("📝 Total Registros", total_records)
+            st.metric("📝 Total Registros", metrics["total_records"])
         
         with col2:
-            st.metric("👥 Usuarios Activos", unique_users)
+            st.metric("👥 Usuarios Activos", metrics["unique_users"])
         
         with col3:
-            st.metric("🏷️ Productos Únicos", unique_products)
+            st.metric("🏷️ Productos Únicos", metrics["unique_products"])
         
         with col4:
-            avg_per_day = total_records / max((end_date - start_date).days, 1)
-            st.metric("📅 Promedio/Día", f"{avg_per_day:.1f}")
+            st.metric("📅 Promedio/Día", f"{metrics['avg_per_day']:.1f}")
         
         # Tabla de registros
         st.markdown("---")
@@ -146,14 +147,22 @@ class AdminHistoryUI:
         with col2:
             sort_order = st.selectbox("Ordenar por", ["Más recientes", "Más antiguos"], key="sort_order")
         
-        # Mostrar registros
-        sorted_records = sorted(
-            records, 
-            key=lambda x: x.get('fecha', ''),
-            reverse=(sort_order == "Más recientes")
-        )
+        # Paginación por cursor: se reinicia cuando cambian filtros u orden
+        state = st.session_state.admin_history_ui
+        query_key = repr((sorted((k, str(v)) for k, v in filters.items()), sort_order))
+        if state.get("query_key") != query_key:
+            state["query_key"] = query_key
+            state["cursors"] = [None]
+        
+        with LoadingManager.spinner("Cargando historial..."):
+            page = self._query.query(
+                filters,
+                newest_first=(sort_order == "Más recientes"),
+                limit=50,
+                cursor=state["cursors"][-1]
+            )
         
-        for i, record in enumerate(sorted_records[:50]):  # Limitar a 50 registros
+        for record in page.records:
             with st.expander(
                 f"{record.get('fecha', 'Sin fecha')} - "
                 f"{record.get('usuario', 'Usuario desconocido')} - "
@@ -164,8 +173,20 @@ class AdminHistoryUI:
                 else:
                     self._render_record_summary(record)
         
-        if len(sorted_records) > 50:
-            st.info(f"Mostrando 50 de {len(sorted_records)} registros. Use filtros para refinar la búsqueda.")
+        page_number = len(state["cursors"])
+        st.caption(f"Página {page_number} · {len(page.records)} de {metrics['total_records']} registros")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if page_number > 1 and st.button("⬅️ Anteriores", key="history_prev_page"):
+                state["cursors"].pop()
+                st.rerun()
+        
+        with col2:
+            if page.has_more and st.button("Siguientes ➡️", key="history_next_page"):
+                state["cursors"].append(page.next_cursor)
+                st.rerun()
     
     def _render_record_details(self, record: Dict[str, Any]):
         """Renderiza detalles completos de un registro"""
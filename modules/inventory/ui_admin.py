@@ -53,19 +53,11 @@ def obtener_ultimo_modo(producto: str, categoria: str, tienda_id: str = "T001")
     """Obtiene el último UME (Unidad, Caja, Tira) usado para un producto del historial"""
     try:
         try:
-            from .persistencia import cargar_historial
+            from .persistencia import obtener_ultimo_modo_historial
         except ImportError:
-            from persistencia import cargar_historial
-        historial = cargar_historial(tienda_id)
-        
-        # Buscar el último registro de este producto en esta categoría
-        for registro in reversed(historial):
-            if registro.get("producto") == producto and registro.get("categoria") == categoria:
-                modo = registro.get("modo", "N/A")
-                # El modo guarda el UME (Unidad, Caja, Tira) o "Modificar"
-                if modo in ["Unidad", "Caja", "Tira"]:
-                    return modo
-        return "N/A"
+            from persistencia import obtener_ultimo_modo_historial
+        # Índice de últimos modos: no recorre el historial por cada producto
+        return obtener_ultimo_modo_historial(tienda_id, categoria, producto)
     except Exception as e:
         return "N/A"
 
@@ -846,6 +838,21 @@ def admin_mermas_ui(tienda_id, tiendas_opciones):
                     st.error(f"Error generando Excel: {str(e)}")
         
         with col_export2:
+            if st.button("📄 Descargar CSV - Datos Filtrados", key="download_csv_filtered"):
+                try:
+                    tienda_export = None if mostrar_todas else tienda_id
+                    csv_data = mermas_manager.exportar_a_csv(tienda_export, fecha_inicio, fecha_fin)
+                    
+                    st.download_button(
+                        label="💾 Descargar archivo CSV",
+                        data=csv_data,
+                        file_name=f"mermas_{titulo_tienda.replace(' ', '_')}_{fecha_inicio}_{fecha_fin}.csv",
+                        mime="text/csv",
+                        key="download_csv_button"
+                    )
+                except Exception as e:
+                    st.error(f"Error generando CSV: {str(e)}")
+            
             st.info("💡 **Tip**: El archivo Excel incluye una hoja de resumen con estadísticas adicionales")
     
     else:
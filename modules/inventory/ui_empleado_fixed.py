@@ -2,7 +2,7 @@
 import streamlit as st
 from datetime import date, datetime
 from .config_tiendas import selector_tienda_empleado, GestorTiendas, obtener_nombre_tienda
-from .persistencia import cargar_inventario, guardar_inventario, guardar_historial
+from .persistencia import cargar_inventario, guardar_carrito_inventario
 from .valores_persistencia import valores_persistencia
 
 # Configuración para mejorar rendimiento
@@ -290,45 +290,19 @@ def mostrar_interfaz_empleado(inventario=None, usuario="empleado1", opciones_val
             
             total_productos = len(st.session_state.carrito_temporal)
             
-            # Crear barra de progreso
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            # Procesar cada producto del carrito
-            for idx, entrada in enumerate(st.session_state.carrito_temporal):
-                # Actualizar progreso
-                progreso = (idx + 1) / total_productos
-                progress_bar.progress(progreso)
-                status_text.text(f"Guardando {entrada['producto']} ({idx + 1}/{total_productos})")
-                
-                # Estructurar datos para guardar
-                inventario_entrada = {
-                    entrada['categoria']: {
-                        entrada['producto']: entrada['cantidad']
-                    }
-                }
-                
-                # Guardar en inventario
-                if not guardar_inventario(inventario_entrada, tienda_id, fecha_carga):
-                    st.error(f"❌ Error guardando {entrada['producto']}")
-                    continue
-                
-                # Guardar en historial con más información
-                # La función guardar_historial espera: fecha, usuario, categoria, producto, cantidad, modo, tipo_inventario, tienda_id
-                guardar_historial(
-                    fecha=str(fecha_carga),
+            # Confirmar todo el carrito en una sola transacción (inventario + historial)
+            with st.spinner(f"Guardando {total_productos} productos..."):
+                guardado = guardar_carrito_inventario(
+                    st.session_state.carrito_temporal,
                     usuario=usuario,
-                    categoria=entrada['categoria'],
-                    producto=entrada['producto'],
-                    cantidad=str(entrada['cantidad']),
-                    modo='carga_inventario',
+                    fecha=str(fecha_carga),
                     tipo_inventario=tipo_inventario,
                     tienda_id=tienda_id
                 )
             
-            # Limpiar progreso
-            progress_bar.empty()
-            status_text.empty()
+            if not guardado:
+                st.error("❌ Error guardando el carrito. No se guardó ningún producto, intenta nuevamente.")
+                return False
             
             # NO limpiar carrito - mantener productos visibles
             # Guardar fecha de última carga para verificación
@@ -339,6 +313,9 @@ def mostrar_interfaz_empleado(inventario=None, usuario="empleado1", opciones_val
                 entrada['guardado'] = True
                 entrada['fecha_guardado'] = str(fecha_carga)
             
+            # Escribir ya los valores del formulario que quedaron pendientes
+            valores_persistencia.guardar_pendientes()
+            
             st.success(f"✅ {total_productos} productos guardados y actualizados")
             return True
             
@@ -1,22 +1,54 @@
 # Sistema de Persistencia de Valores de Formularios
 # Mantiene los valores de inputs por 1 día para evitar recargarlos
 
+import atexit
+import copy
 import json
 import os
+import threading
 from datetime import datetime, date, timedelta
+from pathlib import Path
 from typing import Dict, Any, Optional
 
+try:
+    from .data.fragmentos import bloqueo_archivo
+except ImportError:
+    from data.fragmentos import bloqueo_archivo
+
+# Con el backend SQLite los valores van a la tabla valores (ver data/storage.py)
+try:
+    from .data.storage import get_storage_backend, BACKEND_POR_DEFECTO
+except ImportError:
+    from data.storage import get_storage_backend, BACKEND_POR_DEFECTO
+
 VALORES_FILE = "valores_formularios.json"
+# Segundos que se acumulan cambios en memoria antes de escribir el archivo
+DEBOUNCE_SEGUNDOS = 2.0
 
 class ValoresPersistencia:
     """
     Maneja la persistencia de valores de formularios por usuario y tienda.
     Los valores se mantienen por 1 día para facilitar la carga de inventario.
+    
+    guardar_valores no escribe el archivo en cada llamada: los valores quedan
+    pendientes en memoria (el último por usuario, tienda y fecha) y se escriben
+    juntos, en una sola reescritura, a los DEBOUNCE_SEGUNDOS de la primera
+    llamada pendiente, con guardar_pendientes() o al terminar el proceso.
+    Con el backend SQLite seleccionado lo pendiente se escribe en la base, en
+    una sola transacción, en lugar del archivo.
     """
     
-    def __init__(self):
+    def __init__(self, debounce_segundos: float = DEBOUNCE_SEGUNDOS):
         self.archivo_valores = VALORES_FILE
-        self._asegurar_archivo_existe()
+        self.debounce_segundos = debounce_segundos
+        self._pendientes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        self.backend = get_storage_backend("sqlite") if BACKEND_POR_DEFECTO == "sqlite" else None
+        if self.backend is None:
+            self._asegurar_archivo_existe()
+        # El timer es un hilo daemon: al cerrar el proceso se escribe lo pendiente
+        atexit.register(self.guardar_pendientes)
     
     def _asegurar_archivo_existe(self):
         """Crea el archivo de valores si no existe"""
@@ -40,16 +72,62 @@ class ValoresPersistencia:
                 return json.load(f)
     
     def _guardar_datos(self, data: Dict[str, Any]) -> bool:
-        """Guarda todos los datos de valores en el archivo"""
+        """Guarda todos los datos de valores en el archivo (escritura atómica)"""
         try:
             data["ultima_actualizacion"] = datetime.now().isoformat()
-            with open(self.archivo_valores, 'w', encoding='utf-8') as f:
+            tmp = f"{self.archivo_valores}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.archivo_valores)
             return True
         except Exception as e:
             print(f"Error guardando valores: {e}")
             return False
     
+    def _bloqueo(self):
+        """Bloqueo del archivo para leer-modificar-escribir entre procesos"""
+        return bloqueo_archivo(Path(f"{self.archivo_valores}.lock"))
+    
+    def _programar_escritura(self):
+        """Programa la escritura de lo pendiente si no hay una programada"""
+        if self._timer is None:
+            self._timer = threading.Timer(self.debounce_segundos, self._escritura_programada)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def _escritura_programada(self):
+        with self._lock:
+            self._timer = None
+            self.guardar_pendientes()
+    
+    def guardar_pendientes(self) -> bool:
+        """
+        Escribe ya los valores pendientes, en una sola reescritura del archivo
+        
+        Returns:
+            bool: True si no quedó nada pendiente
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pendientes:
+                return True
+            try:
+                if self.backend:
+                    guardado = self.backend.save_values(self._pendientes)
+                else:
+                    with self._bloqueo():
+                        data = self._cargar_datos()
+                        data["valores"].update(self._pendientes)
+                        guardado = self._guardar_datos(data)
+            except Exception as e:
+                print(f"Error guardando valores pendientes: {e}")
+                guardado = False
+            if guardado:
+                self._pendientes = {}
+            return guardado
+    
     def _generar_clave(self, usuario: str, tienda_id: str, fecha: str) -> str:
         """Genera clave única para identificar valores específicos"""
         return f"{usuario}_{tienda_id}_{fecha}"
@@ -64,12 +142,21 @@ class ValoresPersistencia:
         except:
             return False
     
+    @staticmethod
+    def _valor_vencido(valores: Dict[str, Any], fecha_limite: datetime) -> bool:
+        """Guardado antes del límite (o sin fecha legible, que también se elimina)"""
+        try:
+            return datetime.fromisoformat(valores.get("fecha_guardado", "")) < fecha_limite
+        except:
+            return True
+    
     def guardar_valores(self, usuario: str, tienda_id: str, fecha: date, 
                        valores_impulsivo: Dict = None, 
                        valores_kilos: Dict = None, 
-                       valores_extras: Dict = None) -> bool:
+                       valores_extras: Dict = None,
+                       inmediato: bool = False) -> bool:
         """
-        Guarda los valores de los formularios
+        Guarda los valores de los formularios (se escriben con la próxima escritura programada)
         
         Args:
             usuario: Nombre del usuario
@@ -78,12 +165,12 @@ class ValoresPersistencia:
             valores_impulsivo: Diccionario con valores de productos impulsivos
             valores_kilos: Diccionario con valores de productos por kilos
             valores_extras: Diccionario con valores de productos extras
+            inmediato: Escribir el archivo ahora en lugar de esperar
             
         Returns:
             bool: True si se guardó exitosamente
         """
         try:
-            data = self._cargar_datos()
             fecha_str = fecha.strftime("%Y-%m-%d") if isinstance(fecha, date) else str(fecha)
             clave = self._generar_clave(usuario, tienda_id, fecha_str)
             
@@ -92,13 +179,18 @@ class ValoresPersistencia:
                 "tienda_id": tienda_id,
                 "fecha": fecha_str,
                 "fecha_guardado": datetime.now().isoformat(),
-                "valores_impulsivo": valores_impulsivo or {},
-                "valores_kilos": valores_kilos or {},
-                "valores_extras": valores_extras or {}
+                # Copias: los diccionarios de la sesión siguen cambiando hasta la escritura
+                "valores_impulsivo": copy.deepcopy(valores_impulsivo or {}),
+                "valores_kilos": copy.deepcopy(valores_kilos or {}),
+                "valores_extras": copy.deepcopy(valores_extras or {})
             }
             
-            data["valores"][clave] = valores_completos
-            return self._guardar_datos(data)
+            with self._lock:
+                self._pendientes[clave] = valores_completos
+                if inmediato:
+                    return self.guardar_pendientes()
+                self._programar_escritura()
+            return True
             
         except Exception as e:
             print(f"Error guardando valores para {usuario}: {e}")
@@ -117,13 +209,17 @@ class ValoresPersistencia:
             Dict con tres claves: valores_impulsivo, valores_kilos, valores_extras
         """
         try:
-            data = self._cargar_datos()
             fecha_str = fecha.strftime("%Y-%m-%d") if isinstance(fecha, date) else str(fecha)
             clave = self._generar_clave(usuario, tienda_id, fecha_str)
             
-            if clave in data["valores"]:
-                valores_data = data["valores"][clave]
-                
+            with self._lock:
+                valores_data = self._pendientes.get(clave)
+            if valores_data is None and self.backend:
+                valores_data = self.backend.get_values(clave)
+            elif valores_data is None:
+                valores_data = self._cargar_datos()["valores"].get(clave)
+            
+            if valores_data is not None:
                 # Verificar que los valores estén vigentes (menos de 1 día)
                 if self._valores_vigentes(valores_data.get("fecha_guardado", "")):
                     return {
@@ -149,13 +245,19 @@ class ValoresPersistencia:
     def limpiar_valores(self, usuario: str, tienda_id: str, fecha: date) -> bool:
         """Elimina los valores guardados"""
         try:
-            data = self._cargar_datos()
             fecha_str = fecha.strftime("%Y-%m-%d") if isinstance(fecha, date) else str(fecha)
             clave = self._generar_clave(usuario, tienda_id, fecha_str)
             
-            if clave in data["valores"]:
-                del data["valores"][clave]
-                return self._guardar_datos(data)
+            with self._lock:
+                self._pendientes.pop(clave, None)
+                if self.backend:
+                    self.backend.delete_values([clave])
+                    return True
+                with self._bloqueo():
+                    data = self._cargar_datos()
+                    if clave in data["valores"]:
+                        del data["valores"][clave]
+                        return self._guardar_datos(data)
             
             return True
             
@@ -174,28 +276,33 @@ class ValoresPersistencia:
             int: Número de registros limpiados
         """
         try:
-            data = self._cargar_datos()
-            fecha_limite = datetime.now() - timedelta(days=dias_antiguedad)
-            registros_eliminados = 0
-            
-            claves_a_eliminar = []
+            self.guardar_pendientes()
+            if self.backend:
+                fecha_limite = datetime.now() - timedelta(days=dias_antiguedad)
+                with self._lock:
+                    claves_a_eliminar = [clave for clave, valores in self.backend.query_values().items()
+                                         if self._valor_vencido(valores, fecha_limite)]
+                    return self.backend.delete_values(claves_a_eliminar)
             
-            for clave, valores in data["valores"].items():
-                try:
-                    fecha_guardado = datetime.fromisoformat(valores.get("fecha_guardado", ""))
-                    if fecha_guardado < fecha_limite:
+            with self._lock, self._bloqueo():
+                data = self._cargar_datos()
+                fecha_limite = datetime.now() - timedelta(days=dias_antiguedad)
+                registros_eliminados = 0
+                
+                claves_a_eliminar = []
+                
+                for clave, valores in data["valores"].items():
+                    if self._valor_vencido(valores, fecha_limite):
                         claves_a_eliminar.append(clave)
-                except:
-                    claves_a_eliminar.append(clave)
-            
-            for clave in claves_a_eliminar:
-                del data["valores"][clave]
-                registros_eliminados += 1
-            
-            if registros_eliminados > 0:
-                self._guardar_datos(data)
-            
-            return registros_eliminados
+                
+                for clave in claves_a_eliminar:
+                    del data["valores"][clave]
+                    registros_eliminados += 1
+                
+                if registros_eliminados > 0:
+                    self._guardar_datos(data)
+                
+                return registros_eliminados
             
         except Exception as e:
             print(f"Error limpiando valores antiguos: {e}")
@@ -36,6 +36,37 @@ def calcular_horas_especiales(entrada_dt, salida_dt):
     
     return horas_normales, horas_especiales
 
+def calcular_horas_especiales_columnas(entrada_dt, salida_dt):
+    """
+    Versión columnar de calcular_horas_especiales.
+    Recibe Series datetime64 alineadas y aplica la misma regla por fila:
+    la franja especial es 20:00-22:00 del día de entrada.
+    
+    Args:
+        entrada_dt (Series): Horas de entrada
+        salida_dt (Series): Horas de salida (ya ajustadas si cruzan medianoche)
+    
+    Returns:
+        tuple: (horas_totales, horas_normales, horas_especiales) como Series float
+    """
+    total_horas = (salida_dt - entrada_dt).dt.total_seconds() / 3600
+    
+    # Igual que replace(hour=20, minute=0, second=0): conserva los microsegundos
+    dia = entrada_dt.dt.normalize()
+    microsegundos = entrada_dt - entrada_dt.dt.floor("s")
+    inicio_especial = dia + timedelta(hours=20) + microsegundos
+    fin_especial = dia + timedelta(hours=22) + microsegundos
+    
+    inicio_interseccion = entrada_dt.where(entrada_dt > inicio_especial, inicio_especial)
+    fin_interseccion = salida_dt.where(salida_dt < fin_especial, fin_especial)
+    
+    horas_especiales = (fin_interseccion - inicio_interseccion).dt.total_seconds() / 3600
+    horas_especiales = horas_especiales.where(inicio_interseccion < fin_interseccion, 0.0)
+    
+    horas_normales = total_horas - horas_especiales
+    
+    return total_horas, horas_normales, horas_especiales
+
 def horas_a_horasminutos(horas):
     """
     Convierte horas decimales a formato horas:minutos
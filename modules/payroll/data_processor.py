@@ -10,6 +10,22 @@ import calculations
 calcular_horas_especiales = calculations.calcular_horas_especiales
 horas_a_horasminutos = calculations.horas_a_horasminutos
 calcular_sueldo_basico = calculations.calcular_sueldo_basico
+calcular_horas_especiales_columnas = calculations.calcular_horas_especiales_columnas
+
+try:
+    from shared.streaming_export import Columna, Hoja, exportar_excel, filas_de_dataframe
+except ImportError:
+    import os
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from shared.streaming_export import Columna, Hoja, exportar_excel, filas_de_dataframe
+
+# Columnas monetarias de la hoja de resultados (formato con separador de miles)
+COLUMNAS_MONETARIAS = ['Valor_Hora_Normal', 'Valor_Hora_Especial', 'Sueldo_Normal',
+                       'Sueldo_Especial', 'Sueldo_Bruto', 'Descuentos', 'Sueldo_Neto']
+
+# Columnas de descuento opcionales (solo presentes en Excel)
+COLUMNAS_DESCUENTO = ["Descuento Inventario", "Descuento Caja", "Retiro"]
 
 def validar_archivo_excel(file):
     """
@@ -51,7 +67,7 @@ def validar_archivo_excel(file):
     except Exception as e:
         return False, f"Error leyendo el archivo: {str(e)}"
 
-def procesar_datos_excel(df, valor_por_hora, opcion_feriados, dias_feriados, cantidad_feriados):
+def procesar_datos_excel(df, valor_por_hora, opcion_feriados, dias_feriados, cantidad_feriados, vectorizado=True):
     """
     Procesa los datos del DataFrame y calcula los sueldos
     
@@ -61,6 +77,7 @@ def procesar_datos_excel(df, valor_por_hora, opcion_feriados, dias_feriados, can
         opcion_feriados (str): Opción de feriados ('personalizado' o 'cantidad')
         dias_feriados (list): Lista de fechas de feriados (si opcion es 'personalizado')
         cantidad_feriados (int): Cantidad de feriados (si opcion es 'cantidad')
+        vectorizado (bool): Usa el cálculo por columnas (False = fila por fila)
     
     Returns:
         tuple: (resultados, total_horas, total_sueldos, total_horas_normales, total_horas_especiales)
@@ -86,9 +103,14 @@ def procesar_datos_excel(df, valor_por_hora, opcion_feriados, dias_feriados, can
     total_horas_normales = 0
     total_horas_especiales = 0
     
-    for index, row in df.iterrows():
+    calculados = calcular_sueldos_columnas(df, valor_por_hora, fechas_feriados) if vectorizado else {}
+    
+    for posicion, index in enumerate(df.index):
         try:
-            resultado = procesar_fila_empleado(row, valor_por_hora, fechas_feriados)
+            resultado = calculados.get(posicion)
+            if resultado is None:
+                # Filas que el cálculo por columnas no pudo interpretar: camino escalar
+                resultado = procesar_fila_empleado(df.iloc[posicion], valor_por_hora, fechas_feriados)
             
             if resultado:
                 resultados.append(resultado["datos"])
@@ -106,6 +128,105 @@ def procesar_datos_excel(df, valor_por_hora, opcion_feriados, dias_feriados, can
     
     return resultados, total_horas, total_sueldos, total_horas_normales, total_horas_especiales
 
+def calcular_sueldos_columnas(df, valor_por_hora, fechas_feriados):
+    """
+    Calcula horas y sueldos de todas las filas con operaciones por columna.
+    
+    Fecha/Entrada/Salida se parsean una vez por columna; los turnos que
+    cruzan medianoche, la franja especial 20:00-22:00 y el factor x2 de
+    feriados se resuelven con operaciones vectoriales. El resultado de cada
+    fila es idéntico al de procesar_fila_empleado.
+    
+    Returns:
+        dict: posición de la fila -> resultado (mismo formato que procesar_fila_empleado).
+              Las filas que no se pudieron interpretar no aparecen.
+    """
+    if df.empty:
+        return {}
+    
+    fechas = pd.to_datetime(df["Fecha"], format="mixed", errors="coerce")
+    entradas = pd.to_datetime(df["Entrada"].astype(str), format="mixed", errors="coerce")
+    salidas = pd.to_datetime(df["Salida"].astype(str), format="mixed", errors="coerce")
+    validas = fechas.notna() & entradas.notna() & salidas.notna()
+    
+    descuentos = {}
+    for columna in COLUMNAS_DESCUENTO:
+        if columna in df.columns:
+            valores = pd.to_numeric(df[columna], errors="coerce")
+            # Un valor no numérico hace fallar float() en el camino escalar
+            validas &= valores.notna() | df[columna].isna()
+            descuentos[columna] = valores
+    
+    if not validas.any():
+        return {}
+    
+    # Combinar fecha + hora de entrada/salida
+    dia = fechas.dt.normalize()
+    entrada_dt = dia + (entradas - entradas.dt.normalize())
+    salida_dt = dia + (salidas - salidas.dt.normalize())
+    
+    # Si la salida es menor que la entrada, pasó a la madrugada del día siguiente
+    salida_dt = salida_dt.where(~(salida_dt < entrada_dt), salida_dt + timedelta(days=1))
+    
+    horas_trabajadas, horas_normales, horas_especiales = calcular_horas_especiales_columnas(entrada_dt, salida_dt)
+    
+    es_feriado = dia.dt.date.isin(list(fechas_feriados)) if fechas_feriados else pd.Series(False, index=df.index)
+    factor_feriado = es_feriado.map({True: 2, False: 1})
+    
+    sueldo_normal = horas_normales * valor_por_hora
+    sueldo_especial = horas_especiales * valor_por_hora * 1.3  # 30% extra
+    sueldo_bruto = (sueldo_normal + sueldo_especial) * factor_feriado
+    
+    sueldo_final = sueldo_bruto
+    for columna in COLUMNAS_DESCUENTO:
+        if columna in descuentos:
+            sueldo_final = sueldo_final - descuentos[columna].fillna(0)
+    
+    # Armar filas de salida solo con las columnas ya calculadas
+    columnas = zip(
+        range(len(df)), validas.tolist(), df["Empleado"].tolist(),
+        dia.dt.strftime("%Y-%m-%d").tolist(),
+        entradas.dt.strftime("%H:%M").tolist(), salidas.dt.strftime("%H:%M").tolist(),
+        es_feriado.tolist(), horas_trabajadas.tolist(), horas_normales.tolist(),
+        horas_especiales.tolist(), sueldo_final.tolist(),
+        *[df[c].tolist() if c in descuentos else [None] * len(df) for c in COLUMNAS_DESCUENTO]
+    )
+    
+    calculados = {}
+    for (posicion, valida, empleado, fecha, entrada, salida, feriado, horas, normales,
+         especiales, final, desc_inventario, desc_caja, retiro) in columnas:
+        if not valida:
+            continue
+        
+        # Mismo criterio que el camino escalar: nulo -> 0, si no float()
+        desc_inventario, desc_caja, retiro = (
+            0 if valor is None or pd.isnull(valor) else float(valor)
+            for valor in (desc_inventario, desc_caja, retiro)
+        )
+        
+        calculados[posicion] = {
+            "datos": {
+                "Empleado": str(empleado),
+                "Fecha": fecha,
+                "Entrada": entrada,
+                "Salida": salida,
+                "Feriado": "Sí (x2)" if feriado else "No",
+                "Horas Trabajadas (h:mm)": horas_a_horasminutos(horas),
+                "Horas Normales": horas_a_horasminutos(normales),
+                "Horas Especiales": horas_a_horasminutos(especiales),
+                "Descuento Inventario": desc_inventario,
+                "Descuento Caja": desc_caja,
+                "Retiro": retiro,
+                "Sueldo Final": round(final, 2)
+            },
+            "horas": horas,
+            "sueldo": final,
+            "horas_normales": normales,
+            "horas_especiales": especiales
+        }
+    
+    return calculados
+
 def procesar_fila_empleado(row, valor_por_hora, fechas_feriados):
     """
     Procesa una fila individual del DataFrame - VERSIÓN SIMPLIFICADA
@@ -146,10 +267,6 @@ def procesar_fila_empleado(row, valor_por_hora, fechas_feriados):
         fecha_comparar = fecha.date()
         es_feriado = fecha_comparar in fechas_feriados
         factor_feriado = 2 if es_feriado else 1
-        
-        # Debug silencioso
-        if fechas_feriados and es_feriado:
-            print(f"DEBUG: Feriado detectado para {row['Empleado']} el {fecha_comparar}")
 
         # Cálculo con horas normales y especiales
         sueldo_normal = horas_normales * valor_por_hora
@@ -243,12 +360,10 @@ def mostrar_resultados(resultados, total_horas, total_sueldos, total_horas_norma
     # Botón de descarga
     st.subheader("📥 Descargar Resultados")
     
-    # Preparar Excel para descarga
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_result.to_excel(writer, sheet_name='Resultados', index=False)
-    
-    excel_data = output.getvalue()
+    # Preparar Excel para descarga (escrito fila por fila en un temporal)
+    excel_data = exportar_excel([
+        Hoja('Resultados', [Columna(str(col)) for col in df_result.columns], filas_de_dataframe(df_result))
+    ])
     
     # Generar nombre de archivo
     fecha_actual = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -268,50 +383,36 @@ def exportar_resultados(df_resultados, filename_prefix="resultados_sueldos"):
     """
     Exporta los resultados a Excel
     
+    Las filas se escriben directo desde el DataFrame, por bloques, en un
+    archivo temporal (sin copia intermedia en memoria).
+    
     Args:
         df_resultados (DataFrame): DataFrame con los resultados
         filename_prefix (str): Prefijo para el nombre del archivo
     
     Returns:
-        bytes: Archivo Excel en bytes para descarga
+        bytes: Archivo Excel, para st.download_button
     """
-    output = io.BytesIO()
-    
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        # Hoja principal con resultados
-        df_resultados.to_excel(writer, sheet_name='Resultados', index=False)
-        
-        # Hoja de resumen
-        resumen = {
-            'Concepto': ['Total Empleados', 'Total Horas', 'Total Sueldo Bruto', 'Total Descuentos', 'Total Sueldo Neto'],
-            'Valor': [
-                len(df_resultados),
-                df_resultados['Total_Horas'].sum(),
-                df_resultados['Sueldo_Bruto'].sum(),
-                df_resultados['Descuentos'].sum(),
-                df_resultados['Sueldo_Neto'].sum()
-            ]
-        }
-        
-        df_resumen = pd.DataFrame(resumen)
-        df_resumen.to_excel(writer, sheet_name='Resumen', index=False)
-        
-        # Formatear las hojas
-        workbook = writer.book
-        money_format = workbook.add_format({'num_format': '#,##0'})
-        
-        # Aplicar formato a columnas monetarias en la hoja de resultados
-        worksheet_resultados = writer.sheets['Resultados']
-        money_cols = ['Valor_Hora_Normal', 'Valor_Hora_Especial', 'Sueldo_Normal', 
-                     'Sueldo_Especial', 'Sueldo_Bruto', 'Descuentos', 'Sueldo_Neto']
-        
-        for col_name in money_cols:
-            if col_name in df_resultados.columns:
-                col_num = df_resultados.columns.get_loc(col_name)
-                worksheet_resultados.set_column(col_num, col_num, 15, money_format)
-    
-    output.seek(0)
-    return output.getvalue()
+    # Hoja principal con resultados; formato monetario declarado por columna
+    columnas = [
+        Columna(str(col), 15, 'moneda') if col in COLUMNAS_MONETARIAS else Columna(str(col))
+        for col in df_resultados.columns
+    ]
+    
+    # Hoja de resumen
+    resumen = [
+        ['Total Empleados', len(df_resultados)],
+        ['Total Horas', df_resultados['Total_Horas'].sum()],
+        ['Total Sueldo Bruto', df_resultados['Sueldo_Bruto'].sum()],
+        ['Total Descuentos', df_resultados['Descuentos'].sum()],
+        ['Total Sueldo Neto', df_resultados['Sueldo_Neto'].sum()]
+    ]
+    resumen = [[concepto, valor.item() if hasattr(valor, 'item') else valor] for concepto, valor in resumen]
+    
+    return exportar_excel([
+        Hoja('Resultados', columnas, filas_de_dataframe(df_resultados)),
+        Hoja('Resumen', [Columna('Concepto'), Columna('Valor')], resumen)
+    ])
 
 def crear_plantilla_excel():
     """
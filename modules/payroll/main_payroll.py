@@ -64,6 +64,7 @@ except ImportError as e:
 try:
     import pdf_processor
     procesar_pdf_a_dataframe = pdf_processor.procesar_pdf_a_dataframe
+    procesar_pdfs_a_dataframes = pdf_processor.procesar_pdfs_a_dataframes
     validar_datos_pdf = pdf_processor.validar_datos_pdf
     detectar_registros_incompletos = pdf_processor.detectar_registros_incompletos
     filtrar_registros_sin_asistencia = pdf_processor.filtrar_registros_sin_asistencia
@@ -72,7 +73,7 @@ try:
 except ImportError as e:
     payroll_imports_ok = False
     pdf_processor_available = False
-    procesar_pdf_a_dataframe = validar_datos_pdf = None
+    procesar_pdf_a_dataframe = procesar_pdfs_a_dataframes = validar_datos_pdf = None
     detectar_registros_incompletos = filtrar_registros_sin_asistencia = detectar_horarios_ambiguos = None
     st.error(f"❌ Error importando pdf_processor: {e}")
 
@@ -533,10 +534,17 @@ def process_pdf_files(archivos_pdf):
     dataframes_list = []
     nombres_archivos_pdf = []
     
-    # Procesar cada PDF
-    for idx, archivo_pdf in enumerate(archivos_pdf, 1):
-        df_temp = procesar_pdf_a_dataframe(archivo_pdf)
-        
+    # Extraer los PDFs en paralelo (pool de procesos) con progreso por archivo
+    barra_progreso = st.progress(0.0, text="Extrayendo texto de los PDFs...")
+    
+    def actualizar_progreso(fraccion, mensaje):
+        barra_progreso.progress(min(fraccion, 1.0), text=mensaje)
+    
+    dataframes_pdf = procesar_pdfs_a_dataframes(archivos_pdf, progress_callback=actualizar_progreso)
+    barra_progreso.empty()
+    
+    # Validar cada PDF en el orden en que se subieron
+    for idx, (archivo_pdf, df_temp) in enumerate(zip(archivos_pdf, dataframes_pdf), 1):
         if df_temp.empty:
             st.warning(f"⚠️ No se pudieron extraer datos del PDF {idx}: {archivo_pdf.name}")
         else:
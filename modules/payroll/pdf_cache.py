@@ -0,0 +1,172 @@
+"""
+Caché en disco de PDFs de nómina ya procesados
+Evita volver a extraer y analizar el mismo PDF cuando se vuelve a subir
+(algo muy frecuente mientras se corrigen horarios ambiguos)
+"""
+import hashlib
+import io
+import os
+import threading
+import pandas as pd
+
+# Parquet (columnar, comprimido) si pyarrow está disponible; si no, pickle comprimido
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Incrementar cuando cambie la lógica de pdf_processor / smart_parser:
+# invalida todas las entradas anteriores sin borrar el directorio a mano
+VERSION_PARSER = "2"
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(".cache", "payroll_pdf"))
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "200"))
+
+class PDFCache:
+    """
+    Caché de texto extraído y DataFrames resultantes, indexada por el
+    SHA-256 del contenido del PDF + la versión del parser.
+    El orden LRU se lleva con el mtime de cada archivo (se actualiza en
+    cada acierto) y se desalojan los más antiguos al superar el tamaño máximo.
+    """
+
+    def __init__(self, directorio=PDF_CACHE_DIR, max_mb=PDF_CACHE_MAX_MB, version=VERSION_PARSER):
+        self.directorio = directorio
+        self.max_bytes = max_mb * 1024 * 1024
+        self.version = version
+        self.extension_df = ".parquet" if PARQUET_AVAILABLE else ".pkl.gz"
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def clave(self, contenido):
+        """Clave de caché para el contenido binario de un PDF"""
+        digest = hashlib.sha256(contenido).hexdigest()
+        return f"{digest}-v{self.version}"
+
+    def _ruta(self, clave, extension):
+        return os.path.join(self.directorio, clave[:2], clave + extension)
+
+    def _tocar(self, ruta):
+        """Marca la entrada como usada recientemente"""
+        try:
+            os.utime(ruta, None)
+        except OSError:
+            pass
+
+    def _escribir(self, ruta, datos):
+        """Escritura atómica (tmp + replace) para no dejar entradas a medias"""
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        ruta_tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(ruta_tmp, "wb") as f:
+            f.write(datos)
+        os.replace(ruta_tmp, ruta)
+        self._desalojar()
+
+    def obtener_texto(self, clave):
+        """Texto extraído del PDF o None si no está en caché"""
+        ruta = self._ruta(clave, ".txt")
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                texto = f.read()
+        except OSError:
+            self.fallos += 1
+            return None
+        self._tocar(ruta)
+        self.aciertos += 1
+        return texto
+
+    def guardar_texto(self, clave, texto):
+        try:
+            self._escribir(self._ruta(clave, ".txt"), texto.encode("utf-8"))
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el texto en caché: {e}")
+
+    def contiene_dataframe(self, clave):
+        """Indica si hay un DataFrame en caché (sin contar acierto/fallo)"""
+        return os.path.exists(self._ruta(clave, self.extension_df))
+
+    def obtener_dataframe(self, clave):
+        """DataFrame ya procesado o None si no está en caché"""
+        ruta = self._ruta(clave, self.extension_df)
+        if not os.path.exists(ruta):
+            self.fallos += 1
+            return None
+        try:
+            if PARQUET_AVAILABLE:
+                df = pd.read_parquet(ruta)
+            else:
+                df = pd.read_pickle(ruta, compression="gzip")
+        except Exception as e:
+            print(f"⚠️ Entrada de caché dañada, se descarta: {e}")
+            self._eliminar(ruta)
+            self.fallos += 1
+            return None
+        self._tocar(ruta)
+        self.aciertos += 1
+        return df
+
+    def guardar_dataframe(self, clave, df):
+        try:
+            buffer = io.BytesIO()
+            if PARQUET_AVAILABLE:
+                df.to_parquet(buffer, index=False, compression="zstd")
+            else:
+                df.to_pickle(buffer, compression={"method": "gzip"})
+            self._escribir(self._ruta(clave, self.extension_df), buffer.getvalue())
+        except Exception as e:
+            # Tipos que parquet no admite: solo queda en caché el texto
+            print(f"⚠️ No se pudo guardar el DataFrame en caché: {e}")
+
+    def _eliminar(self, ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    def _entradas(self):
+        """Lista (mtime, tamaño, ruta) de todos los archivos de la caché"""
+        entradas = []
+        for raiz, _, archivos in os.walk(self.directorio):
+            for nombre in archivos:
+                if nombre.endswith(".tmp"):
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    info = os.stat(ruta)
+                except OSError:
+                    continue
+                entradas.append((info.st_mtime, info.st_size, ruta))
+        return entradas
+
+    def _desalojar(self):
+        """Elimina las entradas usadas hace más tiempo hasta respetar max_bytes"""
+        with self._lock:
+            entradas = self._entradas()
+            total = sum(tamano for _, tamano, _ in entradas)
+            if total <= self.max_bytes:
+                return
+            for _, tamano, ruta in sorted(entradas):
+                self._eliminar(ruta)
+                total -= tamano
+                if total <= self.max_bytes:
+                    break
+
+    def limpiar(self):
+        """Vacía la caché por completo"""
+        with self._lock:
+            for _, _, ruta in self._entradas():
+                self._eliminar(ruta)
+
+    def estadisticas(self):
+        entradas = self._entradas()
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "entradas": len(entradas),
+            "tamano_mb": round(sum(tamano for _, tamano, _ in entradas) / (1024 * 1024), 2),
+        }
+
+# Instancia global
+pdf_cache = PDFCache()
@@ -9,6 +9,8 @@ from datetime import datetime
 import re
 import sys
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Agregar la ruta del módulo actual al path para importar smart_parser
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -37,6 +39,20 @@ except ImportError:
     SmartTimeParser = None
     EntradaSalidaDetector = None
 
+# Caché en disco de PDFs ya procesados (por hash del contenido)
+try:
+    from pdf_cache import pdf_cache
+    PDF_CACHE_AVAILABLE = True
+except ImportError:
+    pdf_cache = None
+    PDF_CACHE_AVAILABLE = False
+
+# Procesamiento paralelo de PDFs
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+PAGINAS_POR_BLOQUE = 20  # PDFs más largos se reparten por bloques de páginas
+# "spawn": los workers no heredan por fork el estado de Streamlit ni sus hilos
+PDF_MP_CONTEXT = multiprocessing.get_context("spawn")
+
 def verificar_dependencias_pdf():
     """
     Verifica si las dependencias para PDF están disponibles
@@ -471,73 +487,230 @@ def detectar_estructura_pdf(texto):
     
     return estructura
 
-def procesar_pdf_a_dataframe(archivo_pdf):
+def _leer_bytes_pdf(archivo_pdf):
+    """Obtiene el contenido binario de un archivo subido o de una ruta"""
+    if isinstance(archivo_pdf, (bytes, bytearray)):
+        return bytes(archivo_pdf)
+    if isinstance(archivo_pdf, str):
+        with open(archivo_pdf, "rb") as f:
+            return f.read()
+    if hasattr(archivo_pdf, "getvalue"):
+        return archivo_pdf.getvalue()
+    archivo_pdf.seek(0)
+    return archivo_pdf.read()
+
+def _contenido_y_clave(archivo_pdf):
+    """Lee el PDF y calcula su clave de caché una sola vez: (bytes, clave o None)"""
+    contenido = _leer_bytes_pdf(archivo_pdf)
+    return contenido, pdf_cache.clave(contenido) if PDF_CACHE_AVAILABLE else None
+
+def _contar_paginas_pdf(contenido):
+    """Cuenta las páginas de un PDF en memoria (None si no se puede)"""
+    try:
+        if PDFPLUMBER_AVAILABLE:
+            with pdfplumber.open(io.BytesIO(contenido)) as pdf:
+                return len(pdf.pages)
+        if PDF_AVAILABLE:
+            return len(PyPDF2.PdfReader(io.BytesIO(contenido)).pages)
+    except Exception:
+        pass
+    return None
+
+def _extraer_texto_bloque(contenido, inicio=0, fin=None):
+    """
+    Extrae el texto de las páginas [inicio, fin) de un PDF en memoria.
+    Se ejecuta en procesos del pool: no usa streamlit, devuelve los avisos.
+    
+    Returns:
+        tuple: (texto, avisos)
+    """
+    texto = ""
+    avisos = []
+    
+    if PDFPLUMBER_AVAILABLE:
+        try:
+            with pdfplumber.open(io.BytesIO(contenido)) as pdf:
+                for pagina in pdf.pages[inicio:fin]:
+                    texto_pagina = pagina.extract_text()
+                    if texto_pagina:
+                        texto += texto_pagina + "\n"
+        except Exception as e:
+            avisos.append(f"pdfplumber falló: {str(e)}. Intentando con PyPDF2...")
+    
+    if not texto and PDF_AVAILABLE:
+        try:
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(contenido))
+            for page in pdf_reader.pages[inicio:fin]:
+                texto += page.extract_text() + "\n"
+        except Exception as e:
+            avisos.append(f"PyPDF2 falló: {str(e)}")
+    
+    return texto, avisos
+
+def extraer_textos_pdf_paralelo(archivos_pdf, progress_callback=None, max_workers=None,
+                                leidos=None):
+    """
+    Extrae el texto de varios PDFs en un pool de procesos.
+    Cada PDF es una tarea; los PDFs largos se dividen en bloques de
+    PAGINAS_POR_BLOQUE páginas. Los bloques se vuelven a unir en orden.
+    
+    Args:
+        archivos_pdf: Lista de archivos PDF subidos
+        progress_callback: Función (fraccion, mensaje) llamada al terminar cada archivo
+        max_workers: Procesos del pool (por defecto PDF_MAX_WORKERS)
+        leidos: [(bytes, clave)] de _contenido_y_clave, si el llamador ya los tiene
+    
+    Returns:
+        list: [(texto, avisos)] en el mismo orden que archivos_pdf
+    """
+    max_workers = max_workers or PDF_MAX_WORKERS
+    if leidos is None:
+        leidos = [_contenido_y_clave(archivo) for archivo in archivos_pdf]
+    contenidos = [contenido for contenido, _ in leidos]
+    claves = [clave for _, clave in leidos]
+    
+    resultados_bloques = {idx: {} for idx in range(len(archivos_pdf))}
+    
+    # Textos ya extraídos en subidas anteriores: no pasan por pdfplumber
+    for idx, clave in enumerate(claves):
+        texto = pdf_cache.obtener_texto(clave) if clave else None
+        if texto is not None:
+            resultados_bloques[idx][0] = (texto, [])
+    
+    # Armar tareas (archivo, bloque, inicio, fin)
+    tareas = []
+    for idx, contenido in enumerate(contenidos):
+        if resultados_bloques[idx]:
+            continue
+        paginas = _contar_paginas_pdf(contenido) if len(contenido) else None
+        if paginas and paginas > PAGINAS_POR_BLOQUE and max_workers > 1:
+            for bloque, inicio in enumerate(range(0, paginas, PAGINAS_POR_BLOQUE)):
+                tareas.append((idx, bloque, inicio, inicio + PAGINAS_POR_BLOQUE))
+        else:
+            tareas.append((idx, 0, 0, None))
+    
+    bloques_por_archivo = {idx: len(bloques) for idx, bloques in resultados_bloques.items() if bloques}
+    for idx, _, _, _ in tareas:
+        bloques_por_archivo[idx] = bloques_por_archivo.get(idx, 0) + 1
+    completados = len([idx for idx in resultados_bloques if resultados_bloques[idx]])
+    
+    def registrar(idx, bloque, resultado):
+        nonlocal completados
+        resultados_bloques[idx][bloque] = resultado
+        if len(resultados_bloques[idx]) == bloques_por_archivo[idx]:
+            completados += 1
+            if progress_callback:
+                nombre = getattr(archivos_pdf[idx], "name", f"PDF {idx + 1}")
+                progress_callback(completados / len(archivos_pdf), f"Texto extraído: {nombre}")
+    
+    if max_workers > 1 and len(tareas) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(tareas)),
+                                     mp_context=PDF_MP_CONTEXT) as pool:
+                futuros = {
+                    pool.submit(_extraer_texto_bloque, contenidos[idx], inicio, fin): (idx, bloque)
+                    for idx, bloque, inicio, fin in tareas
+                }
+                for futuro in as_completed(futuros):
+                    idx, bloque = futuros[futuro]
+                    registrar(idx, bloque, futuro.result())
+        except Exception as e:
+            # Pool no disponible (entorno restringido): seguir en serie con lo que falte
+            print(f"⚠️ Pool de procesos no disponible, extrayendo en serie: {e}")
+    
+    for idx, bloque, inicio, fin in tareas:
+        if bloque not in resultados_bloques[idx]:
+            registrar(idx, bloque, _extraer_texto_bloque(contenidos[idx], inicio, fin))
+    
+    extraidos = {idx for idx, _, _, _ in tareas}
+    resultados = []
+    for idx in range(len(archivos_pdf)):
+        bloques = [resultados_bloques[idx][b] for b in sorted(resultados_bloques[idx])]
+        texto = "".join(texto for texto, _ in bloques)
+        avisos = [aviso for _, avisos in bloques for aviso in avisos]
+        if texto and claves[idx] and idx in extraidos:
+            pdf_cache.guardar_texto(claves[idx], texto)
+        resultados.append((texto, avisos))
+    return resultados
+
+def procesar_pdfs_a_dataframes(archivos_pdf, progress_callback=None, max_workers=None):
+    """
+    Procesa varios PDFs: la extracción de texto (la parte costosa) corre en
+    paralelo y el análisis con smart_parser se hace en orden en este proceso.
+    
+    Returns:
+        list: DataFrames en el mismo orden que archivos_pdf
+    """
+    def progreso_extraccion(fraccion, mensaje):
+        if progress_callback:
+            progress_callback(fraccion * 0.8, mensaje)
+    
+    # Cada PDF se lee y se hashea una sola vez
+    leidos = [_contenido_y_clave(archivo_pdf) for archivo_pdf in archivos_pdf]
+    
+    # Los PDFs con DataFrame en caché no necesitan extracción
+    pendientes = [
+        idx for idx, (_, clave) in enumerate(leidos)
+        if not (clave and pdf_cache.contiene_dataframe(clave))
+    ]
+    textos_pendientes = extraer_textos_pdf_paralelo(
+        [archivos_pdf[idx] for idx in pendientes], progreso_extraccion, max_workers,
+        leidos=[leidos[idx] for idx in pendientes]
+    ) if pendientes else []
+    textos = dict(zip(pendientes, textos_pendientes))
+    
+    dataframes = []
+    for idx, archivo_pdf in enumerate(archivos_pdf, 1):
+        texto_pdf, avisos = textos.get(idx - 1, (None, []))
+        for aviso in avisos:
+            st.warning(aviso)
+        dataframes.append(procesar_pdf_a_dataframe(archivo_pdf, texto_pdf=texto_pdf,
+                                                   leido=leidos[idx - 1]))
+        if progress_callback:
+            nombre = getattr(archivo_pdf, "name", f"PDF {idx}")
+            progress_callback(0.8 + 0.2 * idx / len(archivos_pdf), f"Analizado: {nombre}")
+    return dataframes
+
+def procesar_pdf_a_dataframe(archivo_pdf, texto_pdf=None, leido=None):
     """
     Procesa un archivo PDF y lo convierte a DataFrame usando smart_parser
     
     Args:
         archivo_pdf: Archivo PDF subido
+        texto_pdf: Texto ya extraído (p. ej. por extraer_textos_pdf_paralelo)
+        leido: (bytes, clave) de _contenido_y_clave, para no releer el archivo
     
     Returns:
         pd.DataFrame: DataFrame con los datos extraídos
     """
     try:
-        # Extraer texto del PDF
-        texto_pdf = ""
+        contenido, clave = leido or _contenido_y_clave(archivo_pdf)
         
-        # Intentar con pdfplumber primero (mejor para tablas)
-        if PDFPLUMBER_AVAILABLE:
-            try:
-                import pdfplumber
-                with pdfplumber.open(archivo_pdf) as pdf:
-                    for pagina in pdf.pages:
-                        texto_pagina = pagina.extract_text()
-                        if texto_pagina:
-                            texto_pdf += texto_pagina + "\n"
-            except Exception as e:
-                st.warning(f"pdfplumber falló: {str(e)}. Intentando con PyPDF2...")
+        # Mismo PDF ya procesado: devolver el resultado guardado
+        if clave:
+            df_cache = pdf_cache.obtener_dataframe(clave)
+            if df_cache is not None:
+                st.success("✅ Datos recuperados de la caché (PDF ya procesado)")
+                return df_cache
+            if texto_pdf is None:
+                texto_pdf = pdf_cache.obtener_texto(clave)
         
-        # Fallback a PyPDF2 si pdfplumber no funcionó
-        if not texto_pdf and PDF_AVAILABLE:
-            try:
-                import PyPDF2
-                pdf_reader = PyPDF2.PdfReader(archivo_pdf)
-                for page in pdf_reader.pages:
-                    texto_pdf += page.extract_text() + "\n"
-            except Exception as e:
-                st.error(f"PyPDF2 falló: {str(e)}")
+        # Extraer texto del PDF (pdfplumber primero, PyPDF2 como respaldo)
+        if texto_pdf is None:
+            texto_pdf, avisos = _extraer_texto_bloque(contenido)
+            for aviso in avisos:
+                st.warning(aviso)
+            if texto_pdf and clave:
+                pdf_cache.guardar_texto(clave, texto_pdf)
         
         if not texto_pdf:
             st.error("❌ No se pudo extraer texto del PDF")
             return pd.DataFrame()
         
-        # Usar smart_parser para procesamiento inteligente
-        if SMART_PARSER_AVAILABLE:
-            try:
-                lineas = texto_pdf.split('\n')
-                
-                # Analizar estructura
-                estructura = analizar_estructura_pdf(lineas)
-                
-                # Extraer datos con smart_parser
-                datos_brutos = extraer_datos_segun_estructura(lineas, estructura)
-                
-                # Convertir a DataFrame estándar
-                if datos_brutos:
-                    df = convertir_a_dataframe_estandar(datos_brutos)
-                    if not df.empty:
-                        st.success("✅ Datos extraídos con smart_parser")
-                        return df
-                
-                st.warning("⚠️ No se pudieron extraer datos estructurados, usando método básico")
-                
-            except Exception as e:
-                st.warning(f"⚠️ Error con smart_parser: {str(e)}, usando método básico")
-        else:
-            st.warning("⚠️ smart_parser no disponible, usando método básico")
-        
-        # Fallback al método básico
-        return convertir_texto_a_dataframe(texto_pdf)
+        df = _convertir_texto_pdf(texto_pdf)
+        if clave and not df.empty:
+            pdf_cache.guardar_dataframe(clave, df)
+        return df
         
     except Exception as e:
         st.error(f"❌ Error procesando PDF: {str(e)}")
@@ -545,6 +718,39 @@ def procesar_pdf_a_dataframe(archivo_pdf):
         st.error(f"Detalles: {traceback.format_exc()}")
         return pd.DataFrame()
 
+def _convertir_texto_pdf(texto_pdf):
+    """
+    Convierte el texto de un PDF en DataFrame: smart_parser si está
+    disponible, método básico como respaldo
+    """
+    # Usar smart_parser para procesamiento inteligente
+    if SMART_PARSER_AVAILABLE:
+        try:
+            lineas = texto_pdf.split('\n')
+            
+            # Analizar estructura
+            estructura = analizar_estructura_pdf(lineas)
+            
+            # Extraer datos con smart_parser
+            datos_brutos = extraer_datos_segun_estructura(lineas, estructura)
+            
+            # Convertir a DataFrame estándar
+            if datos_brutos:
+                df = convertir_a_dataframe_estandar(datos_brutos)
+                if not df.empty:
+                    st.success("✅ Datos extraídos con smart_parser")
+                    return df
+            
+            st.warning("⚠️ No se pudieron extraer datos estructurados, usando método básico")
+            
+        except Exception as e:
+            st.warning(f"⚠️ Error con smart_parser: {str(e)}, usando método básico")
+    else:
+        st.warning("⚠️ smart_parser no disponible, usando método básico")
+    
+    # Fallback al método básico
+    return convertir_texto_a_dataframe(texto_pdf)
+
 def validar_datos_pdf(df):
     """
     Valida que el DataFrame extraído del PDF tenga la estructura correcta
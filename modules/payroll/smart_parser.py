@@ -5,8 +5,57 @@ Funcionalidades para interpretar y procesar horarios de forma inteligente
 import re
 import pandas as pd
 from datetime import datetime, timedelta
+from functools import lru_cache
 import streamlit as st
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
+
+# Tokenizador de una sola pasada: fecha (YYYY-MM-DD, DD/MM/YYYY o DD-MM-YYYY)
+# seguida de hora (HH:MM o HH:MM:SS) en una única alternación precompilada.
+# Cada posición del texto se consume una sola vez, así que "2025-01-01 08:00:00"
+# no produce también el token HH:MM.
+PATRON_TOKEN_FECHA_HORA = re.compile(
+    r'(?P<fecha>\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{4}|\d{1,2}-\d{1,2}-\d{4})'
+    r'\s+(?P<hora>\d{1,2}:\d{2}(?::\d{2})?)'
+)
+
+_RE_FECHA_ISO = re.compile(r'\d{4}-\d{2}-\d{2}')
+_RE_FECHA_BARRAS = re.compile(r'\d{1,2}/\d{1,2}/\d{4}')
+_RE_FECHA_GUIONES = re.compile(r'\d{1,2}-\d{1,2}-\d{4}')
+_RE_FECHA_PUNTOS = re.compile(r'\d{1,2}\.\d{1,2}\.\d{4}')
+_RE_HORA_SEGUNDOS = re.compile(r'\d{1,2}:\d{2}:\d{2}')
+_RE_HORA = re.compile(r'\d{1,2}:\d{2}')
+_RE_HORA_PUNTO = re.compile(r'\d{1,2}\.\d{2}')
+
+@lru_cache(maxsize=4096)
+def _normalizar_fecha(fecha_str: str) -> Optional[str]:
+    """Versión memoizada de SmartTimeParser.normalizar_fecha"""
+    # Formato YYYY-MM-DD (ya normalizado)
+    if _RE_FECHA_ISO.match(fecha_str):
+        return fecha_str
+    
+    # Formatos DD/MM/YYYY, DD-MM-YYYY y DD.MM.YYYY
+    for patron, separador in ((_RE_FECHA_BARRAS, '/'), (_RE_FECHA_GUIONES, '-'), (_RE_FECHA_PUNTOS, '.')):
+        if patron.match(fecha_str):
+            partes = fecha_str.split(separador)
+            if len(partes) == 3:
+                dia, mes, año = partes
+                return f"{año}-{mes.zfill(2)}-{dia.zfill(2)}"
+    
+    return None
+
+@lru_cache(maxsize=4096)
+def _normalizar_hora(hora_str: str) -> Optional[str]:
+    """Versión memoizada de SmartTimeParser.normalizar_hora"""
+    # Formatos HH:MM:SS y HH:MM -> HH:MM
+    if _RE_HORA_SEGUNDOS.match(hora_str) or _RE_HORA.match(hora_str):
+        partes = hora_str.split(':')
+        return f"{partes[0].zfill(2)}:{partes[1]}"
+    
+    # Formato HH.MM -> HH:MM
+    if _RE_HORA_PUNTO.match(hora_str):
+        return hora_str.replace('.', ':')
+    
+    return None
 
 class SmartTimeParser:
     """Clase para parsing inteligente de fechas y horas"""
@@ -25,15 +74,6 @@ class SmartTimeParser:
             r'(\d{1,2}\.\d{2})',  # HH.MM
         ]
         
-        self.patrones_fecha_hora = [
-            r'(\d{4}-\d{2}-\d{2})\s+(\d{1,2}:\d{2}:\d{2})',  # YYYY-MM-DD HH:MM:SS
-            r'(\d{4}-\d{2}-\d{2})\s+(\d{1,2}:\d{2})',  # YYYY-MM-DD HH:MM
-            r'(\d{1,2}/\d{1,2}/\d{4})\s+(\d{1,2}:\d{2}:\d{2})',  # DD/MM/YYYY HH:MM:SS
-            r'(\d{1,2}/\d{1,2}/\d{4})\s+(\d{1,2}:\d{2})',  # DD/MM/YYYY HH:MM
-            r'(\d{1,2}-\d{1,2}-\d{4})\s+(\d{1,2}:\d{2}:\d{2})',  # DD-MM-YYYY HH:MM:SS
-            r'(\d{1,2}-\d{1,2}-\d{4})\s+(\d{1,2}:\d{2})',  # DD-MM-YYYY HH:MM
-        ]
-        
         self.palabras_horario = {
             'entrada': ['entrada', 'ingreso', 'inicio', 'llegada', 'start'],
             'salida': ['salida', 'egreso', 'fin', 'final', 'end'],
@@ -41,6 +81,23 @@ class SmartTimeParser:
             'extra': ['extra', 'especial', 'nocturno', 'overtime', 'adicional']
         }
     
+    def tokenizar_fecha_hora(self, texto: str) -> Iterator[Tuple[str, str, int, str]]:
+        """
+        Recorre el texto una sola vez y emite los pares fecha/hora normalizados
+        
+        Args:
+            texto: Texto a procesar
+            
+        Yields:
+            Tuple: (fecha, hora, posicion, texto_original)
+        """
+        for match in PATRON_TOKEN_FECHA_HORA.finditer(texto):
+            fecha_normalizada = _normalizar_fecha(match.group('fecha'))
+            hora_normalizada = _normalizar_hora(match.group('hora'))
+            
+            if fecha_normalizada and hora_normalizada:
+                yield fecha_normalizada, hora_normalizada, match.start(), match.group(0)
+    
     def extraer_fecha_hora(self, texto: str) -> List[Dict]:
         """
         Extrae todas las fechas y horas de un texto
@@ -49,29 +106,17 @@ class SmartTimeParser:
             texto: Texto a procesar
             
         Returns:
-            List[Dict]: Lista de fechas y horas encontradas
+            List[Dict]: Lista de fechas y horas encontradas, en orden de aparición
         """
-        resultados = []
-        
-        # Buscar patrones de fecha y hora juntas
-        for patron in self.patrones_fecha_hora:
-            matches = re.finditer(patron, texto)
-            for match in matches:
-                fecha_str = match.group(1)
-                hora_str = match.group(2)
-                
-                fecha_normalizada = self.normalizar_fecha(fecha_str)
-                hora_normalizada = self.normalizar_hora(hora_str)
-                
-                if fecha_normalizada and hora_normalizada:
-                    resultados.append({
-                        'fecha': fecha_normalizada,
-                        'hora': hora_normalizada,
-                        'texto_original': match.group(0),
-                        'posicion': match.start()
-                    })
-        
-        return resultados
+        return [
+            {
+                'fecha': fecha,
+                'hora': hora,
+                'texto_original': texto_original,
+                'posicion': posicion
+            }
+            for fecha, hora, posicion, texto_original in self.tokenizar_fecha_hora(texto)
+        ]
     
     def normalizar_fecha(self, fecha_str: str) -> Optional[str]:
         """
@@ -84,35 +129,9 @@ class SmartTimeParser:
             str: Fecha normalizada o None si no se puede procesar
         """
         try:
-            # Formato YYYY-MM-DD (ya normalizado)
-            if re.match(r'\d{4}-\d{2}-\d{2}', fecha_str):
-                return fecha_str
-            
-            # Formato DD/MM/YYYY
-            if re.match(r'\d{1,2}/\d{1,2}/\d{4}', fecha_str):
-                partes = fecha_str.split('/')
-                if len(partes) == 3:
-                    dia, mes, año = partes
-                    return f"{año}-{mes.zfill(2)}-{dia.zfill(2)}"
-            
-            # Formato DD-MM-YYYY
-            if re.match(r'\d{1,2}-\d{1,2}-\d{4}', fecha_str):
-                partes = fecha_str.split('-')
-                if len(partes) == 3:
-                    dia, mes, año = partes
-                    return f"{año}-{mes.zfill(2)}-{dia.zfill(2)}"
-            
-            # Formato DD.MM.YYYY
-            if re.match(r'\d{1,2}\.\d{1,2}\.\d{4}', fecha_str):
-                partes = fecha_str.split('.')
-                if len(partes) == 3:
-                    dia, mes, año = partes
-                    return f"{año}-{mes.zfill(2)}-{dia.zfill(2)}"
-                    
+            return _normalizar_fecha(fecha_str)
         except Exception:
-            pass
-            
-        return None
+            return None
     
     def normalizar_hora(self, hora_str: str) -> Optional[str]:
         """
@@ -125,23 +144,9 @@ class SmartTimeParser:
             str: Hora normalizada o None si no se puede procesar
         """
         try:
-            # Formato HH:MM:SS -> HH:MM
-            if re.match(r'\d{1,2}:\d{2}:\d{2}', hora_str):
-                return hora_str[:5]
-            
-            # Formato HH:MM (ya normalizado)
-            if re.match(r'\d{1,2}:\d{2}', hora_str):
-                partes = hora_str.split(':')
-                return f"{partes[0].zfill(2)}:{partes[1]}"
-            
-            # Formato HH.MM -> HH:MM
-            if re.match(r'\d{1,2}\.\d{2}', hora_str):
-                return hora_str.replace('.', ':')
-                
+            return _normalizar_hora(hora_str)
         except Exception:
-            pass
-            
-        return None
+            return None
 
 class SmartScheduleProcessor:
     """
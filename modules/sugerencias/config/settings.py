@@ -19,6 +19,7 @@ INFOCLIMA_BASE_URL = "https://www.infoclima.com"
 
 # Base de datos - Ajustada para la estructura del módulo
 DB_PATH = os.path.join(MODULE_DIR, "data", "stores.db")
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))  # conexiones SQLite reutilizables
 
 # Configuración de logs
 LOG_LEVEL = "INFO"
@@ -30,7 +31,22 @@ APP_ICON = ""
 
 # Timeouts y límites
 API_TIMEOUT = 10  # segundos
+
+# Pronóstico del clima (Open-Meteo) y su caché
+OPEN_METEO_URL = os.getenv('OPEN_METEO_URL', "https://api.open-meteo.com/v1/forecast")
+WEATHER_CACHE_FILE = os.getenv('WEATHER_CACHE_FILE', os.path.join(MODULE_DIR, "data", "weather_cache.json"))
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 3 * 3600))  # segundos
+WEATHER_GRID_DECIMALS = 1  # celdas de ~11 km: tiendas cercanas comparten pronóstico
 MAX_FORECAST_DAYS = 7
+
+# Geocoding (IP, reverse geocoding, Nominatim): caché persistente y nomenclátor local
+GEOCODE_CACHE_FILE = os.getenv('GEOCODE_CACHE_FILE', os.path.join(MODULE_DIR, "data", "geocode_cache.json"))
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))  # segundos
+GEOCODE_NEGATIVE_TTL = int(os.getenv('GEOCODE_NEGATIVE_TTL', 3600))  # sin resultados o API caída
+IP_LOCATION_TTL = int(os.getenv('IP_LOCATION_TTL', 24 * 3600))  # la IP pública cambia más seguido
+GAZETTEER_FILE = os.path.join(MODULE_DIR, "data", "gazetteer_paraguay.json")
+GAZETTEER_MAX_DISTANCE_KM = 15  # radio para resolver coordenadas con el nomenclátor
+GEOCODING_OFFLINE = os.getenv('GEOCODING_OFFLINE', 'false').lower() in ('1', 'true', 'yes')
 MIN_ROI_THRESHOLD = 0.85  # 85%
 
 # Configuración específica de Paraguay
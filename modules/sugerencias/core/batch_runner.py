@@ -0,0 +1,321 @@
+"""
+Generación de sugerencias en lote para todas las tiendas
+
+Uso como API:
+    from modules.sugerencias.core.batch_runner import BatchSuggestionRunner
+    resultado = BatchSuggestionRunner(max_workers=8).run(strategy="balanceada")
+    print(resultado.format_report())
+
+Uso desde la línea de comandos (desde la raíz del proyecto):
+    python -m modules.sugerencias.core.batch_runner --strategy balanceada --workers 8
+"""
+import argparse
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ..models.data_models import Store, LocationInfo, WeeklySuggestion
+from ..services.database_service import db_service
+from ..services.weather_service import weather_service
+from .suggestion_engine import SuggestionEngine, suggestion_engine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StoreRunResult:
+    """Resultado y tiempos de una tienda dentro del lote"""
+    store_id: int
+    store_name: str
+    success: bool = False
+    error: str = ""
+    forecast_seconds: float = 0.0
+    engine_seconds: float = 0.0
+    suggestion: Optional[WeeklySuggestion] = None
+    suggestion_id: Optional[int] = None
+
+    @property
+    def total_seconds(self) -> float:
+        return self.forecast_seconds + self.engine_seconds
+
+
+@dataclass
+class BatchRunResult:
+    """Resultado completo del lote"""
+    strategy: str
+    results: List[StoreRunResult] = field(default_factory=list)
+    forecast_seconds: float = 0.0
+    engine_seconds: float = 0.0
+    save_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+    @property
+    def succeeded(self) -> List[StoreRunResult]:
+        return [r for r in self.results if r.success]
+
+    @property
+    def failed(self) -> List[StoreRunResult]:
+        return [r for r in self.results if not r.success]
+
+    def format_report(self) -> str:
+        """Tabla de texto con los tiempos por tienda"""
+        lineas = [
+            f"Estrategia: {self.strategy} | Tiendas: {len(self.results)} | "
+            f"OK: {len(self.succeeded)} | Errores: {len(self.failed)}",
+            f"{'ID':>4}  {'Tienda':<30} {'Clima (s)':>9} {'Motor (s)':>9} {'Total (s)':>9}  Estado",
+        ]
+        for r in self.results:
+            estado = f"✅ #{r.suggestion_id}" if r.success and r.suggestion_id else ("✅" if r.success else f"❌ {r.error}")
+            lineas.append(
+                f"{r.store_id:>4}  {r.store_name[:30]:<30} {r.forecast_seconds:>9.3f} "
+                f"{r.engine_seconds:>9.3f} {r.total_seconds:>9.3f}  {estado}"
+            )
+        lineas.append(
+            f"Fases: clima {self.forecast_seconds:.3f}s | motor {self.engine_seconds:.3f}s | "
+            f"guardado {self.save_seconds:.3f}s | total {self.total_seconds:.3f}s"
+        )
+        return "\n".join(lineas)
+
+
+def inventory_snapshot_to_rows(snapshot: Optional[Dict]) -> Optional[List[Dict]]:
+    """
+    Convierte un snapshot sincronizado del inventario (formato de
+    InventorySyncService) a las filas que espera el motor de sugerencias
+    """
+    if not snapshot:
+        return None
+
+    data = snapshot.get("data", snapshot)
+    rows = []
+    for producto_key, datos in data.get("impulsivo", {}).items():
+        rows.append({
+            "Producto": datos.get("producto_original", producto_key),
+            "Bultos": datos.get("bultos", 0),
+            "Unidad": datos.get("unidad", 0),
+            "Estado Stock": datos.get("estado", "")
+        })
+    for producto_key, datos in data.get("granel", {}).items():
+        rows.append({
+            "Producto": datos.get("producto_original", producto_key),
+            "Bultos": datos.get("bultos", 0),
+            "Estado Stock": datos.get("estado", ""),
+            "Kgs": datos.get("kgs_totales", 0)
+        })
+    return rows or None
+
+
+def _generate_in_process(store: Store, weather_data: List, strategy: str,
+                         inventory: Optional[List[Dict]]) -> Tuple[WeeklySuggestion, float]:
+    """
+    Punto de entrada para el pool de procesos (motor propio por proceso)
+
+    Devuelve la sugerencia y los segundos de motor medidos en el worker, sin
+    la espera en la cola del pool.
+    """
+    inicio = time.perf_counter()
+    suggestion = SuggestionEngine().generate_weekly_suggestion(store, weather_data, strategy, current_inventory=inventory)
+    return suggestion, time.perf_counter() - inicio
+
+
+class BatchSuggestionRunner:
+    """
+    Genera sugerencias semanales para todas las tiendas registradas
+
+    Con use_processes=True cada worker crea su propio SuggestionEngine, por lo
+    que no se admite un `engine` inyectado.
+    """
+
+    def __init__(self, db=None, weather=None, engine=None, max_workers: int = 8,
+                 use_processes: bool = False):
+        if engine is not None and use_processes:
+            raise ValueError("engine= no se puede usar con use_processes=True: cada proceso crea su propio motor")
+        self.db = db or db_service
+        self.weather = weather or weather_service
+        self.engine = engine or suggestion_engine
+        self.max_workers = max(1, max_workers)
+        self.use_processes = use_processes
+
+    @staticmethod
+    def _build_store(store_dict: Dict) -> Store:
+        location = LocationInfo(
+            lat=store_dict['lat'],
+            lon=store_dict['lon'],
+            city=store_dict['city'],
+            country=store_dict['country'],
+            accuracy="database"
+        )
+        return Store(
+            id=store_dict['id'],
+            name=store_dict['name'],
+            location=location,
+            base_demand=dict(store_dict.get('base_demand', {}))
+        )
+
+    def _fetch_forecast(self, result: StoreRunResult, store: Store) -> List:
+        inicio = time.perf_counter()
+        try:
+            forecast = self.weather.get_weekly_forecast(store.location.lat, store.location.lon)
+            return (forecast or {}).get('daily_weather', [])
+        finally:
+            result.forecast_seconds = time.perf_counter() - inicio
+
+    def _run_engine(self, result: StoreRunResult, store: Store, weather_data: List, strategy: str,
+                    inventory: Optional[List[Dict]]) -> Optional[WeeklySuggestion]:
+        inicio = time.perf_counter()
+        try:
+            return self.engine.generate_weekly_suggestion(store, weather_data, strategy, current_inventory=inventory)
+        finally:
+            result.engine_seconds = time.perf_counter() - inicio
+
+    def run(self, strategy: str = "balanceada", store_ids: Optional[List[int]] = None,
+            save: bool = True, use_inventory_snapshots: bool = True) -> BatchRunResult:
+        """
+        Ejecuta el lote completo
+
+        Args:
+            strategy: Estrategia de compra para todas las tiendas
+            store_ids: Limitar a estas tiendas (por defecto todas)
+            save: Guardar las sugerencias en la base (una sola transacción)
+            use_inventory_snapshots: Usar el último snapshot de inventario de cada tienda
+
+        Returns:
+            BatchRunResult con sugerencias y tiempos por tienda
+        """
+        inicio_total = time.perf_counter()
+        batch = BatchRunResult(strategy=strategy)
+
+        store_dicts = self.db.get_stores()
+        if store_ids:
+            wanted = set(store_ids)
+            store_dicts = [s for s in store_dicts if s['id'] in wanted]
+
+        stores = []
+        for store_dict in store_dicts:
+            result = StoreRunResult(store_id=store_dict['id'], store_name=store_dict['name'])
+            batch.results.append(result)
+            try:
+                stores.append((result, self._build_store(store_dict)))
+            except Exception as e:
+                result.error = f"Tienda inválida: {e}"
+
+        if not stores:
+            batch.total_seconds = time.perf_counter() - inicio_total
+            return batch
+
+        # 1. Pronósticos en paralelo (I/O); tiendas de la misma celda comparten consulta
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            forecast_futures = [pool.submit(self._fetch_forecast, result, store) for result, store in stores]
+        weather_by_store = []
+        for (result, store), future in zip(stores, forecast_futures):
+            try:
+                weather_data = future.result()
+            except Exception as e:
+                weather_data = []
+                result.error = f"Error de clima: {e}"
+            if not weather_data and not result.error:
+                result.error = "Sin datos meteorológicos"
+            weather_by_store.append(weather_data)
+        batch.forecast_seconds = time.perf_counter() - inicio
+
+        inventories = [
+            inventory_snapshot_to_rows(self.db.get_latest_inventory_snapshot(store.id))
+            if use_inventory_snapshots else None
+            for _, store in stores
+        ]
+
+        # 2. Motor por tienda en el pool
+        inicio = time.perf_counter()
+        pending = [
+            (result, store, weather_data, inventory)
+            for (result, store), weather_data, inventory in zip(stores, weather_by_store, inventories)
+            if weather_data
+        ]
+        if self.use_processes:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [
+                    (result, pool.submit(_generate_in_process, store, weather_data, strategy, inventory))
+                    for result, store, weather_data, inventory in pending
+                ]
+                for result, future in futures:
+                    try:
+                        result.suggestion, result.engine_seconds = future.result()
+                        result.success = True
+                    except Exception as e:
+                        result.error = str(e)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [
+                    (result, pool.submit(self._run_engine, result, store, weather_data, strategy, inventory))
+                    for result, store, weather_data, inventory in pending
+                ]
+                for result, future in futures:
+                    try:
+                        result.suggestion = future.result()
+                        result.success = True
+                    except Exception as e:
+                        result.error = str(e)
+        batch.engine_seconds = time.perf_counter() - inicio
+
+        # 3. Guardado en bloque
+        if save and batch.succeeded:
+            inicio = time.perf_counter()
+            inventory_by_result = {id(result): inventory for (result, _), inventory in zip(stores, inventories)}
+            store_by_result = {id(result): store for result, store in stores}
+            rows = []
+            for result in batch.succeeded:
+                suggestion = result.suggestion
+                inventory = inventory_by_result.get(id(result))
+                rows.append({
+                    'store_id': result.store_id,
+                    'week_start': suggestion.week_start,
+                    'strategy': strategy,
+                    'suggestion': {
+                        'total_investment': suggestion.total_investment,
+                        'expected_revenue': suggestion.expected_revenue,
+                        'expected_roi': suggestion.expected_roi,
+                        'risk_level': suggestion.risk_level,
+                        'products': [p.__dict__ for p in suggestion.product_suggestions],
+                        'storage_capacity': store_by_result[id(result)].base_demand.get('storage_capacity_bultos', 50),
+                        'inventory_items': len(inventory) if inventory else 0
+                    },
+                    'explanation': suggestion.explanation
+                })
+            ids = self.db.save_suggestions_bulk(rows)
+            for result, suggestion_id in zip(batch.succeeded, ids):
+                result.suggestion_id = suggestion_id
+            batch.save_seconds = time.perf_counter() - inicio
+
+        batch.total_seconds = time.perf_counter() - inicio_total
+        logger.info(f"Lote de sugerencias: {len(batch.succeeded)}/{len(batch.results)} tiendas en {batch.total_seconds:.2f}s")
+        return batch
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Genera sugerencias semanales para todas las tiendas")
+    parser.add_argument("--strategy", default="balanceada", choices=["conservadora", "balanceada", "agresiva"])
+    parser.add_argument("--workers", type=int, default=8, help="Tamaño del pool")
+    parser.add_argument("--processes", action="store_true", help="Usar procesos en lugar de hilos para el motor")
+    parser.add_argument("--stores", default="", help="IDs de tiendas separados por coma (por defecto todas)")
+    parser.add_argument("--no-save", action="store_true", help="No guardar en la base de datos")
+    parser.add_argument("--no-inventory", action="store_true", help="Ignorar snapshots de inventario")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    store_ids = [int(s) for s in args.stores.split(",") if s.strip()] or None
+
+    runner = BatchSuggestionRunner(max_workers=args.workers, use_processes=args.processes)
+    result = runner.run(
+        strategy=args.strategy,
+        store_ids=store_ids,
+        save=not args.no_save,
+        use_inventory_snapshots=not args.no_inventory
+    )
+    print(result.format_report())
+    return 0 if not result.failed else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
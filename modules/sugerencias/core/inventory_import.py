@@ -0,0 +1,251 @@
+"""
+Importación vectorizada de archivos de inventario (Impulsivos / Granel)
+
+Las columnas se resuelven una sola vez por archivo y los valores numéricos
+("4.6kg", "5,236kg", "N/A") se limpian con operaciones de pandas sobre la
+columna completa. Los CSV se leen por bloques (solo las columnas necesarias):
+cada bloque se convierte en registros y se descarta, los totales para la
+pantalla se acumulan bloque a bloque y del archivo solo se conserva una vista
+previa de PREVIEW_ROWS filas. En memoria quedan los registros importados, no
+copias del archivo completo.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+KG_POR_CAJA_CERRADA = 7.8
+CSV_CHUNK_ROWS = 50_000
+# Filas estandarizadas que se conservan como DataFrame para mostrar
+PREVIEW_ROWS = 1_000
+
+# FORMATO GRANEL: Estado | Producto | Cajas Cerradas | Cajas Abiertas | Kgs Abiertas | Total Kgs
+GRANEL_COLUMN_ALIASES = {
+    'Estado': ['Estado', 'estado', 'ESTADO'],
+    'Producto': ['Producto', 'producto', 'PRODUCTO'],
+    'Cajas Cerradas': ['Cajas Cerradas', 'cajas cerradas', 'CAJAS CERRADAS', 'Cajas_Cerradas'],
+    'Cajas Abiertas': ['Cajas Abiertas', 'cajas abiertas', 'CAJAS ABIERTAS', 'Cajas_Abiertas'],
+    'Kgs Abiertas': ['Kgs Abiertas', 'kgs abiertas', 'KGS ABIERTAS', 'Kgs_Abiertas', 'Kgs.Abiertas'],
+    'Total Kgs': ['Total Kgs', 'total kgs', 'TOTAL KGS', 'Total_Kgs']
+}
+GRANEL_REQUIRED_COLUMNS = ['Estado', 'Producto', 'Cajas Cerradas', 'Cajas Abiertas', 'Kgs Abiertas']
+
+# FORMATO IMPULSIVOS: Producto | Bultos | Unidad | Estado Stock
+IMPULSIVO_COLUMNS = ['Producto', 'Bultos', 'Unidad', 'Estado Stock']
+
+
+@dataclass
+class InventoryImport:
+    """Resultado de importar un archivo de inventario"""
+    formato: str  # 'granel' o 'impulsivo'
+    required_columns: List[str]
+    found_columns: Dict[str, Any]
+    available_columns: List[Any]
+    records: Optional[List[Dict]] = None  # None si faltan columnas
+    frame: Optional[pd.DataFrame] = None  # primeras PREVIEW_ROWS filas estandarizadas, para mostrar
+    summary: Dict[str, float] = field(default_factory=dict)  # totales acumulados por bloque
+    chunks: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.records is not None
+
+    @property
+    def missing_columns(self) -> List[str]:
+        return [col for col in self.required_columns if col not in self.found_columns]
+
+
+def resolve_columns(columns: Iterable[Any], aliases: Dict[str, List[str]],
+                    reverse_contains: bool = False) -> Dict[str, Any]:
+    """
+    Asocia cada columna requerida con la primera columna del archivo que la nombra
+
+    Una columna coincide si es igual a un alias o lo contiene (sin distinguir
+    mayúsculas); con reverse_contains también si está contenida en el alias.
+
+    Returns:
+        Diccionario columna_requerida → columna del archivo
+    """
+    candidates = [(col, str(col).strip()) for col in columns]
+    candidates = [(col, clean, clean.lower()) for col, clean in candidates]
+
+    found = {}
+    for required, variations in aliases.items():
+        exact = set(variations)
+        lowered = [v.lower() for v in variations]
+        for col, clean, low in candidates:
+            if (clean in exact or any(v in low for v in lowered)
+                    or (reverse_contains and any(low in v for v in lowered))):
+                found[required] = col
+                break
+    return found
+
+
+def clean_numeric(series: pd.Series) -> pd.Series:
+    """
+    Convierte una columna a float: quita 'kg'/'kgs', usa la coma como
+    separador decimal (5,236 → 5.236) y deja en 0 los vacíos, 'N/A' y los
+    valores que no se pueden interpretar
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.astype(np.float64)
+    else:
+        text = (series.astype(str).str.strip().str.lower()
+                .str.replace('kgs', '', regex=False)
+                .str.replace('kg', '', regex=False)
+                .str.strip()
+                .str.replace(',', '.', regex=False))
+        values = pd.to_numeric(text, errors='coerce').where(series.notna())
+    return values.replace([np.inf, -np.inf], np.nan).fillna(0.0)
+
+
+def granel_records(df: pd.DataFrame) -> List[Dict]:
+    """Registros de inventario a granel a partir de un DataFrame con columnas estandarizadas"""
+    cajas_cerradas = clean_numeric(df['Cajas Cerradas'])
+    cajas_abiertas = clean_numeric(df['Cajas Abiertas'])
+    kgs_abiertas = clean_numeric(df['Kgs Abiertas'])
+
+    # Total de bultos = cajas cerradas + cajas abiertas (truncado como int())
+    total_bultos = np.trunc(cajas_cerradas + cajas_abiertas).astype(np.int64)
+
+    # Determinar estado del stock; si no hay bultos pero hay kgs (solo restos) es SIN STOCK
+    estado_raw = df['Estado'].astype(str).str.upper()
+    estado_stock = np.select(
+        [
+            (total_bultos == 0) & (kgs_abiertas > 0),
+            estado_raw.str.contains('OK', regex=False) | estado_raw.str.contains('SUFICIENTE', regex=False),
+            estado_raw.str.contains('MEDIO', regex=False) | estado_raw.str.contains('BAJO', regex=False),
+            estado_raw.str.contains('SIN', regex=False) | (estado_raw == 'N/A'),
+        ],
+        ['SIN STOCK', 'STOCK OK', 'STOCK BAJO', 'SIN STOCK'],
+        default='STOCK OK'
+    )
+
+    # Total de kgs: 7.8kg por caja cerrada + kgs de las cajas abiertas
+    total_kgs = cajas_cerradas * KG_POR_CAJA_CERRADA + kgs_abiertas
+
+    return [
+        {
+            'Producto': producto,
+            'Bultos': bultos,
+            'Unidad': kgs,  # TOTAL KGS (no solo abiertas)
+            'Estado Stock': estado,
+            '_tipo_producto': 'granel',
+            '_cajas_cerradas': cerradas,
+            '_cajas_abiertas': abiertas,
+            '_kgs_abiertas': sueltos,
+            '_total_kgs': kgs
+        }
+        for producto, bultos, kgs, estado, cerradas, abiertas, sueltos in zip(
+            df['Producto'].astype(str).tolist(),
+            total_bultos.tolist(),
+            total_kgs.tolist(),
+            estado_stock.tolist(),
+            cajas_cerradas.tolist(),
+            cajas_abiertas.tolist(),
+            kgs_abiertas.tolist()
+        )
+    ]
+
+
+def impulsivo_records(df: pd.DataFrame) -> List[Dict]:
+    """Registros de inventario impulsivo a partir de un DataFrame con columnas estandarizadas"""
+    # Celdas vacías quedan en NaN: no cuentan como 0 bultos ni como unidades
+    bultos = pd.to_numeric(df['Bultos'], errors='coerce')
+    unidad = pd.to_numeric(df['Unidad'], errors='coerce')
+
+    # Si Bultos = 0 pero tiene Unidad > 0, solo quedan unidades sueltas: SIN STOCK
+    estado = df['Estado Stock'].where(~((bultos == 0) & (unidad > 0)), 'SIN STOCK')
+    return df[IMPULSIVO_COLUMNS].assign(**{'Estado Stock': estado, '_tipo_producto': 'impulsivo'}).to_dict('records')
+
+
+def summarize_records(records: List[Dict]) -> Dict[str, float]:
+    """Totales de un bloque de registros; los de varios bloques se suman"""
+    frame = pd.DataFrame.from_records(records, columns=['Bultos', 'Estado Stock', '_total_kgs'])
+    estado = frame['Estado Stock'].astype(str)
+    return {
+        'productos': len(frame),
+        'total_bultos': float(pd.to_numeric(frame['Bultos'], errors='coerce').sum()),
+        'total_kgs': float(pd.to_numeric(frame['_total_kgs'], errors='coerce').sum()),
+        'stock_bajo': int((estado == 'STOCK BAJO').sum()),
+        'stock_bajo_medio': int((estado.str.contains('BAJO', regex=False)
+                                 | estado.str.contains('MEDIO', regex=False)).sum()),
+        'sin_stock': int((estado == 'SIN STOCK').sum()),
+    }
+
+
+def _standardize(df: pd.DataFrame, found_columns: Dict[str, Any]) -> pd.DataFrame:
+    rename_map = {v: k for k, v in found_columns.items()}
+    return df.rename(columns=rename_map)
+
+
+def import_inventory(source, file_name: str, category_name: str,
+                     chunksize: int = CSV_CHUNK_ROWS) -> InventoryImport:
+    """
+    Lee y normaliza un archivo de inventario
+
+    Args:
+        source: Ruta o archivo abierto (p. ej. el UploadedFile de Streamlit)
+        file_name: Nombre del archivo, define si se lee como CSV o Excel
+        category_name: "Granel" o "Impulsivos"
+        chunksize: Filas por bloque al leer CSV
+
+    Returns:
+        InventoryImport; records es None si faltan columnas requeridas
+    """
+    granel = category_name == "Granel"
+    if granel:
+        aliases, required = GRANEL_COLUMN_ALIASES, GRANEL_REQUIRED_COLUMNS
+        build_records = granel_records
+    else:
+        aliases, required = {col: [col] for col in IMPULSIVO_COLUMNS}, IMPULSIVO_COLUMNS
+        build_records = impulsivo_records
+
+    is_csv = file_name.lower().endswith('.csv')
+    if is_csv:
+        # Solo el encabezado: las columnas se resuelven antes de leer los datos
+        header = pd.read_csv(source, nrows=0)
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        columns = list(header.columns)
+    else:
+        df = pd.read_excel(source, engine='openpyxl')
+        columns = list(df.columns)
+
+    found_columns = resolve_columns(columns, aliases, reverse_contains=not granel)
+    result = InventoryImport(
+        formato='granel' if granel else 'impulsivo',
+        required_columns=required,
+        found_columns=found_columns,
+        available_columns=columns
+    )
+    if result.missing_columns:
+        return result
+
+    if is_csv:
+        usecols = list(dict.fromkeys(found_columns.values()))
+        blocks = pd.read_csv(source, usecols=usecols, chunksize=chunksize)
+    else:
+        blocks = [df]
+
+    records: List[Dict] = []
+    preview = []
+    preview_rows = 0
+    summary = dict.fromkeys(summarize_records([]), 0)
+    for block in blocks:
+        block = _standardize(block, found_columns)
+        block_records = build_records(block)
+        records.extend(block_records)
+        for key, value in summarize_records(block_records).items():
+            summary[key] += value
+        if preview_rows < PREVIEW_ROWS:
+            shown = block[[col for col in aliases if col in block.columns]].head(PREVIEW_ROWS - preview_rows)
+            preview.append(shown)
+            preview_rows += len(shown)
+        result.chunks += 1
+
+    result.records = records
+    result.summary = summary
+    result.frame = pd.concat(preview, ignore_index=True) if preview else pd.DataFrame(columns=required)
+    return result
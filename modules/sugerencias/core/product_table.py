@@ -0,0 +1,148 @@
+"""
+Tabla compilada de especificaciones de productos para el motor de sugerencias
+
+PRODUCT_SPECS es un diccionario de diccionarios: cada cálculo hacía varios
+`spec.get(...)` con ramas por categoría. Esta tabla compila las
+especificaciones una sola vez en arreglos NumPy (una posición por producto)
+y calcula demanda, bultos, confianza y prioridad de todos los productos
+pedidos con operaciones vectoriales.
+
+Los resultados son idénticos a SuggestionEngine._calculate_product_suggestion
+y SuggestionEngine._calculate_priority.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Códigos de categoría
+CATEGORY_OTHER = 0
+CATEGORY_BULK = 1
+CATEGORY_FROZEN = 2
+CATEGORY_SERVED = 3
+CATEGORY_PACKAGED = 4
+
+CATEGORY_CODES = {
+    'bulk': CATEGORY_BULK,
+    'frozen': CATEGORY_FROZEN,
+    'served': CATEGORY_SERVED,
+    'packaged': CATEGORY_PACKAGED,
+}
+
+# Peso de la categoría en la prioridad (índice = código de categoría)
+CATEGORY_PRIORITY_WEIGHTS = np.array([15.0, 30.0, 25.0, 20.0, 15.0])
+
+# Reglas de cálculo de bultos (índice = código de regla)
+RULE_PER_BULK = 0   # Productos empaquetados con per_bulk definido
+RULE_KG = 1         # Granel en kg
+RULE_SERVED = 2     # Servidos: no ocupan bultos
+RULE_FALLBACK = 3   # Resto: bultos de 10 unidades
+
+
+class ProductSpecTable:
+    """Especificaciones de productos en formato columnar"""
+
+    def __init__(self, product_specs: Dict[str, Dict]):
+        self.product_ids: List[str] = list(product_specs.keys())
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(self.product_ids)}
+        specs = [product_specs[pid] for pid in self.product_ids]
+        n = len(specs)
+
+        # Columnas de texto (se usan al armar ProductDemand y al buscar coincidencias)
+        self.names: List[str] = [spec['name'] for spec in specs]
+        self.names_lower: List[str] = [spec.get('name', '').lower() for spec in specs]
+        self.units: List[str] = [spec['unit'] for spec in specs]
+        self.tipos: List[str] = [spec.get('tipo_producto', 'impulsivo') for spec in specs]
+
+        self.category = np.array(
+            [CATEGORY_CODES.get(spec.get('category'), CATEGORY_OTHER) for spec in specs], dtype=np.int8
+        )
+        # Para la prioridad, una categoría ausente cuenta como 'packaged'
+        self.priority_category = np.array(
+            [CATEGORY_CODES.get(spec.get('category', 'packaged'), CATEGORY_OTHER) for spec in specs], dtype=np.int8
+        )
+
+        per_bulk = [spec.get('per_bulk') for spec in specs]
+        has_per_bulk = np.array([bool(v) and v > 0 for v in per_bulk], dtype=bool)
+        kg_per_bulk = [spec.get('kg_per_bulk', 7.8) for spec in specs]
+
+        self.rule = np.full(n, RULE_FALLBACK, dtype=np.int8)
+        self.rule[self.category == CATEGORY_SERVED] = RULE_SERVED
+        self.rule[self.category == CATEGORY_BULK] = RULE_KG
+        self.rule[has_per_bulk] = RULE_PER_BULK
+
+        # Tamaño de bulto por producto, conservando el tipo original (int o float)
+        self.bulk_sizes: List = []
+        for i in range(n):
+            if self.rule[i] == RULE_PER_BULK:
+                self.bulk_sizes.append(per_bulk[i])
+            elif self.rule[i] == RULE_KG:
+                self.bulk_sizes.append(kg_per_bulk[i])
+            elif self.rule[i] == RULE_SERVED:
+                self.bulk_sizes.append(1)
+            else:
+                self.bulk_sizes.append(10)
+        self.bulk_size = np.array(self.bulk_sizes, dtype=np.float64)
+
+        # Margen de ganancia (constante por producto, entra en la prioridad)
+        margin = np.zeros(n)
+        has_margin = np.zeros(n, dtype=bool)
+        for i, spec in enumerate(specs):
+            if spec.get('price_cost_box') and spec.get('price_cost_box') > 0:
+                has_margin[i] = True
+                if spec.get('price_sale'):
+                    margin[i] = (spec['price_sale'] - (spec['price_cost_box'] / spec.get('per_bulk', 1))) / spec['price_sale']
+                elif spec.get('price_sale_unit'):
+                    margin[i] = (spec['price_sale_unit'] - (spec['price_cost_box'] / spec.get('per_bulk', 1))) / spec['price_sale_unit']
+                else:
+                    margin[i] = 0.3  # Estimado
+        self.margin_score = np.where(has_margin, margin * 40, 0.0)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def calculate(self, indices: Sequence[int], base_demands: Sequence[float],
+                  demand_factor: float, target_rotation: float) -> Dict[str, np.ndarray]:
+        """
+        Calcula las sugerencias de varios productos a la vez
+
+        Args:
+            indices: Posiciones de los productos en la tabla
+            base_demands: Demanda base semanal de cada producto
+            demand_factor: Factor de clima/feriados/fin de semana
+            target_rotation: Multiplicador de la estrategia
+
+        Returns:
+            Diccionario de arreglos alineados con `indices`
+        """
+        idx = np.asarray(indices, dtype=np.intp)
+        base = np.asarray(base_demands, dtype=np.float64)
+        rule = self.rule[idx]
+        category = self.category[idx]
+        bulk_size = self.bulk_size[idx]
+
+        weekly_projected = base * demand_factor
+        adjusted = weekly_projected * target_rotation
+
+        # Bultos: round() de Python y np.round redondean igual (mitad al par)
+        rounded_bulks = np.maximum(1.0, np.round(adjusted / bulk_size))
+        suggested_bulks = np.where(rule == RULE_SERVED, 0.0, rounded_bulks)
+
+        # Confianza: base 0.75, ajustada por demanda y categoría, limitada a [0.6, 0.95]
+        confidence = np.full(len(idx), 0.75)
+        confidence = confidence + np.where(base > 20, 0.10, np.where(base > 10, 0.05, 0.0))
+        confidence = confidence + np.where((category == CATEGORY_BULK) | (category == CATEGORY_FROZEN), 0.05, 0.0)
+        confidence = confidence - np.where(category == CATEGORY_SERVED, 0.05, 0.0)
+        confidence = np.clip(confidence, 0.6, 0.95)
+
+        # Prioridad: margen (40) + rotación (30) + categoría (30)
+        rotation_score = np.where(base > 0, np.minimum(base / 50, 1.0) * 30, 0.0)
+        priority = 0.0 + self.margin_score[idx] + rotation_score + CATEGORY_PRIORITY_WEIGHTS[self.priority_category[idx]]
+
+        return {
+            'rule': rule,
+            'weekly_projected': weekly_projected,
+            'adjusted': adjusted,
+            'suggested_bulks': suggested_bulks,
+            'confidence': confidence,
+            'priority': priority,
+        }
@@ -1,7 +1,7 @@
 """
 Motor de sugerencias inteligente para heladerías Grido
 """
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
 
@@ -14,6 +14,13 @@ from ..config.settings import (
     TEMP_FACTORS, STRATEGIES
 )
 
+try:
+    from .product_table import ProductSpecTable, RULE_PER_BULK, RULE_KG
+    PRODUCT_TABLE_AVAILABLE = True
+except ImportError:
+    # Sin NumPy se usa el cálculo producto por producto
+    PRODUCT_TABLE_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +32,8 @@ class SuggestionEngine:
         self.holidays = PARAGUAY_HOLIDAYS
         self.temp_factors = TEMP_FACTORS
         self.strategies = STRATEGIES
+        # Especificaciones compiladas una sola vez en arreglos
+        self.product_table = ProductSpecTable(self.product_specs) if PRODUCT_TABLE_AVAILABLE else None
     
     def generate_weekly_suggestion(
         self, 
@@ -137,46 +146,23 @@ class SuggestionEngine:
             ideal_suggestions = []
             processed_products = set()  # Evitar duplicados
             
+            # Productos a calcular: (product_id, base_demand, spec, nombre en inventario)
+            pending_products = []
+            
             # Si hay inventario cargado, procesar TODOS los productos del inventario
             if current_inventory and len(products_in_inventory) > 0:
                 logger.info("Procesando TODOS los productos del inventario cargado")
                 
+                inventory_types = {}
+                for item in current_inventory:
+                    inventory_types.setdefault(item.get('Producto'), item.get('_tipo_producto', None))
+                
                 for inv_product_name in products_in_inventory:
                     # Obtener metadata del producto del inventario
-                    inv_product_data = next((item for item in current_inventory if item.get('Producto') == inv_product_name), None)
-                    tipo_esperado = inv_product_data.get('_tipo_producto', None) if inv_product_data else None
+                    tipo_esperado = inventory_types.get(inv_product_name)
                     
                     # Buscar el product_id correspondiente en PRODUCT_SPECS
-                    matched_product_id = None
-                    matched_spec = None
-                    best_match_score = 0
-                    
-                    for pid, spec in self.product_specs.items():
-                        spec_name = spec.get('name', '')
-                        inv_lower = inv_product_name.lower()
-                        spec_lower = spec_name.lower()
-                        
-                        # FILTRAR POR TIPO: Si el inventario tiene tipo, verificar que coincida
-                        if tipo_esperado:
-                            producto_tipo = spec.get('tipo_producto', 'impulsivo')
-                            if producto_tipo != tipo_esperado:
-                                continue  # Saltar productos de otro tipo
-                        
-                        # Calcular score de coincidencia (más específico = mejor)
-                        if spec_lower == inv_lower:
-                            match_score = 100  # Coincidencia exacta
-                        elif spec_lower in inv_lower:
-                            match_score = len(spec_lower)  # Más largo = más específico
-                        elif inv_lower in spec_lower:
-                            match_score = len(inv_lower)
-                        else:
-                            continue
-                        
-                        # Quedarse con la mejor coincidencia
-                        if match_score > best_match_score:
-                            best_match_score = match_score
-                            matched_product_id = pid
-                            matched_spec = spec
+                    matched_product_id, matched_spec = self._match_catalog_product(inv_product_name, tipo_esperado)
                     
                     if not matched_product_id:
                         tipo_msg = f" (tipo: {tipo_esperado})" if tipo_esperado else ""
@@ -193,23 +179,7 @@ class SuggestionEngine:
                     
                     # Obtener base_demand o usar valor por defecto
                     base_demand = store.base_demand.get(matched_product_id, 10.0)  # Default: 10 unidades/semana
-                    
-                    suggestion = self._calculate_product_suggestion(
-                        matched_product_id, 
-                        base_demand, 
-                        avg_factor, 
-                        strategy_config
-                    )
-                    
-                    # Calcular prioridad
-                    priority_score = self._calculate_priority(matched_spec, base_demand, suggestion)
-                    
-                    ideal_suggestions.append({
-                        'suggestion': suggestion,
-                        'spec': matched_spec,
-                        'priority': priority_score,
-                        'inv_name': inv_product_name  # Guardar nombre del inventario
-                    })
+                    pending_products.append((matched_product_id, base_demand, matched_spec, inv_product_name))
                     
             else:
                 # Modo legacy: usar base_demand de la tienda
@@ -219,22 +189,25 @@ class SuggestionEngine:
                         continue
                     
                     if product_id in self.product_specs and base_demand > 0:
-                        spec = self.product_specs[product_id]
-                        
-                        suggestion = self._calculate_product_suggestion(
-                            product_id, 
-                            base_demand, 
-                            avg_factor, 
-                            strategy_config
-                        )
-                        
-                        priority_score = self._calculate_priority(spec, base_demand, suggestion)
-                        
-                        ideal_suggestions.append({
-                            'suggestion': suggestion,
-                            'spec': spec,
-                            'priority': priority_score
-                        })
+                        pending_products.append((product_id, base_demand, self.product_specs[product_id], None))
+            
+            # Demanda, bultos, confianza y prioridad de todos los productos a la vez
+            calculated = self._calculate_suggestions_batch(
+                [pid for pid, _, _, _ in pending_products],
+                [base_demand for _, base_demand, _, _ in pending_products],
+                avg_factor,
+                strategy_config
+            )
+            
+            for (product_id, base_demand, spec, inv_name), (suggestion, priority_score) in zip(pending_products, calculated):
+                item = {
+                    'suggestion': suggestion,
+                    'spec': spec,
+                    'priority': priority_score
+                }
+                if inv_name is not None:
+                    item['inv_name'] = inv_name  # Guardar nombre del inventario
+                ideal_suggestions.append(item)
             
             # PASO 2: Ordenar por prioridad (mayor a menor)
             ideal_suggestions.sort(key=lambda x: x['priority'], reverse=True)
@@ -491,6 +464,110 @@ class SuggestionEngine:
         
         return daily_analysis
     
+    def _match_catalog_product(self, inv_product_name: str, tipo_esperado: Optional[str]) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Busca el producto del catálogo que mejor coincide con un nombre del inventario
+        
+        Args:
+            inv_product_name: Nombre del producto en el inventario
+            tipo_esperado: Tipo de producto del inventario (filtra el catálogo si está presente)
+            
+        Returns:
+            (product_id, spec) o (None, None) si no hay coincidencia
+        """
+        if self.product_table is not None:
+            candidates = zip(self.product_table.product_ids, self.product_table.names_lower, self.product_table.tipos)
+        else:
+            candidates = (
+                (pid, spec.get('name', '').lower(), spec.get('tipo_producto', 'impulsivo'))
+                for pid, spec in self.product_specs.items()
+            )
+        
+        inv_lower = inv_product_name.lower()
+        matched_product_id = None
+        best_match_score = 0
+        
+        for pid, spec_lower, producto_tipo in candidates:
+            # FILTRAR POR TIPO: Si el inventario tiene tipo, verificar que coincida
+            if tipo_esperado and producto_tipo != tipo_esperado:
+                continue  # Saltar productos de otro tipo
+            
+            # Calcular score de coincidencia (más específico = mejor)
+            if spec_lower == inv_lower:
+                match_score = 100  # Coincidencia exacta
+            elif spec_lower in inv_lower:
+                match_score = len(spec_lower)  # Más largo = más específico
+            elif inv_lower in spec_lower:
+                match_score = len(inv_lower)
+            else:
+                continue
+            
+            # Quedarse con la mejor coincidencia
+            if match_score > best_match_score:
+                best_match_score = match_score
+                matched_product_id = pid
+        
+        if matched_product_id is None:
+            return None, None
+        return matched_product_id, self.product_specs[matched_product_id]
+    
+    def _calculate_suggestions_batch(
+        self,
+        product_ids: List[str],
+        base_demands: List[float],
+        demand_factor: float,
+        strategy_config: Dict
+    ) -> List[Tuple[ProductDemand, float]]:
+        """
+        Calcula sugerencia y prioridad de varios productos a la vez
+        
+        Usa la tabla compilada (operaciones vectoriales); sin NumPy recurre a
+        _calculate_product_suggestion / _calculate_priority por producto.
+        
+        Returns:
+            Lista de (ProductDemand, prioridad) en el mismo orden que product_ids
+        """
+        if not product_ids:
+            return []
+        
+        if self.product_table is None:
+            results = []
+            for product_id, base_demand in zip(product_ids, base_demands):
+                suggestion = self._calculate_product_suggestion(product_id, base_demand, demand_factor, strategy_config)
+                priority = self._calculate_priority(self.product_specs[product_id], base_demand, suggestion)
+                results.append((suggestion, priority))
+            return results
+        
+        table = self.product_table
+        indices = [table.index[pid] for pid in product_ids]
+        calc = table.calculate(indices, base_demands, demand_factor, strategy_config['target_rotation'])
+        
+        results = []
+        for k, (i, product_id, base_demand) in enumerate(zip(indices, product_ids, base_demands)):
+            rule = calc['rule'][k]
+            bulk_size = table.bulk_sizes[i]
+            suggested_bulks = int(calc['suggested_bulks'][k])
+            
+            if rule == RULE_PER_BULK or rule == RULE_KG:
+                suggested_quantity = suggested_bulks * bulk_size
+            else:
+                suggested_quantity = int(calc['adjusted'][k])
+            
+            suggestion = ProductDemand(
+                product_id=product_id,
+                product_name=table.names[i],
+                base_daily_demand=base_demand,
+                projected_weekly_demand=float(calc['weekly_projected'][k]),
+                suggested_quantity=suggested_quantity,
+                unit=table.units[i],
+                bulk_size=bulk_size,
+                suggested_bulks=suggested_bulks,
+                confidence=float(calc['confidence'][k])
+            )
+            results.append((suggestion, float(calc['priority'][k])))
+        
+        return results
+    
     def _calculate_product_suggestion(
         self, 
         product_id: str, 
@@ -14,7 +14,7 @@ class LocationInfo:
     city: str
     country: str
     timezone: str = ""
-    accuracy: str = "unknown"  # ip, gps, manual, geocoding
+    accuracy: str = "unknown"  # ip, gps, manual, geocoding, gazetteer
     
     def __post_init__(self):
         """Validación después de inicialización"""
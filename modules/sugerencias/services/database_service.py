@@ -3,6 +3,9 @@ Servicio de base de datos para el sistema
 """
 import sqlite3
 import json
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Optional, Dict
 import logging
@@ -27,64 +30,161 @@ except ImportError:
         def __init__(self, **kwargs):
             for k, v in kwargs.items():
                 setattr(self, k, v)
-from ..config.settings import DB_PATH
+from ..config.settings import DB_PATH, DB_POOL_SIZE
 
 logger = logging.getLogger(__name__)
 
 
+class ConnectionPool:
+    """
+    Pool de conexiones SQLite reutilizables
+
+    Cada conexión se abre una sola vez en modo WAL (lectores y escritor no se
+    bloquean entre sí) con pragmas ajustados, y se devuelve al pool al terminar
+    en lugar de cerrarse.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",   # seguro con WAL, evita un fsync por transacción
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-8000",     # ~8 MB de caché de páginas por conexión
+    )
+
+    def __init__(self, db_path: str, max_size: int = DB_POOL_SIZE, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=max(1, max_size))
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._lock:
+            if not self._closed:
+                try:
+                    self._idle.put_nowait(conn)
+                    return
+                except queue.Full:
+                    pass
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Conexión del pool dentro de una transacción: commit al salir,
+        rollback si hay una excepción
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+                self._release(conn)
+            except sqlite3.Error:
+                # Conexión inutilizable: no vuelve al pool
+                conn.close()
+            raise
+        else:
+            self._release(conn)
+
+    def close_all(self):
+        """Cierra las conexiones ociosas (las nuevas se abren bajo demanda)"""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
 class DatabaseService:
     """Servicio para manejo de base de datos"""
     
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, pool_size: int = DB_POOL_SIZE):
         self.db_path = db_path
+        self._pool = ConnectionPool(db_path, max_size=pool_size)
         self.init_database()
     
     def init_database(self):
-        """Inicializa las tablas de la base de datos"""
+        """Inicializa las tablas e índices de la base de datos"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Tabla de tiendas
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS stores (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    lat REAL NOT NULL,
-                    lon REAL NOT NULL,
-                    city TEXT NOT NULL,
-                    country TEXT NOT NULL,
-                    base_demand_json TEXT NOT NULL,
-                    created_at TEXT NOT NULL
-                )
-            """)
-            
-            # Tabla de sugerencias
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS suggestions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    store_id INTEGER NOT NULL,
-                    week_start TEXT NOT NULL,
-                    strategy TEXT NOT NULL,
-                    total_investment REAL NOT NULL,
-                    expected_revenue REAL NOT NULL,
-                    expected_roi REAL NOT NULL,
-                    risk_level TEXT NOT NULL,
-                    suggestion_json TEXT NOT NULL,
-                    explanation TEXT,
-                    created_at TEXT NOT NULL,
-                    FOREIGN KEY (store_id) REFERENCES stores (id)
-                )
-            """)
-            
-            conn.commit()
-            conn.close()
+            with self._pool.connection() as conn:
+                self._create_schema(conn.cursor())
             logger.info("Base de datos inicializada correctamente")
             
         except Exception as e:
             logger.error(f"Error inicializando base de datos: {e}")
             raise
     
+    @staticmethod
+    def _create_schema(cursor):
+        """Crea tablas e índices si no existen"""
+        # Tabla de tiendas
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                city TEXT NOT NULL,
+                country TEXT NOT NULL,
+                base_demand_json TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        
+        # Tabla de sugerencias
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS suggestions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                store_id INTEGER NOT NULL,
+                week_start TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                total_investment REAL NOT NULL,
+                expected_revenue REAL NOT NULL,
+                expected_roi REAL NOT NULL,
+                risk_level TEXT NOT NULL,
+                suggestion_json TEXT NOT NULL,
+                explanation TEXT,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY (store_id) REFERENCES stores (id)
+            )
+        """)
+        
+        # Tabla de snapshots de inventario
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS inventory_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                store_id INTEGER NOT NULL,
+                inventory_json TEXT NOT NULL,
+                total_bultos INTEGER NOT NULL,
+                total_productos INTEGER NOT NULL,
+                stock_ok INTEGER NOT NULL,
+                stock_bajo INTEGER NOT NULL,
+                sin_stock INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY (store_id) REFERENCES stores (id)
+            )
+        """)
+        
+        # Índices para historial por tienda y último snapshot
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_suggestions_store_week ON suggestions (store_id, week_start)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_suggestions_store_created ON suggestions (store_id, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_suggestions_created ON suggestions (created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_store_created ON inventory_snapshots (store_id, created_at)")
+    
     def save_store(self, name: str, lat: float, lon: float, city: str, country: str, base_demand: Dict) -> int:
         """
         Guarda una tienda en la base de datos (versión compatible)
@@ -101,21 +201,16 @@ class DatabaseService:
             ID de la tienda guardada
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO stores (name, lat, lon, city, country, base_demand_json, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                name, lat, lon, city, country,
-                json.dumps(base_demand),
-                datetime.now().isoformat()
-            ))
-            
-            store_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self._pool.connection() as conn:
+                cursor = conn.execute("""
+                    INSERT INTO stores (name, lat, lon, city, country, base_demand_json, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    name, lat, lon, city, country,
+                    json.dumps(base_demand),
+                    datetime.now().isoformat()
+                ))
+                store_id = cursor.lastrowid
             
             logger.info(f"Tienda guardada con ID: {store_id}")
             return store_id
@@ -124,6 +219,46 @@ class DatabaseService:
             logger.error(f"Error guardando tienda: {e}")
             raise
     
+    def save_stores_bulk(self, stores: List[Dict]) -> List[int]:
+        """
+        Guarda varias tiendas en una sola transacción
+        
+        Args:
+            stores: Lista de diccionarios con name, lat, lon, city, country y base_demand
+            
+        Returns:
+            IDs de las tiendas guardadas, en el mismo orden
+        """
+        if not stores:
+            return []
+        
+        created_at = datetime.now().isoformat()
+        rows = [
+            (
+                item['name'], item['lat'], item['lon'], item['city'], item['country'],
+                json.dumps(item.get('base_demand', {})),
+                created_at
+            )
+            for item in stores
+        ]
+        
+        try:
+            with self._pool.connection() as conn:
+                conn.executemany("""
+                    INSERT INTO stores (name, lat, lon, city, country, base_demand_json, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                # Dentro de la transacción los IDs asignados son consecutivos
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            
+            ids = list(range(last_id - len(rows) + 1, last_id + 1))
+            logger.info(f"{len(ids)} tiendas guardadas en una transacción")
+            return ids
+            
+        except Exception as e:
+            logger.error(f"Error guardando tiendas en lote: {e}")
+            raise
+    
     def get_stores(self) -> List[Dict]:
         """
         Obtiene todas las tiendas
@@ -132,17 +267,12 @@ class DatabaseService:
             Lista de diccionarios con datos de tiendas
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, name, lat, lon, city, country, base_demand_json, created_at
-                FROM stores
-                ORDER BY created_at DESC
-            """)
-            
-            rows = cursor.fetchall()
-            conn.close()
+            with self._pool.connection() as conn:
+                rows = conn.execute("""
+                    SELECT id, name, lat, lon, city, country, base_demand_json, created_at
+                    FROM stores
+                    ORDER BY created_at DESC
+                """).fetchall()
             
             stores = []
             for row in rows:
@@ -159,10 +289,49 @@ class DatabaseService:
                 stores.append(store_data)
             
             return stores
-            
+
         except Exception as e:
             logger.error(f"Error obteniendo tiendas: {e}")
             return []
+
+    def get_stores_version(self) -> tuple:
+        """
+        Firma barata de la tabla de tiendas (cantidad e ID máximo), para saber
+        si hay que reconstruir estructuras derivadas sin releer todas las filas
+
+        Returns:
+            Tupla (cantidad, id_maximo)
+        """
+        try:
+            with self._pool.connection() as conn:
+                count, max_id = conn.execute("SELECT COUNT(*), MAX(id) FROM stores").fetchone()
+            return (count, max_id)
+        except Exception as e:
+            logger.error(f"Error obteniendo versión de tiendas: {e}")
+            return (0, None)
+
+    @staticmethod
+    def _suggestion_row(store_id: int, week_start: str, strategy: str, suggestion: Dict,
+                        explanation: str, created_at: str) -> tuple:
+        return (
+            store_id, week_start, strategy,
+            suggestion.get('total_investment', 0),
+            suggestion.get('expected_revenue', 0),
+            suggestion.get('expected_roi', 0),
+            suggestion.get('risk_level', 'MEDIO'),
+            json.dumps(suggestion),
+            explanation,
+            created_at
+        )
+    
+    _INSERT_SUGGESTION = """
+        INSERT INTO suggestions (
+            store_id, week_start, strategy, total_investment,
+            expected_revenue, expected_roi, risk_level,
+            suggestion_json, explanation, created_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
     
     def save_suggestion(self, store_id: int, week_start: str, strategy: str, suggestion: Dict, explanation: str) -> int:
         """
@@ -179,30 +348,10 @@ class DatabaseService:
             ID de la sugerencia guardada
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO suggestions (
-                    store_id, week_start, strategy, total_investment,
-                    expected_revenue, expected_roi, risk_level,
-                    suggestion_json, explanation, created_at
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                store_id, week_start, strategy,
-                suggestion.get('total_investment', 0),
-                suggestion.get('expected_revenue', 0),
-                suggestion.get('expected_roi', 0),
-                suggestion.get('risk_level', 'MEDIO'),
-                json.dumps(suggestion),
-                explanation,
-                datetime.now().isoformat()
-            ))
-            
-            suggestion_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            row = self._suggestion_row(store_id, week_start, strategy, suggestion, explanation,
+                                       datetime.now().isoformat())
+            with self._pool.connection() as conn:
+                suggestion_id = conn.execute(self._INSERT_SUGGESTION, row).lastrowid
             
             logger.info(f"Sugerencia guardada con ID: {suggestion_id}")
             return suggestion_id
@@ -211,38 +360,74 @@ class DatabaseService:
             logger.error(f"Error guardando sugerencia: {e}")
             raise
     
-    def get_suggestions(self, store_id: Optional[int] = None) -> List[Dict]:
+    def save_suggestions_bulk(self, suggestions: List[Dict]) -> List[int]:
+        """
+        Guarda varias sugerencias en una sola transacción
+        
+        Args:
+            suggestions: Lista de diccionarios con store_id, week_start, strategy,
+                         suggestion (dict) y explanation
+            
+        Returns:
+            IDs de las sugerencias guardadas, en el mismo orden
+        """
+        if not suggestions:
+            return []
+        
+        created_at = datetime.now().isoformat()
+        rows = [
+            self._suggestion_row(item['store_id'], item['week_start'], item['strategy'],
+                                 item['suggestion'], item.get('explanation', ''), created_at)
+            for item in suggestions
+        ]
+        
+        try:
+            with self._pool.connection() as conn:
+                conn.executemany(self._INSERT_SUGGESTION, rows)
+                # Dentro de la transacción los IDs asignados son consecutivos
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            
+            ids = list(range(last_id - len(rows) + 1, last_id + 1))
+            logger.info(f"{len(ids)} sugerencias guardadas en una transacción")
+            return ids
+            
+        except Exception as e:
+            logger.error(f"Error guardando sugerencias en lote: {e}")
+            raise
+    
+    def get_suggestions(self, store_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
         """
         Obtiene sugerencias, opcionalmente filtradas por tienda
         
         Args:
             store_id: ID de tienda para filtrar (opcional)
+            limit: Cantidad máxima de sugerencias, las más recientes primero (opcional)
             
         Returns:
             Lista de diccionarios con sugerencias
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
+            # Los índices (store_id, created_at) y (created_at) resuelven el
+            # filtro y el orden sin recorrer ni ordenar toda la tabla
+            query = """
+                SELECT s.id, s.store_id, s.week_start, s.strategy, s.total_investment,
+                       s.expected_revenue, s.expected_roi, s.risk_level,
+                       s.suggestion_json, s.explanation, s.created_at,
+                       st.name as store_name
+                FROM suggestions s
+                JOIN stores st ON s.store_id = st.id
+            """
+            params = []
             if store_id:
-                cursor.execute("""
-                    SELECT s.*, st.name as store_name
-                    FROM suggestions s
-                    JOIN stores st ON s.store_id = st.id
-                    WHERE s.store_id = ?
-                    ORDER BY s.created_at DESC
-                """, (store_id,))
-            else:
-                cursor.execute("""
-                    SELECT s.*, st.name as store_name
-                    FROM suggestions s
-                    JOIN stores st ON s.store_id = st.id
-                    ORDER BY s.created_at DESC
-                """)
+                query += " WHERE s.store_id = ?"
+                params.append(store_id)
+            query += " ORDER BY s.created_at DESC"
+            if limit:
+                query += " LIMIT ?"
+                params.append(int(limit))
             
-            rows = cursor.fetchall()
-            conn.close()
+            with self._pool.connection() as conn:
+                rows = conn.execute(query, params).fetchall()
             
             suggestions = []
             for row in rows:
@@ -268,6 +453,31 @@ class DatabaseService:
             logger.error(f"Error obteniendo sugerencias: {e}")
             return []
     
+    def get_all_suggestions(self, limit: Optional[int] = None) -> List[Dict]:
+        """Sugerencias de todas las tiendas, las más recientes primero"""
+        return self.get_suggestions(limit=limit)
+    
+    @staticmethod
+    def _snapshot_row(store_id: int, inventory_data: Dict, created_at: str) -> tuple:
+        metadata = inventory_data.get("metadata", {})
+        return (
+            store_id,
+            json.dumps(inventory_data),
+            metadata.get("total_bultos", 0),
+            metadata.get("total_productos", 0),
+            metadata.get("stock_ok", 0),
+            metadata.get("stock_bajo", 0),
+            metadata.get("sin_stock", 0),
+            created_at
+        )
+    
+    _INSERT_SNAPSHOT = """
+        INSERT INTO inventory_snapshots 
+        (store_id, inventory_json, total_bultos, total_productos, 
+         stock_ok, stock_bajo, sin_stock, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    
     def save_inventory_snapshot(self, store_id: int, inventory_data: Dict) -> int:
         """
         Guarda un snapshot del inventario sincronizado
@@ -280,46 +490,9 @@ class DatabaseService:
             ID del snapshot guardado
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Crear tabla si no existe
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS inventory_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    store_id INTEGER NOT NULL,
-                    inventory_json TEXT NOT NULL,
-                    total_bultos INTEGER NOT NULL,
-                    total_productos INTEGER NOT NULL,
-                    stock_ok INTEGER NOT NULL,
-                    stock_bajo INTEGER NOT NULL,
-                    sin_stock INTEGER NOT NULL,
-                    created_at TEXT NOT NULL,
-                    FOREIGN KEY (store_id) REFERENCES stores (id)
-                )
-            """)
-            
-            metadata = inventory_data.get("metadata", {})
-            
-            cursor.execute("""
-                INSERT INTO inventory_snapshots 
-                (store_id, inventory_json, total_bultos, total_productos, 
-                 stock_ok, stock_bajo, sin_stock, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                store_id,
-                json.dumps(inventory_data),
-                metadata.get("total_bultos", 0),
-                metadata.get("total_productos", 0),
-                metadata.get("stock_ok", 0),
-                metadata.get("stock_bajo", 0),
-                metadata.get("sin_stock", 0),
-                datetime.now().isoformat()
-            ))
-            
-            snapshot_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            row = self._snapshot_row(store_id, inventory_data, datetime.now().isoformat())
+            with self._pool.connection() as conn:
+                snapshot_id = conn.execute(self._INSERT_SNAPSHOT, row).lastrowid
             
             logger.info(f"Snapshot de inventario guardado con ID: {snapshot_id}")
             return snapshot_id
@@ -328,6 +501,37 @@ class DatabaseService:
             logger.error(f"Error guardando snapshot de inventario: {e}")
             raise
     
+    def save_inventory_snapshots_bulk(self, snapshots: Dict[int, Dict]) -> Dict[int, int]:
+        """
+        Guarda snapshots de varias tiendas en una sola transacción
+        
+        Args:
+            snapshots: Diccionario store_id -> datos del inventario sincronizado
+            
+        Returns:
+            Diccionario store_id -> ID del snapshot guardado
+        """
+        if not snapshots:
+            return {}
+        
+        created_at = datetime.now().isoformat()
+        store_ids = list(snapshots.keys())
+        rows = [self._snapshot_row(store_id, snapshots[store_id], created_at) for store_id in store_ids]
+        
+        try:
+            with self._pool.connection() as conn:
+                conn.executemany(self._INSERT_SNAPSHOT, rows)
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            
+            first_id = last_id - len(rows) + 1
+            ids = {store_id: first_id + i for i, store_id in enumerate(store_ids)}
+            logger.info(f"{len(ids)} snapshots de inventario guardados en una transacción")
+            return ids
+            
+        except Exception as e:
+            logger.error(f"Error guardando snapshots de inventario en lote: {e}")
+            raise
+    
     def get_latest_inventory_snapshot(self, store_id: int) -> Optional[Dict]:
         """
         Obtiene el snapshot más reciente del inventario para una tienda
@@ -339,19 +543,14 @@ class DatabaseService:
             Diccionario con datos del inventario o None
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT inventory_json, created_at
-                FROM inventory_snapshots
-                WHERE store_id = ?
-                ORDER BY created_at DESC
-                LIMIT 1
-            """, (store_id,))
-            
-            row = cursor.fetchone()
-            conn.close()
+            with self._pool.connection() as conn:
+                row = conn.execute("""
+                    SELECT inventory_json, created_at
+                    FROM inventory_snapshots
+                    WHERE store_id = ?
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                """, (store_id,)).fetchone()
             
             if row:
                 return {
@@ -364,6 +563,10 @@ class DatabaseService:
         except Exception as e:
             logger.error(f"Error obteniendo snapshot de inventario: {e}")
             return None
+    
+    def close(self):
+        """Cierra las conexiones abiertas del pool"""
+        self._pool.close_all()
 
 
 # Instancia global del servicio
@@ -0,0 +1,192 @@
+"""
+Caché persistente de geocoding y nomenclátor local de Paraguay
+
+LocationService consultaba ip-api, OpenWeatherMap y Nominatim en cada
+interacción. La caché guarda las respuestas por consulta normalizada (sin
+acentos, mayúsculas ni signos) con TTL, y también las búsquedas sin
+resultado o con la API caída (caché negativa, con un TTL más corto). El
+nomenclátor resuelve ciudades y barrios conocidos sin salir a la red.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.settings import (
+    GEOCODE_CACHE_FILE, GEOCODE_CACHE_TTL, GEOCODE_NEGATIVE_TTL, GAZETTEER_FILE
+)
+
+# Índice espacial para el geocoding inverso (requiere numpy)
+try:
+    from .spatial_index import SpatialIndex
+    SPATIAL_INDEX_AVAILABLE = True
+except ImportError:
+    SPATIAL_INDEX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9,]+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normaliza una consulta para usarla como clave: sin acentos, en minúsculas,
+    sin signos y con espacios colapsados. Las comas se conservan porque
+    separan lugar, ciudad y país.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    plain = ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+    parts = [' '.join(_NON_ALNUM.sub(' ', part).split()) for part in plain.split(',')]
+    return ','.join(part for part in parts if part)
+
+
+class GeocodeCache:
+    """
+    Caché persistente de respuestas de geocoding.
+
+    Cada entrada guarda su propio vencimiento, así conviven TTLs distintos
+    (IP, búsquedas, negativas) en un mismo archivo. Las entradas vencidas se
+    descartan al guardar.
+    """
+
+    def __init__(self, path: str = GEOCODE_CACHE_FILE, ttl: int = GEOCODE_CACHE_TTL,
+                 negative_ttl: int = GEOCODE_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(namespace: str, query: str) -> str:
+        """Clave por consulta normalizada ("Av. España 1234, Asunción" = "av espana 1234 asuncion")"""
+        return f"{namespace}:{' '.join(normalize_query(query).replace(',', ' ').split())}"
+
+    @staticmethod
+    def coordinate_key(namespace: str, lat: float, lon: float, decimals: int = 4) -> str:
+        """Clave por coordenadas redondeadas (4 decimales ≈ 11 m)"""
+        return f"{namespace}:{lat:.{decimals}f},{lon:.{decimals}f}"
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        """Escritura atómica; se descartan las entradas vencidas"""
+        now = time.time()
+        self._entries = {k: v for k, v in self._entries.items() if v.get('expires_at', 0) > now}
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar la caché de geocoding: {e}")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Entrada vigente o None
+
+        Returns:
+            Diccionario con 'value' y 'negative' (True si se guardó "sin resultado")
+        """
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is None or entry.get('expires_at', 0) <= time.time():
+            return None
+        return entry
+
+    def put(self, key: str, value: Any, ttl: Optional[int] = None):
+        self._put(key, {'value': value, 'negative': False}, self.ttl if ttl is None else ttl)
+
+    def put_negative(self, key: str, ttl: Optional[int] = None):
+        """Recuerda que la consulta no tuvo resultado para no repetirla enseguida"""
+        self._put(key, {'value': None, 'negative': True}, self.negative_ttl if ttl is None else ttl)
+
+    def _put(self, key: str, entry: Dict, ttl: int):
+        now = time.time()
+        entry.update({'stored_at': now, 'expires_at': now + ttl})
+        with self._lock:
+            self._load()[key] = entry
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._save()
+
+
+class Gazetteer:
+    """
+    Nomenclátor local de ciudades y barrios de Paraguay
+
+    Resuelve consultas que nombran un lugar conocido ("Luque", "Villa Morra,
+    Asunción") y coordenadas cercanas a uno de ellos sin consultar servicios externos.
+    """
+
+    def __init__(self, path: str = GAZETTEER_FILE):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ No se pudo cargar el nomenclátor {path}: {e}")
+            document = {}
+
+        self.country = document.get('country', 'Paraguay')
+        self.country_code = document.get('country_code', 'PY')
+        self.places: List[Dict] = document.get('places', [])
+
+        self._by_name: Dict[str, List[int]] = {}
+        for i, place in enumerate(self.places):
+            # "Asuncion" y "Asunción" normalizan igual: cada lugar una sola vez por clave
+            for name in dict.fromkeys(normalize_query(n) for n in [place['name'], *place.get('aliases', [])]):
+                self._by_name.setdefault(name, []).append(i)
+
+        self._index = None
+        if SPATIAL_INDEX_AVAILABLE and self.places:
+            self._index = SpatialIndex([(p['lat'], p['lon']) for p in self.places], self.places)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def lookup(self, query: str) -> List[Dict]:
+        """
+        Lugares cuyo nombre coincide con la consulta
+
+        La consulta debe nombrar solo el lugar, opcionalmente seguido de su
+        ciudad o departamento y del país; direcciones con calle o número no
+        se resuelven aquí.
+        """
+        country = normalize_query(self.country)
+        parts = normalize_query(query).split(',')
+        if parts[-1] == country:
+            parts = parts[:-1]
+        elif parts[-1].endswith(f" {country}"):
+            parts[-1] = parts[-1][:-len(country) - 1]
+        if not parts or not parts[0] or len(parts) > 2:
+            return []
+
+        matches = [self.places[i] for i in self._by_name.get(parts[0], [])]
+        if len(parts) == 2:
+            matches = [
+                place for place in matches
+                if parts[1] in (normalize_query(place.get('city', '')), normalize_query(place.get('department', '')))
+            ]
+        return matches
+
+    def reverse(self, lat: float, lon: float, max_distance_km: float) -> Optional[Tuple[float, Dict]]:
+        """Lugar más cercano a las coordenadas dentro de max_distance_km, como (distancia_km, lugar)"""
+        if self._index is None:
+            return None
+        nearest = self._index.nearest(lat, lon, 1, max_distance_km)
+        return nearest[0] if nearest else None
@@ -2,87 +2,257 @@
 Scheduler Automático para Sincronización de Inventario
 Ejecuta sincronización periódica en background
 """
+import os
+import random
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional
 import streamlit as st
 
+from .inventory_sync_service import InventoryFileWatcher
+
+try:
+    from shared.data_cache import data_cache
+except ImportError:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+    from shared.data_cache import data_cache
+
+
+@dataclass
+class StoreSyncState:
+    """Estado y métricas de sincronización de una tienda"""
+    tienda_id: str
+    last_sync: Optional[datetime] = None       # última sincronización con cambios
+    last_check: Optional[datetime] = None      # última verificación
+    last_current: Optional[datetime] = None    # último momento en que el cache coincidía con el origen
+    last_latency: Optional[float] = None       # segundos de la última verificación/sincronización
+    sync_count: int = 0
+    skipped_count: int = 0
+    error_count: int = 0
+    consecutive_failures: int = 0
+    last_error: Optional[str] = None
+    retry_at: float = 0.0                      # time.monotonic() a partir del cual se reintenta
+    
+    def to_dict(self) -> dict:
+        now = datetime.now()
+        return {
+            "last_sync": self.last_sync.isoformat() if self.last_sync else None,
+            "last_check": self.last_check.isoformat() if self.last_check else None,
+            "latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "staleness_seconds": int((now - self.last_current).total_seconds()) if self.last_current else None,
+            "sync_count": self.sync_count,
+            "skipped_count": self.skipped_count,
+            "error_count": self.error_count,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": max(0, int(self.retry_at - time.monotonic())) if self.consecutive_failures else 0,
+            "last_error": self.last_error
+        }
+
+
 class InventorySyncScheduler:
     """
     Scheduler que ejecuta sincronización automática del inventario
-    en intervalos configurables
+    de todas las tiendas activas en intervalos configurables
     """
     
-    def __init__(self, sync_service, interval_minutes: int = 5):
+    def __init__(self, sync_service, interval_minutes: int = 5, watch_file: bool = True,
+                 debounce_seconds: float = 1.0, max_workers: int = 4,
+                 backoff_base_seconds: float = 30.0, backoff_max_seconds: float = 15 * 60):
         """
         Args:
             sync_service: Instancia de InventorySyncService
-            interval_minutes: Intervalo de sincronización en minutos (default: 5)
+            interval_minutes: Intervalo máximo entre verificaciones en minutos (default: 5)
+            watch_file: Despertar apenas cambie el archivo de inventario en lugar de
+                        esperar el intervalo completo
+            debounce_seconds: Espera tras un aviso para agrupar escrituras seguidas
+            max_workers: Tiendas sincronizadas en paralelo
+            backoff_base_seconds: Espera tras el primer error de una tienda (se duplica en cada error)
+            backoff_max_seconds: Espera máxima entre reintentos de una tienda
         """
         self.sync_service = sync_service
         self.interval_minutes = interval_minutes
+        self.watch_file = watch_file
+        self.debounce_seconds = debounce_seconds
+        self.max_workers = max(1, max_workers)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
         self.is_running = False
         self.thread: Optional[threading.Thread] = None
+        self.watcher: Optional[InventoryFileWatcher] = None
+        self.tienda_ids: Optional[List[str]] = None   # None = todas las tiendas activas
+        self.stores: Dict[str, StoreSyncState] = {}
+        self._lock = threading.Lock()
         self.last_sync: Optional[datetime] = None
         self.next_sync: Optional[datetime] = None
+        self.last_check: Optional[datetime] = None
         self.sync_count = 0
+        self.skipped_count = 0
         self.error_count = 0
         self.last_error: Optional[str] = None
     
-    def _sync_worker(self, tienda_id: str):
-        """Worker que ejecuta la sincronización en background"""
-        while self.is_running:
-            try:
-                # Ejecutar sincronización
+    def _active_store_ids(self) -> List[str]:
+        """Tiendas a sincronizar: las fijadas en start() o las activas de la configuración"""
+        if self.tienda_ids:
+            return list(self.tienda_ids)
+        
+        # Solo lectura: GestorTiendas puede reescribir el archivo y usar st.* (no apto para este hilo)
+        try:
+            data = data_cache.load_json(self.sync_service.inventory_file) or {}
+            tiendas = data.get("configuracion", {}).get("tiendas", {})
+            activas = [tienda_id for tienda_id, info in tiendas.items() if info.get("activa", True)]
+            if activas:
+                return activas
+        except Exception as e:
+            self.last_error = f"Error leyendo tiendas activas: {e}"
+        
+        return self.sync_service.available_store_ids()
+    
+    def _backoff_seconds(self, failures: int) -> float:
+        """Backoff exponencial con jitter (entre la mitad y el total del escalón)"""
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** (failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
+    
+    def _sync_store(self, tienda_id: str):
+        """Verifica una tienda y la sincroniza si su sección cambió"""
+        with self._lock:
+            state = self.stores.setdefault(tienda_id, StoreSyncState(tienda_id))
+        
+        started = time.perf_counter()
+        state.last_check = datetime.now()
+        changed = True
+        try:
+            changed = self.sync_service.has_changes(tienda_id)
+            if changed:
                 success, message = self.sync_service.force_sync(tienda_id)
-                
-                if success:
-                    self.last_sync = datetime.now()
+            else:
+                success, message = True, ""
+        except Exception as e:
+            success, message = False, str(e)
+        state.last_latency = time.perf_counter() - started
+        
+        with self._lock:
+            if success:
+                state.last_current = datetime.now()
+                state.consecutive_failures = 0
+                state.retry_at = 0.0
+                state.last_error = None
+                if changed:
+                    state.last_sync = state.last_current
+                    state.sync_count += 1
                     self.sync_count += 1
-                    self.last_error = None
+                    self.last_sync = state.last_sync
                 else:
+                    state.skipped_count += 1
+                    self.skipped_count += 1
+            else:
+                state.error_count += 1
+                state.consecutive_failures += 1
+                state.last_error = message
+                state.retry_at = time.monotonic() + self._backoff_seconds(state.consecutive_failures)
+                self.error_count += 1
+                self.last_error = f"{tienda_id}: {message}"
+    
+    def _run_cycle(self, pool: ThreadPoolExecutor) -> float:
+        """
+        Sincroniza las tiendas que no están esperando un reintento
+        
+        Returns:
+            Segundos hasta el próximo reintento pendiente (o el intervalo)
+        """
+        self.last_check = datetime.now()
+        now = time.monotonic()
+        tiendas = self._active_store_ids()
+        pendientes = [t for t in tiendas if self.stores.get(t) is None or self.stores[t].retry_at <= now]
+        
+        # Bloquea hasta terminar el ciclo; como máximo max_workers tiendas a la vez
+        list(pool.map(self._sync_store, pendientes))
+        
+        wait = self.interval_minutes * 60
+        now = time.monotonic()
+        for tienda_id in tiendas:
+            state = self.stores.get(tienda_id)
+            if state and state.consecutive_failures:
+                wait = min(wait, max(0.0, state.retry_at - now))
+        return wait
+    
+    def _wait(self, seconds: float):
+        """Espera hasta `seconds` o hasta que el watcher avise un cambio"""
+        watcher = self.watcher
+        if watcher:
+            if watcher.wait_for_change(timeout=seconds) and self.is_running:
+                # Agrupar ráfagas de escrituras (tmp + rename, varios guardados)
+                time.sleep(self.debounce_seconds)
+                watcher.wait_for_change(timeout=0)
+        elif self.is_running:
+            time.sleep(seconds)
+    
+    def _sync_worker(self):
+        """Worker que coordina la sincronización en background"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inventory-sync") as pool:
+            while self.is_running:
+                try:
+                    wait = self._run_cycle(pool)
+                except Exception as e:
                     self.error_count += 1
-                    self.last_error = message
+                    self.last_error = str(e)
+                    wait = self.backoff_base_seconds
                 
                 # Calcular próxima sincronización
-                self.next_sync = datetime.now() + timedelta(minutes=self.interval_minutes)
+                self.next_sync = datetime.now() + timedelta(seconds=wait)
                 
-                # Esperar el intervalo
-                time.sleep(self.interval_minutes * 60)
-                
-            except Exception as e:
-                self.error_count += 1
-                self.last_error = str(e)
-                # En caso de error, esperar antes de reintentar
-                time.sleep(30)  # 30 segundos
+                # Esperar el intervalo (o un cambio en el archivo)
+                self._wait(wait)
     
-    def start(self, tienda_id: str = "T001"):
-        """Inicia el scheduler de sincronización"""
+    def start(self, tienda_id: Optional[str] = None):
+        """
+        Inicia el scheduler de sincronización
+        
+        Args:
+            tienda_id: Sincronizar solo esta tienda (por defecto todas las activas)
+        """
         if self.is_running:
             return False, "⚠️ El scheduler ya está en ejecución"
         
         try:
             self.is_running = True
+            self.tienda_ids = [tienda_id] if tienda_id else None
+            if self.watch_file and getattr(self.sync_service, "inventory_file", None):
+                # Snapshot y journal: cada guardado solo agrega una línea al journal
+                watched = (self.sync_service.watched_paths() if hasattr(self.sync_service, "watched_paths")
+                           else self.sync_service.inventory_file)
+                self.watcher = InventoryFileWatcher(watched)
+                self.watcher.start()
             self.thread = threading.Thread(
                 target=self._sync_worker,
-                args=(tienda_id,),
                 daemon=True  # Thread daemon para que se cierre con la app
             )
             self.thread.start()
-            self.next_sync = datetime.now() + timedelta(minutes=self.interval_minutes)
+            self.next_sync = datetime.now()
             
-            return True, f"✅ Scheduler iniciado (sincronización cada {self.interval_minutes} min)"
+            alcance = f"tienda {tienda_id}" if tienda_id else "todas las tiendas activas"
+            return True, f"✅ Scheduler iniciado para {alcance} (sincronización cada {self.interval_minutes} min)"
         except Exception as e:
             self.is_running = False
+            self._stop_watcher()
             return False, f"❌ Error iniciando scheduler: {str(e)}"
     
+    def _stop_watcher(self):
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+    
     def stop(self):
         """Detiene el scheduler"""
         if not self.is_running:
             return False, "⚠️ El scheduler no está en ejecución"
         
         self.is_running = False
+        # Despierta al worker si está esperando un cambio
+        self._stop_watcher()
         if self.thread:
             # Esperar a que termine el thread (máximo 5 segundos)
             self.thread.join(timeout=5)
@@ -91,15 +261,21 @@ class InventorySyncScheduler:
     
     def get_status(self) -> dict:
         """Obtiene el estado actual del scheduler"""
+        with self._lock:
+            stores = {tienda_id: state.to_dict() for tienda_id, state in sorted(self.stores.items())}
         return {
             "is_running": self.is_running,
             "interval_minutes": self.interval_minutes,
             "last_sync": self.last_sync.isoformat() if self.last_sync else None,
             "next_sync": self.next_sync.isoformat() if self.next_sync else None,
+            "last_check": self.last_check.isoformat() if self.last_check else None,
             "sync_count": self.sync_count,
+            "skipped_count": self.skipped_count,
             "error_count": self.error_count,
+            "watch_mode": self.watcher.mode if self.watcher else None,
             "last_error": self.last_error,
-            "time_to_next_sync": self._time_to_next_sync()
+            "time_to_next_sync": self._time_to_next_sync(),
+            "stores": stores
         }
     
     def _time_to_next_sync(self) -> Optional[str]:
@@ -117,19 +293,12 @@ class InventorySyncScheduler:
         return f"{minutes}m {seconds}s"
     
     def set_interval(self, minutes: int):
-        """Cambia el intervalo de sincronización (requiere reinicio)"""
-        was_running = self.is_running
-        tienda_id = None
-        
-        if was_running:
-            # Guardar tienda actual antes de detener
-            # (en una implementación real, guardarías esto en session_state)
-            self.stop()
-        
+        """Cambia el intervalo de sincronización (se aplica desde el próximo ciclo)"""
         self.interval_minutes = minutes
         
-        if was_running and tienda_id:
-            self.start(tienda_id)
+        if self.is_running and self.watcher:
+            # Despertar al worker para recalcular la próxima sincronización
+            self.watcher.notify()
         
         return True, f"✅ Intervalo actualizado a {minutes} minutos"
 
@@ -187,12 +356,31 @@ class InventorySyncUI:
             else:
                 st.metric("Última Sync", "Nunca")
         
+        # Métricas por tienda
+        if status["stores"]:
+            st.dataframe(
+                [
+                    {
+                        "Tienda": tienda_id,
+                        "Latencia (ms)": metricas["latency_ms"],
+                        "Antigüedad (s)": metricas["staleness_seconds"],
+                        "Sincronizaciones": metricas["sync_count"],
+                        "Sin cambios": metricas["skipped_count"],
+                        "Errores seguidos": metricas["consecutive_failures"],
+                        "Reintento en (s)": metricas["retry_in_seconds"]
+                    }
+                    for tienda_id, metricas in status["stores"].items()
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+        
         # Mostrar errores si existen
         if status["last_error"]:
             st.error(f"**Último error:** {status['last_error']}")
     
-    def render_controls(self, tienda_id: str = "T001"):
-        """Renderiza controles de inicio/parada"""
+    def render_controls(self, tienda_id: Optional[str] = None):
+        """Renderiza controles de inicio/parada (sin tienda_id: todas las tiendas activas)"""
         status = self.scheduler.get_status()
         
         col1, col2, col3 = st.columns(3)
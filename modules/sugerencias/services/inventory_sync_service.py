@@ -3,12 +3,34 @@ Servicio de Sincronización de Inventario en Tiempo Real
 Conecta el módulo de Inventario con el módulo de Sugerencias
 """
 import os
+import copy
 import json
+import hashlib
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import streamlit as st
 
+# Notificaciones del sistema de archivos (inotify/FSEvents/...) si watchdog está instalado
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+    FileSystemEventHandler = object
+
+# Lector del inventario con el journal aplicado (inventario.json + inventario.log.jsonl)
+try:
+    from ...inventory.data.journal_inventario import cargar_documento, ruta_journal
+    JOURNAL_AVAILABLE = True
+except ImportError:
+    JOURNAL_AVAILABLE = False
+    
+    def ruta_journal(ruta_snapshot):
+        return Path(ruta_snapshot).with_name("inventario.log.jsonl")
+
 class InventorySyncService:
     """Servicio para sincronizar inventario entre módulos"""
     
@@ -16,10 +38,22 @@ class InventorySyncService:
         # Rutas de archivos
         self.business_root = Path(__file__).parent.parent.parent
         self.inventory_file = self.business_root / "data" / "inventory" / "inventario.json"
-        self.sugerencias_cache = self.business_root / "modules" / "sugerencias" / "data" / "inventory_cache.json"
+        # Los guardados van primero al journal; el snapshot solo se reescribe al compactar
+        self.inventory_log_file = ruta_journal(self.inventory_file)
+        # Cache por tienda: un archivo por tienda para que sincronizar una no pise a otra
+        self.sugerencias_cache_dir = self.business_root / "modules" / "sugerencias" / "data" / "inventory_cache"
         
         # Mapeo de productos del inventario a sugerencias
         self.product_mapping = self._initialize_product_mapping()
+        
+        # Detección de cambios: firma (mtime, tamaño) de snapshot y journal y digest por tienda
+        self._lock = threading.RLock()
+        self._file_signature: Optional[Tuple] = None
+        self._file_data: Optional[Dict] = None
+        self._store_digests: Dict[str, str] = {}     # digest de la sección de cada tienda en el archivo
+        self._mapped_inventory: Dict[str, Tuple[str, Dict]] = {}  # tienda -> (digest, resultado mapeado)
+        self._synced_digests: Dict[str, str] = {}    # último digest sincronizado por tienda
+        self._cache_digests: Dict[str, str] = {}     # digest escrito en el cache de cada tienda
     
     def _initialize_product_mapping(self) -> Dict[str, Dict]:
         """
@@ -130,6 +164,98 @@ class InventorySyncService:
             else:
                 return "STOCK OK"
     
+    @staticmethod
+    def _file_stat(path) -> Optional[Tuple[int, int]]:
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        return (info.st_mtime_ns, info.st_size)
+    
+    def watched_paths(self) -> List[Path]:
+        """Archivos cuyo cambio modifica el inventario: snapshot y journal"""
+        return [self.inventory_file, self.inventory_log_file]
+    
+    def _current_signature(self) -> Optional[Tuple]:
+        """
+        Firma barata del inventario: (mtime en ns, tamaño) del snapshot y del journal
+        
+        Cada guardado agrega una línea al journal, así que la firma cambia
+        aunque inventario.json no se reescriba hasta la próxima compactación.
+        """
+        signature = tuple(self._file_stat(path) for path in self.watched_paths())
+        if all(part is None for part in signature):
+            return None
+        return signature
+    
+    @staticmethod
+    def _section_digest(section) -> str:
+        """Digest del contenido de la sección de una tienda (independiente del orden de claves)"""
+        canonical = json.dumps(section, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+    
+    def _load_inventory_document(self) -> Optional[Dict]:
+        """
+        Documento completo de inventario; solo se vuelve a leer y parsear si
+        cambió el mtime o el tamaño del archivo
+        """
+        with self._lock:
+            signature = self._current_signature()
+            if signature is None:
+                self._file_signature = None
+                self._file_data = None
+                self._store_digests = {}
+                return None
+            
+            if signature != self._file_signature:
+                if JOURNAL_AVAILABLE:
+                    data = cargar_documento(self.inventory_file) or {}
+                else:
+                    with open(self.inventory_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                self._file_signature = signature
+                self._file_data = data
+                self._store_digests = {}
+            
+            return self._file_data
+    
+    def _store_section(self, tienda_id: str) -> Tuple[Dict, Optional[str]]:
+        """Sección de la tienda en el archivo y su digest (None si no hay archivo)"""
+        with self._lock:
+            data = self._load_inventory_document()
+            if data is None:
+                return {}, None
+            
+            section = data.get("inventario_por_tienda", {}).get(tienda_id, {})
+            digest = self._store_digests.get(tienda_id)
+            if digest is None:
+                digest = self._section_digest(section)
+                self._store_digests[tienda_id] = digest
+            return section, digest
+    
+    def cache_path(self, tienda_id: str) -> Path:
+        """Archivo de cache de una tienda"""
+        return self.sugerencias_cache_dir / f"{tienda_id}.json"
+    
+    def available_store_ids(self) -> List[str]:
+        """IDs de tienda presentes en el archivo de inventario"""
+        try:
+            data = self._load_inventory_document()
+        except Exception:
+            return []
+        return list((data or {}).get("inventario_por_tienda", {}).keys())
+    
+    def has_changes(self, tienda_id: str = "T001") -> bool:
+        """
+        Indica si la sección de la tienda cambió desde la última sincronización.
+        Si la firma del archivo no cambió, ni siquiera se abre.
+        """
+        try:
+            _, digest = self._store_section(tienda_id)
+        except Exception:
+            return True
+        return digest is None or digest != self._synced_digests.get(tienda_id)
+    
     def read_inventory_from_file(self, tienda_id: str = "T001") -> Dict:
         """
         Lee el inventario directamente del archivo JSON del módulo de inventario
@@ -142,18 +268,19 @@ class InventorySyncService:
             }
         """
         try:
-            if not self.inventory_file.exists():
-                return self._empty_inventory_response()
-            
-            with open(self.inventory_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
             # Obtener inventario de la tienda específica
-            inventario_tienda = data.get("inventario_por_tienda", {}).get(tienda_id, {})
+            inventario_tienda, digest = self._store_section(tienda_id)
             
             if not inventario_tienda:
                 return self._empty_inventory_response()
             
+            # Sección sin cambios: reutilizar el mapeo anterior
+            cached = self._mapped_inventory.get(tienda_id)
+            if cached and cached[0] == digest:
+                result = copy.deepcopy(cached[1])
+                result["metadata"]["fecha_sync"] = datetime.now().isoformat()
+                return result
+            
             # Procesar inventario
             result = {
                 "impulsivo": {},
@@ -254,6 +381,7 @@ class InventorySyncService:
             result["metadata"]["productos_sin_stock"] = productos_sin_stock
             result["metadata"]["total_productos"] = productos_con_stock + productos_sin_stock
             
+            self._mapped_inventory[tienda_id] = (digest, copy.deepcopy(result))
             return result
             
         except Exception as e:
@@ -275,42 +403,58 @@ class InventorySyncService:
             }
         }
     
-    def sync_to_cache(self, tienda_id: str = "T001") -> bool:
+    def sync_to_cache(self, tienda_id: str = "T001", inventory_data: Optional[Dict] = None) -> bool:
         """
-        Sincroniza el inventario actual a un archivo cache para el módulo de sugerencias
+        Sincroniza el inventario actual al archivo cache de la tienda para el módulo
+        de sugerencias. El archivo solo se reescribe si la sección de la tienda cambió.
         """
         try:
-            inventory_data = self.read_inventory_from_file(tienda_id)
+            cache_file = self.cache_path(tienda_id)
+            _, digest = self._store_section(tienda_id)
+            if (digest is not None and self._cache_digests.get(tienda_id) == digest
+                    and cache_file.exists()):
+                self._synced_digests[tienda_id] = digest
+                return True
+            
+            if inventory_data is None:
+                inventory_data = self.read_inventory_from_file(tienda_id)
             
-            # Asegurar que existe la carpeta data
-            self.sugerencias_cache.parent.mkdir(parents=True, exist_ok=True)
+            # Asegurar que existe la carpeta del cache
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
             
-            # Guardar en cache
-            with open(self.sugerencias_cache, 'w', encoding='utf-8') as f:
+            # Guardar en cache (archivo temporal + rename)
+            tmp_file = cache_file.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
                 json.dump(inventory_data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, cache_file)
             
+            if digest is not None:
+                self._cache_digests[tienda_id] = digest
+                self._synced_digests[tienda_id] = digest
             return True
         except Exception as e:
             st.error(f"Error sincronizando inventario: {str(e)}")
             return False
     
-    def get_cached_inventory(self) -> Optional[Dict]:
-        """Obtiene el inventario desde el cache"""
+    def get_cached_inventory(self, tienda_id: str = "T001") -> Optional[Dict]:
+        """Obtiene el inventario de una tienda desde el cache"""
         try:
-            if not self.sugerencias_cache.exists():
+            cache_file = self.cache_path(tienda_id)
+            if not cache_file.exists():
                 return None
             
-            with open(self.sugerencias_cache, 'r', encoding='utf-8') as f:
+            with open(cache_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
             st.error(f"Error leyendo cache: {str(e)}")
             return None
     
-    def get_inventory_summary(self, tienda_id: str = "T001") -> Dict:
+    def get_inventory_summary(self, tienda_id: str = "T001", inventory: Optional[Dict] = None) -> Dict:
         """
         Obtiene un resumen ejecutivo del inventario
         """
-        inventory = self.read_inventory_from_file(tienda_id)
+        if inventory is None:
+            inventory = self.read_inventory_from_file(tienda_id)
         metadata = inventory["metadata"]
         
         # Clasificar por estado
@@ -350,13 +494,18 @@ class InventorySyncService:
             inventory = self.read_inventory_from_file(tienda_id)
             
             if inventory["metadata"]["total_productos"] == 0:
-                return False, "❌ No se encontró inventario para sincronizar"
+                # Tienda sin inventario cargado: no hay nada que copiar al cache,
+                # y la sección queda al día hasta que cambie
+                _, digest = self._store_section(tienda_id)
+                if digest is not None:
+                    self._synced_digests[tienda_id] = digest
+                return True, "ℹ️ La tienda no tiene inventario para sincronizar"
             
             # Sincronizar a cache
-            success = self.sync_to_cache(tienda_id)
+            success = self.sync_to_cache(tienda_id, inventory)
             
             if success:
-                summary = self.get_inventory_summary(tienda_id)
+                summary = self.get_inventory_summary(tienda_id, inventory)
                 message = f"""
                 ✅ Sincronización exitosa!
                 
@@ -376,5 +525,114 @@ class InventorySyncService:
         except Exception as e:
             return False, f"❌ Error en sincronización: {str(e)}"
 
+    def sync_changed_stores(self, tienda_ids: List[str]) -> Dict[str, Tuple[bool, str]]:
+        """
+        Sincroniza solo las tiendas cuya sección del inventario cambió
+        
+        Returns:
+            {tienda_id: (success, message)} únicamente para las tiendas re-sincronizadas
+        """
+        results = {}
+        for tienda_id in tienda_ids:
+            if self.has_changes(tienda_id):
+                results[tienda_id] = self.force_sync(tienda_id)
+        return results
+
+
+class _InventoryFileEventHandler(FileSystemEventHandler):
+    """Despierta al watcher cuando se crea, modifica o reemplaza un archivo vigilado"""
+    
+    def __init__(self, watcher: "InventoryFileWatcher"):
+        super().__init__()
+        self.watcher = watcher
+    
+    def on_any_event(self, event):
+        paths = [getattr(event, "src_path", None), getattr(event, "dest_path", None)]
+        if any(p and os.path.abspath(p) in self.watcher.paths for p in paths):
+            self.watcher.notify()
+
+
+class InventoryFileWatcher:
+    """
+    Avisa cuando cambia alguno de los archivos de inventario
+    
+    Usa notificaciones del sistema de archivos si watchdog está instalado;
+    si no, consulta la firma (mtime, tamaño) cada `poll_seconds`.
+    """
+    
+    def __init__(self, paths, poll_seconds: float = 2.0):
+        # Una ruta o varias (p. ej. snapshot y journal del inventario)
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+        self.paths = [os.path.abspath(str(path)) for path in paths]
+        self.path = self.paths[0]
+        self.poll_seconds = poll_seconds
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._observer = None
+        self._poll_thread: Optional[threading.Thread] = None
+        self.mode = "watchdog" if WATCHDOG_AVAILABLE else "polling"
+    
+    def _signature(self):
+        return tuple(InventorySyncService._file_stat(path) for path in self.paths)
+    
+    def _poll_worker(self):
+        last = self._signature()
+        while not self._stop.wait(self.poll_seconds):
+            current = self._signature()
+            if current != last:
+                last = current
+                self._changed.set()
+    
+    def start(self):
+        """Comienza a vigilar el archivo"""
+        self._stop.clear()
+        if WATCHDOG_AVAILABLE:
+            try:
+                self._observer = Observer()
+                handler = _InventoryFileEventHandler(self)
+                for directory in dict.fromkeys(os.path.dirname(path) for path in self.paths):
+                    os.makedirs(directory, exist_ok=True)
+                    self._observer.schedule(handler, directory, recursive=False)
+                self._observer.daemon = True
+                self._observer.start()
+                self.mode = "watchdog"
+                return
+            except Exception as e:
+                print(f"⚠️ No se pudo vigilar {self.path} con watchdog, se usa polling: {e}")
+                self._observer = None
+        
+        self.mode = "polling"
+        self._poll_thread = threading.Thread(target=self._poll_worker, daemon=True)
+        self._poll_thread.start()
+    
+    def stop(self):
+        """Deja de vigilar y libera a quien esté esperando"""
+        self._stop.set()
+        self._changed.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        if self._poll_thread is not None:
+            self._poll_thread.join(timeout=5)
+            self._poll_thread = None
+    
+    def notify(self):
+        """Marca un cambio (también sirve para despertar al scheduler a mano)"""
+        self._changed.set()
+    
+    def wait_for_change(self, timeout: Optional[float] = None) -> bool:
+        """
+        Bloquea hasta que el archivo cambie o venza el timeout
+        
+        Returns:
+            True si hubo un cambio, False si venció el timeout
+        """
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed and not self._stop.is_set()
+
+
 # Instancia global del servicio
 inventory_sync_service = InventorySyncService()
@@ -3,6 +3,7 @@ Servicio para detección y manejo de ubicaciones
 """
 import os
 import logging
+from dataclasses import asdict
 from typing import Optional, List, Dict
 
 # Importar requests de manera segura
@@ -14,7 +15,25 @@ except ImportError:
     print(" Warning: requests no está disponible")
 
 from ..models.data_models import LocationInfo
-from ..config.settings import IPAPI_URL, API_TIMEOUT, OPENWEATHER_API_KEY
+from ..config.settings import (
+    IPAPI_URL, API_TIMEOUT, OPENWEATHER_API_KEY, PARAGUAY_TIMEZONE,
+    IP_LOCATION_TTL, GAZETTEER_MAX_DISTANCE_KM, GEOCODING_OFFLINE
+)
+from .geocode_cache import GeocodeCache, Gazetteer
+
+# Índice de búsqueda de tiendas (requiere numpy; sin él se usa la búsqueda lineal)
+try:
+    from .store_index import StoreSearchIndex
+    STORE_INDEX_AVAILABLE = True
+except ImportError:
+    STORE_INDEX_AVAILABLE = False
+
+# Índice espacial de tiendas y ciudades (requiere numpy; sin él se recorren las listas)
+try:
+    from .spatial_index import SpatialIndex
+    SPATIAL_INDEX_AVAILABLE = True
+except ImportError:
+    SPATIAL_INDEX_AVAILABLE = False
 
 # URLs para geocoding
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
@@ -26,21 +45,78 @@ GOOGLE_API_KEY = os.getenv('GOOGLE_PLACES_API_KEY', 'demo')
 
 logger = logging.getLogger(__name__)
 
+# Ciudades principales de Paraguay (referencia para ubicar coordenadas)
+MAJOR_CITIES = {
+    'Asunción': (-25.2637, -57.5759),
+    'Ciudad del Este': (-25.5163, -54.6116),
+    'San Lorenzo': (-25.3389, -57.5072),
+    'Luque': (-25.2667, -57.4833),
+    'Capiatá': (-25.3575, -57.4456),
+    'Lambaré': (-25.3425, -57.6094),
+    'Fernando de la Mora': (-25.3194, -57.5431),
+    'Limpio': (-25.1658, -57.4703),
+    'Ñemby': (-25.3892, -57.5369),
+    'Encarnación': (-27.3306, -55.8683)
+}
+
 
 class LocationService:
     """Servicio para detectar y manejar ubicaciones"""
     
-    def __init__(self):
+    def __init__(self, geocode_cache: Optional[GeocodeCache] = None,
+                 gazetteer: Optional[Gazetteer] = None, offline: bool = GEOCODING_OFFLINE):
+        """
+        Args:
+            geocode_cache: Caché de geocoding (por defecto la de settings.GEOCODE_CACHE_FILE)
+            gazetteer: Nomenclátor local (por defecto el incluido en data/)
+            offline: Resolver solo con la caché y el nomenclátor, sin red
+        """
         self.ip_api_url = IPAPI_URL
         self.nominatim_url = NOMINATIM_URL
+        self.geocode_cache = geocode_cache if geocode_cache is not None else GeocodeCache()
+        self._gazetteer = gazetteer
+        self.offline = offline
+        self._store_index = None
+        self._spatial_index = None
+        self._spatial_signature = None
+        self._cities_index = None
+    
+    def get_store_index(self, stores_database: Dict[str, List[Dict]]):
+        """
+        Índice de búsqueda de la base de tiendas; se construye una vez y solo
+        se reconstruye si cambia la base (otro objeto o distinta cantidad de tiendas)
+        """
+        if not STORE_INDEX_AVAILABLE:
+            return None
+        signature = StoreSearchIndex.database_signature(stores_database)
+        if self._store_index is None or self._store_index.signature != signature:
+            self._store_index = StoreSearchIndex(stores_database)
+        return self._store_index
+    
+    def get_gazetteer(self) -> Gazetteer:
+        """Nomenclátor local (se carga en la primera consulta)"""
+        if self._gazetteer is None:
+            self._gazetteer = Gazetteer()
+        return self._gazetteer
     
     def detect_location_by_ip(self) -> Optional[LocationInfo]:
         """
         Detecta la ubicación del usuario usando su IP
         
+        La respuesta se guarda en caché por IP_LOCATION_TTL; un fallo se
+        recuerda por GEOCODE_NEGATIVE_TTL para no reintentar en cada interacción.
+        
         Returns:
             LocationInfo o None si hay error
         """
+        cache_key = GeocodeCache.key('ip', 'public')
+        entry = self.geocode_cache.get(cache_key)
+        if entry:
+            return None if entry['negative'] else LocationInfo(**entry['value'])
+        
+        if self.offline:
+            return self._get_default_location()
+        
         if not REQUESTS_AVAILABLE:
             logger.error("requests no está disponible")
             return self._get_default_location()
@@ -54,9 +130,10 @@ class LocationService:
             
             if data.get('status') == 'fail':
                 logger.error(f"Error en IP-API: {data.get('message', 'Error desconocido')}")
+                self.geocode_cache.put_negative(cache_key)
                 return None
             
-            return LocationInfo(
+            location = LocationInfo(
                 lat=float(data.get('lat', 0)),
                 lon=float(data.get('lon', 0)),
                 city=data.get('city', ''),
@@ -64,12 +141,16 @@ class LocationService:
                 timezone=data.get('timezone', ''),
                 accuracy="ip"
             )
+            self.geocode_cache.put(cache_key, asdict(location), ttl=IP_LOCATION_TTL)
+            return location
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error en la llamada a IP-API: {e}")
+            self.geocode_cache.put_negative(cache_key)
             return None
         except (ValueError, KeyError) as e:
             logger.error(f"Error procesando datos de ubicación: {e}")
+            self.geocode_cache.put_negative(cache_key)
             return None
         except Exception as e:
             logger.error(f"Error inesperado detectando ubicación: {e}")
@@ -87,6 +168,31 @@ class LocationService:
         Returns:
             LocationInfo o None si hay error
         """
+        # 1. Caché (coordenadas redondeadas a ~11 m)
+        cache_key = GeocodeCache.coordinate_key('reverse', lat, lon)
+        entry = self.geocode_cache.get(cache_key)
+        if entry:
+            return self._manual_location(lat, lon) if entry['negative'] else LocationInfo(**entry['value'])
+        
+        # 2. Nomenclátor local: ciudad o barrio conocido cercano
+        if self.is_in_paraguay(lat, lon):
+            gazetteer = self.get_gazetteer()
+            nearest = gazetteer.reverse(lat, lon, GAZETTEER_MAX_DISTANCE_KM)
+            if nearest:
+                place = nearest[1]
+                return LocationInfo(
+                    lat=lat,
+                    lon=lon,
+                    city=place.get('city') or place['name'],
+                    country=gazetteer.country_code,
+                    timezone=PARAGUAY_TIMEZONE,
+                    accuracy="gazetteer"
+                )
+        
+        if self.offline:
+            return self._manual_location(lat, lon)
+        
+        # 3. Reverse geocoding en línea
         try:
             # Usar OpenWeatherMap para reverse geocoding
             url = "http://api.openweathermap.org/geo/1.0/reverse"
@@ -103,7 +209,7 @@ class LocationService:
                 data = response.json()
                 if data:
                     location = data[0]
-                    return LocationInfo(
+                    location_info = LocationInfo(
                         lat=lat,
                         lon=lon,
                         city=location.get('name', ''),
@@ -111,28 +217,29 @@ class LocationService:
                         timezone="",
                         accuracy="geocoding"
                     )
+                    self.geocode_cache.put(cache_key, asdict(location_info))
+                    return location_info
             
             # Fallback: crear LocationInfo con coordenadas solamente
-            return LocationInfo(
-                lat=lat,
-                lon=lon,
-                city="Ubicación personalizada",
-                country="",
-                timezone="",
-                accuracy="manual"
-            )
+            self.geocode_cache.put_negative(cache_key)
+            return self._manual_location(lat, lon)
             
         except Exception as e:
             logger.warning(f"Error en reverse geocoding: {e}")
+            self.geocode_cache.put_negative(cache_key)
             # Fallback: crear LocationInfo básica
-            return LocationInfo(
-                lat=lat,
-                lon=lon,
-                city="Ubicación personalizada",
-                country="",
-                timezone="",
-                accuracy="manual"
-            )
+            return self._manual_location(lat, lon)
+    
+    def _manual_location(self, lat: float, lon: float) -> LocationInfo:
+        """LocationInfo con coordenadas solamente"""
+        return LocationInfo(
+            lat=lat,
+            lon=lon,
+            city="Ubicación personalizada",
+            country="",
+            timezone="",
+            accuracy="manual"
+        )
     
     def validate_coordinates(self, lat: float, lon: float) -> bool:
         """
@@ -171,7 +278,8 @@ class LocationService:
     
     def get_nearest_major_city(self, lat: float, lon: float) -> str:
         """
-        Obtiene la ciudad principal más cercana en Paraguay
+        Obtiene la ciudad principal más cercana en Paraguay (distancia sobre
+        la superficie; sin numpy, distancia simple en grados)
         
         Args:
             lat: Latitud
@@ -180,23 +288,14 @@ class LocationService:
         Returns:
             Nombre de la ciudad más cercana
         """
-        major_cities = {
-            'Asunción': (-25.2637, -57.5759),
-            'Ciudad del Este': (-25.5163, -54.6116),
-            'San Lorenzo': (-25.3389, -57.5072),
-            'Luque': (-25.2667, -57.4833),
-            'Capiatá': (-25.3575, -57.4456),
-            'Lambaré': (-25.3425, -57.6094),
-            'Fernando de la Mora': (-25.3194, -57.5431),
-            'Limpio': (-25.1658, -57.4703),
-            'Ñemby': (-25.3892, -57.5369),
-            'Encarnación': (-27.3306, -55.8683)
-        }
+        cities_index = self._get_cities_index()
+        if cities_index is not None:
+            return cities_index.nearest(lat, lon, 1)[0][1]
         
         min_distance = float('inf')
         nearest_city = 'Asunción'  # Default
         
-        for city, (city_lat, city_lon) in major_cities.items():
+        for city, (city_lat, city_lon) in MAJOR_CITIES.items():
             # Cálculo simple de distancia
             distance = ((lat - city_lat) ** 2 + (lon - city_lon) ** 2) ** 0.5
             if distance < min_distance:
@@ -205,6 +304,142 @@ class LocationService:
         
         return nearest_city
     
+    def _get_cities_index(self):
+        """Índice espacial de MAJOR_CITIES (se construye una sola vez)"""
+        if not SPATIAL_INDEX_AVAILABLE:
+            return None
+        if self._cities_index is None:
+            self._cities_index = SpatialIndex(list(MAJOR_CITIES.values()), list(MAJOR_CITIES.keys()))
+        return self._cities_index
+    
+    def get_store_spatial_index(self):
+        """
+        Índice espacial de tiendas con coordenadas conocidas: la base de Grido
+        (settings.GRIDO_STORES_DATABASE) y la tabla `stores`. Se reconstruye solo
+        si cambia alguna de las dos fuentes.
+        
+        Returns:
+            SpatialIndex cuyos items son diccionarios de tienda, o None sin numpy
+        """
+        if not SPATIAL_INDEX_AVAILABLE:
+            return None
+        
+        from ..config.settings import GRIDO_STORES_DATABASE
+        try:
+            from .database_service import db_service
+        except Exception as e:
+            logger.warning(f"Base de datos no disponible para el índice espacial: {e}")
+            db_service = None
+        
+        grido_signature = (id(GRIDO_STORES_DATABASE),
+                           tuple((city, len(stores)) for city, stores in GRIDO_STORES_DATABASE.items()))
+        db_signature = db_service.get_stores_version() if db_service else None
+        signature = (grido_signature, db_signature)
+        if self._spatial_index is not None and self._spatial_signature == signature:
+            return self._spatial_index
+        
+        coordinates = []
+        items = []
+        for city, stores_list in GRIDO_STORES_DATABASE.items():
+            for store_data in stores_list:
+                lat = store_data.get('lat', 0) or 0
+                lon = store_data.get('lon', 0) or 0
+                # Las tiendas sin verificar tienen coordenadas 0, 0
+                if (lat == 0 and lon == 0) or not self.validate_coordinates(lat, lon):
+                    continue
+                coordinates.append((lat, lon))
+                items.append({
+                    **store_data,
+                    'id': f"{city}_{store_data.get('name', '')}",
+                    'city': city.replace('_', ' ').title(),
+                    'source': 'grido_database'
+                })
+        
+        if db_service:
+            for store in db_service.get_stores():
+                lat, lon = store.get('lat'), store.get('lon')
+                if lat is None or lon is None or not self.validate_coordinates(lat, lon):
+                    continue
+                coordinates.append((lat, lon))
+                items.append({**store, 'source': 'stores_table'})
+        
+        self._spatial_index = SpatialIndex(coordinates, items)
+        self._spatial_signature = signature
+        logger.info(f"Índice espacial construido con {len(items)} tiendas")
+        return self._spatial_index
+    
+    def invalidate_spatial_index(self):
+        """Fuerza la reconstrucción del índice espacial en la próxima consulta"""
+        self._spatial_index = None
+        self._spatial_signature = None
+    
+    @staticmethod
+    def _with_distance(matches) -> List[Dict]:
+        return [{**store, 'distance_km': round(distance, 3)} for distance, store in matches]
+    
+    def find_nearest_stores(self, lat: float, lon: float, k: int = 5,
+                            max_distance_km: Optional[float] = None) -> List[Dict]:
+        """
+        Tiendas más cercanas a unas coordenadas
+        
+        Args:
+            lat: Latitud
+            lon: Longitud
+            k: Cantidad máxima de tiendas
+            max_distance_km: Descartar tiendas más lejanas que esta distancia
+            
+        Returns:
+            Lista de tiendas con 'distance_km', de la más cercana a la más lejana
+        """
+        index = self.get_store_spatial_index()
+        if index is None:
+            return []
+        return self._with_distance(index.nearest(lat, lon, k, max_distance_km))
+    
+    def find_stores_within(self, lat: float, lon: float, radius_km: float) -> List[Dict]:
+        """
+        Tiendas dentro de un radio
+        
+        Args:
+            lat: Latitud
+            lon: Longitud
+            radius_km: Radio en kilómetros
+            
+        Returns:
+            Lista de tiendas con 'distance_km', de la más cercana a la más lejana
+        """
+        index = self.get_store_spatial_index()
+        if index is None:
+            return []
+        return self._with_distance(index.within(lat, lon, radius_km))
+    
+    def resolve_locations_batch(self, coordinates: List[tuple], k: int = 1) -> List[Dict]:
+        """
+        Ubica muchas coordenadas de una vez (p. ej. al dar de alta las tiendas de
+        una región): ciudad principal más cercana, si está en Paraguay y las k
+        tiendas conocidas más cercanas. El índice se arma una sola vez para todo el lote.
+        
+        Args:
+            coordinates: Lista de (lat, lon)
+            k: Tiendas cercanas a devolver por coordenada
+            
+        Returns:
+            Un diccionario por coordenada, en el mismo orden
+        """
+        index = self.get_store_spatial_index()
+        nearest = index.nearest_batch(coordinates, k) if index is not None else [[] for _ in coordinates]
+        
+        results = []
+        for (lat, lon), matches in zip(coordinates, nearest):
+            results.append({
+                'lat': lat,
+                'lon': lon,
+                'in_paraguay': self.is_in_paraguay(lat, lon),
+                'nearest_city': self.get_nearest_major_city(lat, lon),
+                'nearest_stores': self._with_distance(matches)
+            })
+        return results
+    
     def _get_default_location(self) -> LocationInfo:
         """
         Retorna la ubicación por defecto (Asunción, Paraguay)
@@ -234,14 +469,7 @@ class LocationService:
         """
         result = self.get_location_info(lat, lon)
         if result is None:
-            return LocationInfo(
-                lat=lat,
-                lon=lon,
-                city="Ubicación personalizada",
-                country="",
-                timezone="",
-                accuracy="manual"
-            )
+            return self._manual_location(lat, lon)
         return result
     
     def search_store_by_name(self, store_name: str, country: str = "Paraguay") -> List[Dict]:
@@ -255,13 +483,21 @@ class LocationService:
         Returns:
             Lista de ubicaciones encontradas
         """
+        query = f"{store_name}, {country}"
+        cache_key = GeocodeCache.key('store', query)
+        entry = self.geocode_cache.get(cache_key)
+        if entry:
+            return [] if entry['negative'] else [dict(result) for result in entry['value']]
+        
+        if self.offline:
+            return []
+        
         if not REQUESTS_AVAILABLE:
             logger.error("requests no está disponible para búsqueda")
             return []
         
         try:
             # Preparar la consulta de búsqueda
-            query = f"{store_name}, {country}"
             params = {
                 'q': query,
                 'format': 'json',
@@ -306,10 +542,15 @@ class LocationService:
             results.sort(key=lambda x: (x['confidence'], x['importance']), reverse=True)
             
             logger.info(f"Encontradas {len(results)} ubicaciones para '{store_name}'")
+            if results:
+                self.geocode_cache.put(cache_key, results)
+            else:
+                self.geocode_cache.put_negative(cache_key)
             return results
             
         except requests.RequestException as e:
             logger.error(f"Error en búsqueda de tienda: {e}")
+            self.geocode_cache.put_negative(cache_key)
             return []
         except Exception as e:
             logger.error(f"Error inesperado en búsqueda: {e}")
@@ -325,6 +566,32 @@ class LocationService:
         Returns:
             Lista de ubicaciones encontradas
         """
+        # Ciudades y barrios conocidos se resuelven con el nomenclátor local
+        gazetteer = self.get_gazetteer()
+        places = gazetteer.lookup(address)
+        if places:
+            return [
+                {
+                    'address': ', '.join(dict.fromkeys([place['name'], place['city'], place['department'], gazetteer.country])),
+                    'lat': place['lat'],
+                    'lon': place['lon'],
+                    'city': place['city'],
+                    'country': gazetteer.country,
+                    'type': place['type'],
+                    'importance': 0.6 if place['type'] == 'city' else 0.5,
+                    'source': 'gazetteer'
+                }
+                for place in places
+            ]
+        
+        cache_key = GeocodeCache.key('address', address)
+        entry = self.geocode_cache.get(cache_key)
+        if entry:
+            return [] if entry['negative'] else [dict(result) for result in entry['value']]
+        
+        if self.offline:
+            return []
+        
         if not REQUESTS_AVAILABLE:
             logger.error("requests no está disponible para búsqueda")
             return []
@@ -370,10 +637,15 @@ class LocationService:
             results.sort(key=lambda x: x['importance'], reverse=True)
             
             logger.info(f"Encontradas {len(results)} direcciones para '{address}'")
+            if results:
+                self.geocode_cache.put(cache_key, results)
+            else:
+                self.geocode_cache.put_negative(cache_key)
             return results
             
         except requests.RequestException as e:
             logger.error(f"Error en búsqueda de dirección: {e}")
+            self.geocode_cache.put_negative(cache_key)
             return []
         except Exception as e:
             logger.error(f"Error inesperado en búsqueda de dirección: {e}")
@@ -558,7 +830,16 @@ class LocationService:
             
             # Expandir términos de búsqueda con sinónimos
             expanded_terms = self._expand_search_terms(search_term)
+            
+            index = self.get_store_index(GRIDO_STORES_DATABASE)
+            if index is not None:
+                final_results = index.search(expanded_terms, max_results)
+                logger.info(f"Búsqueda local encontró {len(final_results)} tiendas para '{search_term}'")
+                return final_results
+            
+            # Búsqueda lineal (sin numpy)
             all_results = []
+            seen_ids = set()
             
             for term in expanded_terms:
                 # Búsqueda básica usando la función existente
@@ -573,7 +854,8 @@ class LocationService:
                     
                     # Evitar duplicados
                     store_id = basic_result.get('id', '')
-                    if not any(r.get('id') == store_id for r in all_results):
+                    if store_id not in seen_ids:
+                        seen_ids.add(store_id)
                         all_results.append(basic_result)
                 
                 # Búsqueda avanzada con fuzzy matching
@@ -608,7 +890,8 @@ class LocationService:
                             }
                             
                             # Evitar duplicados
-                            if not any(r.get('id') == store_id for r in all_results):
+                            if store_id not in seen_ids:
+                                seen_ids.add(store_id)
                                 all_results.append(result)
             
             # Ordenar por puntaje y limitar resultados
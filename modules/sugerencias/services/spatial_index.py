@@ -0,0 +1,164 @@
+"""
+Índice espacial de tiendas y ciudades (KD-tree)
+
+Los puntos se guardan como vectores unitarios (x, y, z) sobre la esfera: la
+distancia euclidiana entre dos vectores (cuerda) crece igual que la distancia
+sobre la superficie, así que las consultas de k vecinos y de radio son exactas
+en distancia real (haversine) sin proyecciones ni escaneos lineales.
+"""
+import heapq
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia sobre la superficie terrestre en km"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _to_unit_vectors(lats, lons) -> np.ndarray:
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def _km_to_chord(km: float) -> float:
+    angle = km / EARTH_RADIUS_KM
+    if angle >= math.pi:
+        return 2.0
+    return 2 * math.sin(angle / 2)
+
+
+class SpatialIndex:
+    """
+    KD-tree estático sobre coordenadas (lat, lon)
+
+    El árbol es implícito: los puntos se reordenan de modo que en cada rango
+    [lo, hi) el elemento del medio divide el espacio por el eje (profundidad % 3).
+    """
+
+    def __init__(self, coordinates: Sequence[Tuple[float, float]], items: Optional[Sequence[Any]] = None):
+        items = list(items) if items is not None else list(coordinates)
+        if len(items) != len(coordinates):
+            raise ValueError("coordinates e items deben tener el mismo largo")
+
+        n = len(coordinates)
+        coords = np.asarray(coordinates, dtype=np.float64).reshape(n, 2)
+        xyz = _to_unit_vectors(coords[:, 0], coords[:, 1])
+
+        perm = np.arange(n)
+        stack = [(0, n, 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= 1:
+                continue
+            mid = (lo + hi) // 2
+            segment = perm[lo:hi]
+            partition = np.argpartition(xyz[segment, depth % 3], mid - lo)
+            perm[lo:hi] = segment[partition]
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+
+        # Listas de tuplas: el recorrido en Python es más rápido que indexar arrays
+        self._points: List[Tuple[float, float, float]] = [tuple(p) for p in xyz[perm].tolist()]
+        self._items: List[Any] = [items[i] for i in perm]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _query_point(self, lat: float, lon: float) -> Tuple[float, float, float]:
+        return tuple(_to_unit_vectors([lat], [lon])[0].tolist())
+
+    def nearest(self, lat: float, lon: float, k: int = 1,
+                max_distance_km: Optional[float] = None) -> List[Tuple[float, Any]]:
+        """
+        Los k puntos más cercanos
+
+        Returns:
+            Lista de (distancia_km, item) ordenada de menor a mayor distancia
+        """
+        if k <= 0 or not self._items:
+            return []
+
+        q = self._query_point(lat, lon)
+        limit = _km_to_chord(max_distance_km) ** 2 if max_distance_km is not None else float('inf')
+        points = self._points
+        heap: List[Tuple[float, int]] = []  # (-distancia², posición): el más lejano queda arriba
+
+        def visit(lo: int, hi: int, depth: int):
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            p = points[mid]
+            d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+            if d2 <= limit:
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d2, -mid))
+                elif d2 < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d2, -mid))
+
+            axis = depth % 3
+            diff = q[axis] - p[axis]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            visit(near[0], near[1], depth + 1)
+            worst = -heap[0][0] if len(heap) == k else limit
+            if diff * diff <= worst:
+                visit(far[0], far[1], depth + 1)
+
+        visit(0, len(points), 0)
+        found = sorted((-neg_d2, -neg_pos) for neg_d2, neg_pos in heap)
+        return [(_chord_to_km(math.sqrt(d2)), self._items[pos]) for d2, pos in found]
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, Any]]:
+        """
+        Todos los puntos a radius_km o menos
+
+        Returns:
+            Lista de (distancia_km, item) ordenada de menor a mayor distancia
+        """
+        if radius_km < 0 or not self._items:
+            return []
+
+        q = self._query_point(lat, lon)
+        limit = _km_to_chord(radius_km) ** 2
+        points = self._points
+        found: List[Tuple[float, int]] = []
+
+        stack = [(0, len(points), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            p = points[mid]
+            d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+            if d2 <= limit:
+                found.append((d2, mid))
+
+            axis = depth % 3
+            diff = q[axis] - p[axis]
+            if diff < 0 or diff * diff <= limit:
+                stack.append((lo, mid, depth + 1))
+            if diff >= 0 or diff * diff <= limit:
+                stack.append((mid + 1, hi, depth + 1))
+
+        found.sort()
+        return [(_chord_to_km(math.sqrt(d2)), self._items[pos]) for d2, pos in found]
+
+    def nearest_batch(self, coordinates: Sequence[Tuple[float, float]], k: int = 1,
+                      max_distance_km: Optional[float] = None) -> List[List[Tuple[float, Any]]]:
+        """k vecinos más cercanos de muchas coordenadas (una consulta logarítmica por punto)"""
+        return [self.nearest(lat, lon, k, max_distance_km) for lat, lon in coordinates]
@@ -0,0 +1,311 @@
+"""
+Índice de búsqueda de tiendas para LocationService
+
+search_local_stores comparaba cada término expandido contra nombre, dirección
+y ciudad de todas las tiendas con un Levenshtein completo. Este índice se
+construye una sola vez por base de tiendas y evita casi todo ese trabajo:
+
+- Coincidencias por subcadena: índice invertido de trigramas por campo; solo
+  se verifican las tiendas que contienen todos los trigramas del término.
+- Coincidencias aproximadas: cota superior de similitud calculada para todas
+  las tiendas a la vez con histogramas de caracteres (NumPy).
+- Top-k: las tiendas se evalúan de mayor a menor cota y la búsqueda termina
+  cuando la cota de la siguiente ya no alcanza al k-ésimo resultado; el
+  Levenshtein exacto (vectores de bits) solo corre sobre esas pocas tiendas.
+
+Los puntajes, el orden y los resultados son idénticos a la búsqueda lineal.
+"""
+import heapq
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Campos comparados y peso de cada uno en el puntaje aproximado
+FIELD_NAME = 0
+FIELD_ADDRESS = 1
+FIELD_CITY = 2
+FIELD_WEIGHTS = (1.0, 0.7, 0.8)
+
+FUZZY_THRESHOLD = 0.3   # puntaje mínimo (exclusivo) para incluir una tienda
+EXACT_SCORE = 0.9       # puntaje de las coincidencias por subcadena
+
+# Cubetas del histograma: a-z, 0-9, espacio y el resto repartido por hash.
+# Agrupar caracteres distintos en una cubeta solo afloja la cota, nunca la rompe.
+HISTOGRAM_SIZE = 64
+
+
+def _bucket(char: str) -> int:
+    if 'a' <= char <= 'z':
+        return ord(char) - 97
+    if '0' <= char <= '9':
+        return 26 + ord(char) - 48
+    if char == ' ':
+        return 36
+    return 37 + ord(char) % (HISTOGRAM_SIZE - 37)
+
+
+def char_histogram(text: str) -> np.ndarray:
+    histogram = np.zeros(HISTOGRAM_SIZE, dtype=np.int32)
+    for char in text:
+        histogram[_bucket(char)] += 1
+    return histogram
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def levenshtein_distance(s1: str, s2: str) -> int:
+    """
+    Distancia de Levenshtein con el algoritmo de vectores de bits de Myers/Hyyrö:
+    cada columna de la matriz se procesa con operaciones sobre enteros, O(n)
+    operaciones en lugar de O(n·m) celdas
+    """
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    m = len(s1)
+    if m == 0:
+        return len(s2)
+
+    peq: Dict[str, int] = {}
+    for i, char in enumerate(s1):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, distance = mask, 0, m
+    for char in s2:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+
+    return distance
+
+
+class StoreSearchIndex:
+    """Índice de GRIDO_STORES_DATABASE (o cualquier base con el mismo formato)"""
+
+    def __init__(self, stores_database: Dict[str, List[Dict]]):
+        self.signature = self.database_signature(stores_database)
+
+        # Tiendas en el mismo orden en que las recorre la búsqueda lineal
+        self.entries: List[Tuple[str, Dict]] = [
+            (city, store_data)
+            for city, stores_list in stores_database.items()
+            for store_data in stores_list
+        ]
+        n = len(self.entries)
+        self.ids = [f"{city}_{store.get('name', '')}" for city, store in self.entries]
+        
+        # Tiendas con el mismo id: solo aparece la primera que coincide
+        groups: Dict[str, List[int]] = {}
+        for i, store_id in enumerate(self.ids):
+            groups.setdefault(store_id, []).append(i)
+        self._groups: List[List[int]] = list(groups.values())
+        self._group_of = np.zeros(n, dtype=np.intp)
+        for g, members in enumerate(self._groups):
+            self._group_of[members] = g
+
+        # Textos para subcadenas (mismas transformaciones que search_grido_stores)
+        self._substring_fields = [
+            [store['name'].lower() for _, store in self.entries],
+            [store['address'].lower() for _, store in self.entries],
+            [city.replace('_', ' ') for city, _ in self.entries],
+        ]
+        self._trigram_postings: List[Dict[str, Set[int]]] = []
+        for texts in self._substring_fields:
+            postings: Dict[str, Set[int]] = {}
+            for i, text in enumerate(texts):
+                for gram in trigrams(text):
+                    postings.setdefault(gram, set()).add(i)
+            self._trigram_postings.append(postings)
+
+        # Textos para la similitud aproximada (mismas transformaciones que _fuzzy_match_score)
+        self.city_titles = [city.replace('_', ' ').title() for city, _ in self.entries]
+        self._fuzzy_fields = [
+            [store.get('name', '').lower().strip() for _, store in self.entries],
+            [store.get('address', '').lower().strip() for _, store in self.entries],
+            [title.lower().strip() for title in self.city_titles],
+        ]
+        self._lengths = np.array(
+            [[len(text) for text in texts] for texts in self._fuzzy_fields], dtype=np.int32
+        ).reshape(3, n)
+        self._histograms = np.zeros((3, n, HISTOGRAM_SIZE), dtype=np.int32)
+        for f, texts in enumerate(self._fuzzy_fields):
+            for i, text in enumerate(texts):
+                for char in text:
+                    self._histograms[f, i, _bucket(char)] += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def database_signature(stores_database: Dict[str, List[Dict]]) -> Tuple:
+        """Firma barata para saber si hay que reconstruir el índice"""
+        return (id(stores_database), tuple((city, len(stores)) for city, stores in stores_database.items()))
+
+    def substring_matches(self, term: str) -> List[int]:
+        """Posiciones de las tiendas cuyo nombre, dirección o ciudad contienen el término"""
+        query = term.lower()
+        if len(query) < 3:
+            candidates = range(len(self.entries))
+        else:
+            grams = trigrams(query)
+            candidates = set()
+            for postings in self._trigram_postings:
+                lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+                if lists and lists[0]:
+                    candidates |= set.intersection(*lists)
+            candidates = sorted(candidates)
+
+        names, addresses, cities = self._substring_fields
+        return [i for i in candidates if query in names[i] or query in addresses[i] or query in cities[i]]
+
+    def fuzzy_bounds(self, term: str) -> np.ndarray:
+        """
+        Cota superior del puntaje ponderado de cada (campo, tienda). La similitud
+        de Levenshtein está acotada por (caracteres en común) / (longitud mayor).
+        """
+        query = term.lower().strip()
+        query_histogram = char_histogram(query)
+        common = np.minimum(self._histograms, query_histogram).sum(axis=2)
+        longest = np.maximum(self._lengths, len(query))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            upper_bound = np.where(longest > 0, common / longest, 1.0)
+        # Margen mínimo para que el redondeo nunca descarte un campo válido
+        return upper_bound * np.array(FIELD_WEIGHTS)[:, None] + 1e-9
+
+    def _field_score(self, query: str, field: int, i: int, cache: Optional[Dict] = None) -> float:
+        """Puntaje ponderado de un campo (mismo cálculo que _fuzzy_match_score)"""
+        text = self._fuzzy_fields[field][i]
+        if cache is not None and (field, text) in cache:
+            return cache[(field, text)]
+
+        weight = FIELD_WEIGHTS[field]
+        max_len = max(len(query), len(text))
+        if query == text or max_len == 0:
+            score = 1.0 * weight
+        else:
+            score = max(0.0, 1 - (levenshtein_distance(query, text) / max_len)) * weight
+
+        if cache is not None:
+            cache[(field, text)] = score
+        return score
+
+    def fuzzy_score(self, term: str, i: int, fields: Sequence[int] = (FIELD_NAME, FIELD_ADDRESS, FIELD_CITY),
+                    cache: Optional[Dict] = None) -> float:
+        """
+        Mismo puntaje combinado que la búsqueda lineal; `fields` limita los campos
+        evaluados a los que pueden superar el umbral y `cache` reutiliza los
+        puntajes de textos repetidos (p. ej. la ciudad) para el mismo término
+        """
+        query = term.lower().strip()
+        return max((self._field_score(query, field, i, cache) for field in fields), default=0.0)
+
+    def _evaluate(self, i: int, terms: Sequence[str], substring: List[np.ndarray], bounds: List[np.ndarray],
+                  caches: List[Dict]) -> Optional[Tuple[float, Tuple[int, int, int]]]:
+        """
+        Puntaje de la tienda `i` y su orden de inserción en la búsqueda lineal
+        (término, fase, posición): la tienda toma el primer término que la encuentra
+        """
+        for t, term in enumerate(terms):
+            if substring[t][i]:
+                return EXACT_SCORE, (t, 0, i)
+            fields = [f for f in (FIELD_NAME, FIELD_ADDRESS, FIELD_CITY) if bounds[t][f, i] > FUZZY_THRESHOLD]
+            if fields:
+                score = self.fuzzy_score(term, i, fields, caches[t])
+                if score > FUZZY_THRESHOLD:
+                    return score, (t, 1, i)
+        return None
+
+    def _result(self, i: int, term: str, phase: int, score: float) -> Dict:
+        """Arma el diccionario de resultado con el mismo formato que la búsqueda lineal"""
+        city, store_data = self.entries[i]
+        if phase == 0:
+            return {
+                **store_data,
+                'match_type': 'exact',
+                'city': city,
+                'score': score,
+                'search_term': term,
+                'id': self.ids[i]
+            }
+        return {
+            'id': self.ids[i],
+            'name': store_data.get('name', ''),
+            'address': store_data.get('address', ''),
+            'city': self.city_titles[i],
+            'lat': store_data.get('lat', 0),
+            'lon': store_data.get('lon', 0),
+            'phone': store_data.get('phone', ''),
+            'score': score,
+            'match_type': 'fuzzy',
+            'search_term': term
+        }
+
+    def search(self, terms: Sequence[str], max_results: int = 10) -> List[Dict]:
+        """
+        Busca los términos expandidos con la misma semántica que la búsqueda
+        lineal: por cada término primero las subcadenas y luego las aproximadas;
+        cada tienda conserva el puntaje del primer término que la encontró y el
+        resultado se ordena por puntaje respetando ese orden de inserción.
+        """
+        if not self.entries or not terms or max_results <= 0:
+            return []
+
+        n = len(self.entries)
+        substring = []
+        bounds = []
+        best_bound = np.zeros(n)
+        for term in terms:
+            mask = np.zeros(n, dtype=bool)
+            mask[self.substring_matches(term)] = True
+            substring.append(mask)
+            term_bounds = self.fuzzy_bounds(term)
+            bounds.append(term_bounds)
+            fuzzy_bound = term_bounds.max(axis=0)
+            fuzzy_bound[fuzzy_bound <= FUZZY_THRESHOLD] = 0.0
+            best_bound = np.maximum(best_bound, np.where(mask, EXACT_SCORE, fuzzy_bound))
+
+        # Cota por grupo de id y evaluación de mayor a menor cota
+        group_bound = np.zeros(len(self._groups))
+        np.maximum.at(group_bound, self._group_of, best_bound)
+        order = np.argsort(-group_bound, kind='stable')
+
+        caches: List[Dict] = [{} for _ in terms]
+        
+        # Montículo con los k mejores: (puntaje, -orden de inserción) -> el peor queda arriba
+        top: List[Tuple[float, Tuple[int, int, int], Tuple[int, int, int]]] = []
+        for g in order:
+            bound = group_bound[g]
+            if bound <= 0 or (len(top) == max_results and bound < top[0][0]):
+                break
+
+            found = None
+            for i in self._groups[g]:
+                if best_bound[i] <= 0:
+                    continue
+                evaluated = self._evaluate(i, terms, substring, bounds, caches)
+                if evaluated and (found is None or evaluated[1] < found[1]):
+                    found = evaluated
+            if found is None:
+                continue
+
+            score, key = found
+            entry = (score, tuple(-k for k in key), key)
+            if len(top) < max_results:
+                heapq.heappush(top, entry)
+            elif entry > top[0]:
+                heapq.heapreplace(top, entry)
+
+        ranked = sorted(top, key=lambda e: (-e[0], e[2]))
+        return [self._result(key[2], terms[key[0]], key[1], score) for score, _, key in ranked]
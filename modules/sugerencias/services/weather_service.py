@@ -3,64 +3,230 @@ Servicio para obtener datos meteorológicos usando Open-Meteo (gratuito, sin API
 Open-Meteo funciona perfectamente para Paraguay sin restricciones
 """
 import requests
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import json
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
 
 from ..models.data_models import WeatherData
-from ..config.settings import API_TIMEOUT
+from ..config.settings import (
+    API_TIMEOUT, OPEN_METEO_URL, WEATHER_CACHE_FILE, WEATHER_CACHE_TTL, WEATHER_GRID_DECIMALS
+)
 
 logger = logging.getLogger(__name__)
 
 
+class ForecastCache:
+    """
+    Caché persistente de respuestas de Open-Meteo.
+    
+    La clave es la celda de grilla (lat/lon redondeados) + la fecha del
+    pronóstico, así todas las tiendas de una misma celda comparten una sola
+    consulta por día. Las entradas vencidas (más viejas que el TTL) se siguen
+    sirviendo mientras se revalidan en segundo plano o si la API falla.
+    """
+    
+    DIAS_RETENCION = 3  # entradas más viejas se descartan al guardar
+    
+    def __init__(self, path: str = WEATHER_CACHE_FILE, ttl: int = WEATHER_CACHE_TTL,
+                 decimales: int = WEATHER_GRID_DECIMALS):
+        self.path = path
+        self.ttl = ttl
+        self.decimales = decimales
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.RLock()
+        self._cell_locks: Dict[str, threading.Lock] = {}
+        self._refreshing = set()
+    
+    def cell(self, lat: float, lon: float) -> Tuple[float, float]:
+        """Celda de grilla a la que pertenece una coordenada"""
+        return round(lat, self.decimales), round(lon, self.decimales)
+    
+    def key(self, cell: Tuple[float, float], fecha: str) -> str:
+        return f"{cell[0]:.{self.decimales}f},{cell[1]:.{self.decimales}f}@{fecha}"
+    
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+    
+    def _save(self):
+        """Escritura atómica; se descartan entradas de días viejos"""
+        limite = (datetime.now() - timedelta(days=self.DIAS_RETENCION)).strftime('%Y-%m-%d')
+        entries = {k: v for k, v in self._entries.items() if k.rsplit('@', 1)[-1] >= limite}
+        self._entries = entries
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar la caché del clima: {e}")
+    
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            return self._load().get(key)
+    
+    def latest_for_cell(self, cell: Tuple[float, float]) -> Optional[Dict]:
+        """Entrada más reciente de la celda, de cualquier fecha (respaldo offline)"""
+        prefix = self.key(cell, '')
+        with self._lock:
+            candidates = [v for k, v in self._load().items() if k.startswith(prefix)]
+        return max(candidates, key=lambda e: e['fetched_at']) if candidates else None
+    
+    def put(self, key: str, raw: Dict) -> Dict:
+        entry = {'fetched_at': time.time(), 'raw': raw}
+        with self._lock:
+            self._load()[key] = entry
+            self._save()
+        return entry
+    
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry['fetched_at'] < self.ttl
+    
+    def cell_lock(self, key: str) -> threading.Lock:
+        """Lock por clave: una sola consulta en vuelo por celda"""
+        with self._lock:
+            return self._cell_locks.setdefault(key, threading.Lock())
+    
+    def start_refresh(self, key: str) -> bool:
+        """Marca una revalidación en curso; False si ya hay una"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+    
+    def finish_refresh(self, key: str):
+        with self._lock:
+            self._refreshing.discard(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._save()
+
+
 class WeatherService:
     """Servicio para obtener datos del clima usando Open-Meteo"""
     
-    def __init__(self):
-        self.open_meteo_url = "https://api.open-meteo.com/v1/forecast"
+    def __init__(self, base_url: Optional[str] = None, cache: Optional[ForecastCache] = None):
+        self.open_meteo_url = base_url or OPEN_METEO_URL
+        self.cache = cache if cache is not None else ForecastCache()
+    
+    def _fetch_open_meteo(self, lat: float, lon: float) -> Dict:
+        """Consulta la API de Open-Meteo y devuelve la respuesta cruda"""
+        params = {
+            'latitude': lat,
+            'longitude': lon,
+            'daily': 'temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode',
+            'timezone': 'America/Asuncion',
+            'forecast_days': 7
+        }
+        
+        response = requests.get(self.open_meteo_url, params=params, timeout=API_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+    
+    def _build_forecast(self, data: Dict, lat: float, lon: float, fetched_at: Optional[float] = None,
+                        stale: bool = False) -> Dict:
+        """Arma el diccionario de pronóstico a partir de la respuesta cruda"""
+        daily_forecasts = self._process_open_meteo_data(data)
+        
+        # Una entrada de días anteriores solo aporta los días que todavía no pasaron
+        hoy = datetime.now().strftime('%Y-%m-%d')
+        vigentes = [w for w in daily_forecasts if w.date >= hoy]
+        if vigentes:
+            daily_forecasts = vigentes
+        
+        return {
+            'source': 'Open-Meteo',
+            'location': f"Paraguay ({lat:.2f}, {lon:.2f})",
+            'daily_weather': daily_forecasts,
+            'week_start': hoy,
+            'cached': fetched_at is not None,
+            'stale': stale,
+            'fetched_at': datetime.fromtimestamp(fetched_at).isoformat() if fetched_at else None
+        }
     
-    def get_open_meteo_forecast(self, lat: float, lon: float) -> Optional[Dict]:
+    def _refresh_in_background(self, cell: Tuple[float, float], key: str):
+        """Revalida una entrada vencida sin bloquear la página"""
+        if not self.cache.start_refresh(key):
+            return
+        
+        def refresh():
+            try:
+                with self.cache.cell_lock(key):
+                    self.cache.put(key, self._fetch_open_meteo(*cell))
+                logger.info(f"🔄 Pronóstico revalidado para la celda {key}")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo revalidar el pronóstico ({key}): {e}")
+            finally:
+                self.cache.finish_refresh(key)
+        
+        threading.Thread(target=refresh, daemon=True).start()
+    
+    def get_open_meteo_forecast(self, lat: float, lon: float, use_cache: bool = True) -> Optional[Dict]:
         """
         Obtiene pronóstico de Open-Meteo (gratuito, sin API key, funciona en Paraguay)
         
+        Con caché: respuesta fresca -> se sirve directo; vencida -> se sirve y
+        se revalida en segundo plano; sin entrada -> una sola consulta por celda
+        aunque la pidan varias tiendas a la vez. Si la API falla se usa la
+        última entrada de la celda.
+        
         Args:
             lat: Latitud
             lon: Longitud
+            use_cache: False fuerza una consulta directa a la API
             
         Returns:
             Diccionario con datos del pronóstico o None si hay error
         """
+        if not use_cache:
+            try:
+                logger.info(f"🌤️ Obteniendo pronóstico REAL de Open-Meteo para Paraguay (lat={lat:.4f}, lon={lon:.4f})")
+                return self._build_forecast(self._fetch_open_meteo(lat, lon), lat, lon)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"❌ Error en API de Open-Meteo: {e}")
+                return None
+            except Exception as e:
+                logger.error(f"❌ Error procesando datos de Open-Meteo: {e}")
+                return None
+        
+        cell = self.cache.cell(lat, lon)
+        key = self.cache.key(cell, datetime.now().strftime('%Y-%m-%d'))
+        
+        entry = self.cache.get(key)
+        if entry and not self.cache.is_fresh(entry):
+            self._refresh_in_background(cell, key)
+        
+        if entry is None:
+            with self.cache.cell_lock(key):
+                # Otra tienda de la misma celda pudo haberlo traído mientras esperábamos
+                entry = self.cache.get(key)
+                if entry is None:
+                    try:
+                        logger.info(f"🌤️ Obteniendo pronóstico REAL de Open-Meteo para la celda {key}")
+                        entry = self.cache.put(key, self._fetch_open_meteo(*cell))
+                    except Exception as e:
+                        logger.error(f"❌ Error en API de Open-Meteo: {e}")
+                        entry = self.cache.latest_for_cell(cell)
+                        if entry is None:
+                            return None
+                        logger.warning("⚠️ Usando el último pronóstico guardado para esta zona")
+        
         try:
-            logger.info(f"🌤️ Obteniendo pronóstico REAL de Open-Meteo para Paraguay (lat={lat:.4f}, lon={lon:.4f})")
-            
-            params = {
-                'latitude': lat,
-                'longitude': lon,
-                'daily': 'temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode',
-                'timezone': 'America/Asuncion',
-                'forecast_days': 7
-            }
-            
-            response = requests.get(self.open_meteo_url, params=params, timeout=API_TIMEOUT)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Procesar datos para obtener pronóstico diario
-            daily_forecasts = self._process_open_meteo_data(data)
-            
-            logger.info(f"✅ Pronóstico obtenido: {len(daily_forecasts)} días de datos REALES")
-            
-            return {
-                'source': 'Open-Meteo',
-                'location': f"Paraguay ({lat:.2f}, {lon:.2f})",
-                'daily_weather': daily_forecasts,
-                'week_start': datetime.now().strftime('%Y-%m-%d')
-            }
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Error en API de Open-Meteo: {e}")
-            return None
+            return self._build_forecast(entry['raw'], lat, lon, fetched_at=entry['fetched_at'],
+                                        stale=not self.cache.is_fresh(entry))
         except Exception as e:
             logger.error(f"❌ Error procesando datos de Open-Meteo: {e}")
             return None
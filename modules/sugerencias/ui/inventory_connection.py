@@ -281,7 +281,7 @@ class InventoryConnectionUI:
         st.markdown("---")
         if "scheduler_ui" in st.session_state:
             st.session_state.scheduler_ui.render_status_widget()
-            st.session_state.scheduler_ui.render_controls(tienda_id)
+            st.session_state.scheduler_ui.render_controls()
     
     def render_full_page(self, tienda_id: str = "T001"):
         """Renderiza la página completa de conexión al inventario"""
@@ -52,6 +52,12 @@ from ..config.settings import PARAGUAY_HOLIDAYS
 # FUNCIONES HELPER
 # ============================================================================
 
+def _show_import_preview(df, total_rows: int):
+    """Vista previa del archivo importado (solo las primeras filas se conservan)"""
+    st.dataframe(df, use_container_width=True)
+    if len(df) < total_rows:
+        st.caption(f"Mostrando las primeras {len(df)} de {total_rows} filas")
+
 def _process_inventory_file(uploaded_file, category_name: str):
     """
     Procesa un archivo de inventario cargado
@@ -67,201 +73,76 @@ def _process_inventory_file(uploaded_file, category_name: str):
         if not PANDAS_AVAILABLE:
             st.error("❌ Pandas no está disponible. Instala pandas para cargar archivos Excel.")
             return None
-            
-        import pandas as pd
         
-        try:
-            import openpyxl
-        except ImportError:
-            st.error("❌ openpyxl no está instalado. Ejecuta: pip install openpyxl")
-            return None
+        from ..core.inventory_import import import_inventory
         
-        # Leer el archivo según su extensión
+        # Leer el archivo según su extensión (los CSV se leen por bloques)
         file_name = uploaded_file.name
-        if file_name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file, engine='openpyxl')
-        
-        # FORMATO DIFERENTE SEGÚN CATEGORÍA
-        if category_name == "Granel":
-            # FORMATO GRANEL: Estado | Producto | Cajas Cerradas | Cajas Abiertas | Kgs Abiertas | Total Kgs
-            required_columns_granel = {
-                'Estado': ['Estado', 'estado', 'ESTADO'],
-                'Producto': ['Producto', 'producto', 'PRODUCTO'],
-                'Cajas Cerradas': ['Cajas Cerradas', 'cajas cerradas', 'CAJAS CERRADAS', 'Cajas_Cerradas'],
-                'Cajas Abiertas': ['Cajas Abiertas', 'cajas abiertas', 'CAJAS ABIERTAS', 'Cajas_Abiertas'],
-                'Kgs Abiertas': ['Kgs Abiertas', 'kgs abiertas', 'KGS ABIERTAS', 'Kgs_Abiertas', 'Kgs.Abiertas'],
-                'Total Kgs': ['Total Kgs', 'total kgs', 'TOTAL KGS', 'Total_Kgs']
-            }
-            
-            # Buscar columnas
-            found_columns = {}
-            for req_col, variations in required_columns_granel.items():
-                for col in df.columns:
-                    clean_col = str(col).strip()
-                    if clean_col in variations or any(v.lower() in clean_col.lower() for v in variations):
-                        found_columns[req_col] = col
-                        break
-            
-            # Verificar columnas mínimas necesarias
-            required_min = ['Estado', 'Producto', 'Cajas Cerradas', 'Cajas Abiertas', 'Kgs Abiertas']
-            if all(col in found_columns for col in required_min):
-                # Renombrar columnas
-                rename_map = {v: k for k, v in found_columns.items()}
-                df = df.rename(columns=rename_map)
-                
-                # Procesar datos de GRANEL
-                inventory_data = []
-                KG_POR_CAJA_CERRADA = 7.8
-                
-                for _, row in df.iterrows():
-                    # Limpiar y convertir valores (remover "kg" si existe)
-                    def clean_value(val):
-                        """Limpia valores como '4.6kg', '5,236kg' o '7,5kg' convirtiéndolos a float"""
-                        if pd.isna(val) or val == '' or val == 'N/A':
-                            return 0
-                        # Convertir a string y limpiar
-                        val_str = str(val).strip().lower()
-                        # Remover 'kg' si existe
-                        val_str = val_str.replace('kg', '').replace('kgs', '').strip()
-                        # Reemplazar coma por punto (formato europeo: 5,236 → 5.236)
-                        val_str = val_str.replace(',', '.')
-                        try:
-                            return float(val_str)
-                        except (ValueError, AttributeError):
-                            return 0
-                    
-                    # Calcular bultos totales (cajas cerradas + cajas abiertas)
-                    cajas_cerradas = clean_value(row.get('Cajas Cerradas', 0))
-                    cajas_abiertas = clean_value(row.get('Cajas Abiertas', 0))
-                    kgs_abiertas = clean_value(row.get('Kgs Abiertas', 0))
-                    
-                    # Total de bultos = cajas cerradas + cajas abiertas
-                    total_bultos = int(cajas_cerradas + cajas_abiertas)
-                    
-                    # Determinar estado del stock
-                    estado_raw = str(row.get('Estado', 'STOCK OK')).upper()
-                    
-                    # CRÍTICO: Si no hay bultos pero hay kgs (solo caja abierta parcial), es SIN STOCK
-                    if total_bultos == 0 and kgs_abiertas > 0:
-                        estado_stock = 'SIN STOCK'  # CRÍTICO: solo quedan restos
-                    elif 'OK' in estado_raw or 'SUFICIENTE' in estado_raw:
-                        estado_stock = 'STOCK OK'
-                    elif 'MEDIO' in estado_raw or 'BAJO' in estado_raw:
-                        estado_stock = 'STOCK BAJO'
-                    elif 'SIN' in estado_raw or estado_raw == 'N/A':
-                        estado_stock = 'SIN STOCK'
-                    else:
-                        estado_stock = 'STOCK OK'
-                    
-                    # Calcular total de kgs CORRECTAMENTE (7.8kg por caja cerrada)
-                    total_kgs = (cajas_cerradas * KG_POR_CAJA_CERRADA) + kgs_abiertas
-                    
-                    item = {
-                        'Producto': str(row.get('Producto', '')),
-                        'Bultos': total_bultos,
-                        'Unidad': total_kgs,  # TOTAL KGS (no solo abiertas)
-                        'Estado Stock': estado_stock,
-                        '_tipo_producto': 'granel',
-                        '_cajas_cerradas': cajas_cerradas,
-                        '_cajas_abiertas': cajas_abiertas,
-                        '_kgs_abiertas': kgs_abiertas,
-                        '_total_kgs': total_kgs
-                    }
-                    inventory_data.append(item)
-                
-                st.success(f"✅ {category_name} cargado: {len(inventory_data)} productos (formato Granel)")
-                
-                # Mostrar resumen
-                with st.expander(f" Ver detalles de {category_name}"):
-                    st.dataframe(df, use_container_width=True)
-                    
-                    # Estadísticas
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric(" Total productos", len(inventory_data))
-                    with col2:
-                        total_cajas = sum(item['Bultos'] for item in inventory_data)
-                        st.metric(" Total cajas", f"{total_cajas}")
-                    with col3:
-                        total_kgs = sum(item['_total_kgs'] for item in inventory_data)
-                        st.metric(" Total kg", f"{total_kgs:.1f}kg")
-                    with col4:
-                        stock_bajo = sum(1 for item in inventory_data if 'BAJO' in item['Estado Stock'] or 'MEDIO' in item['Estado Stock'])
-                        st.metric("⚠️ Stock bajo/medio", f"{stock_bajo}")
-                
-                return inventory_data
-            else:
-                st.error(f" El archivo de Granel no tiene todas las columnas requeridas")
-                st.warning(f"Columnas encontradas: {list(found_columns.keys())}")
-                st.warning(f"Columnas necesarias: {required_min}")
-                st.info("📋 Columnas disponibles en tu archivo:")
-                st.code(list(df.columns))
+        if not file_name.lower().endswith('.csv'):
+            try:
+                import openpyxl
+            except ImportError:
+                st.error("❌ openpyxl no está instalado. Ejecuta: pip install openpyxl")
                 return None
         
-        else:
-            # FORMATO IMPULSIVOS: Producto | Bultos | Unidad | Estado Stock
-            required_columns = ['Producto', 'Bultos', 'Unidad', 'Estado Stock']
-            
-            # Buscar columnas con flexibilidad
-            found_columns = {}
-            for req_col in required_columns:
-                for col in df.columns:
-                    clean_col = str(col).strip()
-                    if req_col.lower() in clean_col.lower() or clean_col.lower() in req_col.lower():
-                        found_columns[req_col] = col
-                        break
-            
-            # Verificar si encontramos todas las columnas
-            if len(found_columns) == len(required_columns):
-                # Renombrar columnas para estandarizar
-                rename_map = {v: k for k, v in found_columns.items()}
-                df = df.rename(columns=rename_map)
-                inventory_data = df[required_columns].to_dict('records')
-                
-                # AGREGAR METADATA DE TIPO Y VALIDAR ESTADO CRÍTICO
-                for item in inventory_data:
-                    item['_tipo_producto'] = 'impulsivo'
-                    
-                    # CRÍTICO: Si Bultos = 0 pero tiene Unidad > 0, marcar como SIN STOCK
-                    bultos = float(item.get('Bultos', 0) or 0)
-                    unidad = float(item.get('Unidad', 0) or 0)
-                    if bultos == 0 and unidad > 0:
-                        item['Estado Stock'] = 'SIN STOCK'  # Solo quedan unidades sueltas
-                
-                st.success(f"✅ {category_name} cargado: {len(inventory_data)} productos")
-                
-                # Mostrar resumen
-                with st.expander(f" Ver detalles de {category_name}"):
-                    st.dataframe(df, use_container_width=True)
-                    
-                    # Estadísticas
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric(" Total productos", len(df))
-                    with col2:
-                        total_bultos = df['Bultos'].sum()
-                        st.metric(" Total bultos", f"{total_bultos:.0f}")
-                    with col3:
-                        stock_bajo = len(df[df['Estado Stock'] == 'STOCK BAJO'])
-                        st.metric("⚠️ Stock bajo", f"{stock_bajo}")
-                    with col4:
-                        sin_stock = len(df[df['Estado Stock'] == 'SIN STOCK'])
-                        st.metric(" Sin stock", f"{sin_stock}")
-                
-                return inventory_data
+        result = import_inventory(uploaded_file, file_name, category_name)
+        
+        if not result.ok:
+            if result.formato == 'granel':
+                st.error(f" El archivo de Granel no tiene todas las columnas requeridas")
+                st.warning(f"Columnas encontradas: {list(result.found_columns.keys())}")
+                st.warning(f"Columnas necesarias: {result.required_columns}")
             else:
                 st.error(f" El archivo no tiene todas las columnas requeridas")
-                st.warning(f"Se encontraron {len(found_columns)} de {len(required_columns)} columnas:")
-                for req, found in found_columns.items():
+                st.warning(f"Se encontraron {len(result.found_columns)} de {len(result.required_columns)} columnas:")
+                for req, found in result.found_columns.items():
                     st.success(f"✓ {req} → encontrada como '{found}'")
-                missing = set(required_columns) - set(found_columns.keys())
-                for miss in missing:
+                for miss in result.missing_columns:
                     st.error(f"✗ {miss} → NO encontrada")
-                st.info("📋 Columnas disponibles en tu archivo:")
-                st.code(list(df.columns))
-                return None
+            st.info("📋 Columnas disponibles en tu archivo:")
+            st.code(result.available_columns)
+            return None
+        
+        inventory_data = result.records
+        df = result.frame
+        summary = result.summary
+        
+        if result.formato == 'granel':
+            st.success(f"✅ {category_name} cargado: {len(inventory_data)} productos (formato Granel)")
+            
+            # Mostrar resumen
+            with st.expander(f" Ver detalles de {category_name}"):
+                _show_import_preview(df, len(inventory_data))
+                
+                # Estadísticas (totales acumulados al importar)
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric(" Total productos", len(inventory_data))
+                with col2:
+                    st.metric(" Total cajas", f"{summary['total_bultos']:.0f}")
+                with col3:
+                    st.metric(" Total kg", f"{summary['total_kgs']:.1f}kg")
+                with col4:
+                    st.metric("⚠️ Stock bajo/medio", f"{summary['stock_bajo_medio']}")
+        else:
+            st.success(f"✅ {category_name} cargado: {len(inventory_data)} productos")
+            
+            # Mostrar resumen
+            with st.expander(f" Ver detalles de {category_name}"):
+                _show_import_preview(df, len(inventory_data))
+                
+                # Estadísticas (totales acumulados al importar)
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric(" Total productos", len(inventory_data))
+                with col2:
+                    st.metric(" Total bultos", f"{summary['total_bultos']:.0f}")
+                with col3:
+                    st.metric("⚠️ Stock bajo", f"{summary['stock_bajo']}")
+                with col4:
+                    st.metric(" Sin stock", f"{summary['sin_stock']}")
+        
+        return inventory_data
             
     except Exception as e:
         st.error(f" Error al leer el archivo: {str(e)}")
@@ -1098,11 +979,11 @@ class Pages:
                     if inventory_impulsivos:
                         current_inventory.extend(inventory_impulsivos)
                     if inventory_granel:
-                    current_inventory.extend(inventory_granel)
-                tipo_sugerencia = "ambos"
-                st.info("📋 Se generarán sugerencias para AMBOS tipos de productos")
-        else:
-            st.info("📋 Esperando que cargues al menos un archivo de inventario...")
+                        current_inventory.extend(inventory_granel)
+                    tipo_sugerencia = "ambos"
+                    st.info("📋 Se generarán sugerencias para AMBOS tipos de productos")
+            else:
+                st.info("📋 Esperando que cargues al menos un archivo de inventario...")
         
         st.divider()
         
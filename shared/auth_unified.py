@@ -8,6 +8,13 @@ import os
 import hashlib
 from datetime import datetime
 
+try:
+    from shared.data_cache import data_cache
+except ImportError:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from shared.data_cache import data_cache
+
 class AuthSystem:
     def __init__(self):
         self.users_file = os.path.join(os.path.dirname(__file__), '..', 'data', 'users.json')
@@ -45,8 +52,10 @@ class AuthSystem:
     def load_users(self):
         """Carga los usuarios del archivo JSON"""
         try:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            users = data_cache.load_json(self.users_file)
+            if users is None:
+                raise FileNotFoundError(self.users_file)
+            return users
         except (FileNotFoundError, json.JSONDecodeError):
             self.ensure_users_file()
             return self.load_users()
@@ -55,6 +64,7 @@ class AuthSystem:
         """Guarda los usuarios en el archivo JSON"""
         with open(self.users_file, 'w', encoding='utf-8') as f:
             json.dump(users_data, f, indent=2, ensure_ascii=False)
+        data_cache.invalidate(self.users_file)
     
     def authenticate(self, username, password):
         """Autentica un usuario"""
@@ -0,0 +1,104 @@
+"""
+Caché de lectura de archivos de datos compartida por toda la aplicación.
+
+Cada rerun de Streamlit vuelve a abrir y parsear los mismos JSON. Esta caché
+guarda el resultado parseado por proceso (compartido entre sesiones) y lo
+reutiliza mientras el archivo no cambie: la clave es la ruta + mtime + tamaño
++ una versión que los escritores incrementan con `invalidate()`.
+
+Los objetos devueltos son COMPARTIDOS y deben tratarse como de solo lectura.
+Quien necesite modificar los datos para luego guardarlos debe leer con
+`fresh=True` (lectura directa del disco) o copiar lo que vaya a modificar.
+"""
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+def _load_json_file(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+class FileDataCache:
+    """Caché de archivos parseados con invalidación por firma y versión"""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], Tuple[tuple, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path: Any) -> str:
+        return os.path.abspath(str(path))
+
+    def _signature(self, key: str) -> Optional[tuple]:
+        try:
+            st = os.stat(key)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, self._versions.get(key, 0))
+
+    def load(self, path: Any, loader: Callable[[str], Any] = _load_json_file,
+             default: Any = None, fresh: bool = False) -> Any:
+        """
+        Devuelve el contenido parseado de `path`.
+
+        Args:
+            path: Ruta del archivo
+            loader: Función que parsea el archivo (por defecto json.load)
+            default: Valor si el archivo no existe
+            fresh: Si es True, lee del disco sin usar ni poblar la caché
+        """
+        key = self._key(path)
+        if fresh:
+            return loader(key) if os.path.exists(key) else default
+
+        signature = self._signature(key)
+        if signature is None:
+            return default
+
+        entry_key = (key, getattr(loader, "__qualname__", repr(loader)))
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader(key)
+        with self._lock:
+            self._entries[entry_key] = (signature, value)
+        return value
+
+    def load_json(self, path: Any, default: Any = None, fresh: bool = False) -> Any:
+        """Atajo para archivos JSON"""
+        return self.load(path, _load_json_file, default, fresh)
+
+    def invalidate(self, path: Any):
+        """Los escritores llaman a esto después de modificar el archivo"""
+        key = self._key(path)
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            for entry_key in [k for k in self._entries if k[0] == key]:
+                del self._entries[entry_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos/fallos para medir el efecto en los reruns"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+# Instancia global compartida por todos los módulos
+data_cache = FileDataCache()
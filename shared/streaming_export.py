@@ -0,0 +1,213 @@
+"""
+Exportación a Excel y CSV por streaming para BusinessSuite.
+
+Las exportaciones armaban un DataFrame completo y lo escribían con
+pd.ExcelWriter en un BytesIO: los datos quedaban en memoria tres veces (los
+registros, el DataFrame y el archivo). Aquí las filas se escriben a medida
+que llegan de un iterador y el archivo se arma en un temporal que pasa a
+disco al superar SPOOL_MAX_MEMORIA. En memoria queda solo el archivo ya
+comprimido, como bytes (el tipo que acepta st.download_button).
+
+Excel usa xlsxwriter en modo constant_memory (cada fila se vuelca al disco
+apenas se escribe); si no está instalado, openpyxl en modo write_only.
+"""
+import csv
+import io
+import tempfile
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, Sequence
+
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
+
+try:
+    from openpyxl import Workbook as OpenpyxlWorkbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+# Hasta este tamaño el archivo se arma en memoria; después pasa a un temporal en disco
+SPOOL_MAX_MEMORIA = 4 * 1024 * 1024
+# Filas por escritura en CSV
+CSV_FILAS_POR_BLOQUE = 5_000
+
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MIME_CSV = "text/csv"
+
+# Formatos numéricos con nombre; también se acepta un formato de Excel literal
+FORMATOS = {
+    "entero": "#,##0",
+    "moneda": "#,##0",
+    "decimal": "#,##0.00",
+    "texto": "@",
+}
+
+
+@dataclass(frozen=True)
+class Columna:
+    """Columna de una hoja: título, ancho y formato se declaran una sola vez"""
+    titulo: str
+    ancho: Optional[float] = None
+    formato: Optional[str] = None  # clave de FORMATOS o formato de Excel
+
+
+@dataclass
+class Hoja:
+    """Hoja de cálculo; filas puede ser cualquier iterable (se recorre una sola vez)"""
+    nombre: str
+    columnas: Sequence[Columna]
+    filas: Iterable[Sequence[Any]]
+
+
+def filas_de_dataframe(df, filas_por_bloque: int = 10_000) -> Iterator[tuple]:
+    """
+    Filas de un DataFrame como tuplas, convirtiendo de a un bloque por vez
+
+    Los NaN/NaT quedan como celdas vacías, igual que con DataFrame.to_excel.
+    """
+    for inicio in range(0, len(df), filas_por_bloque):
+        bloque = df.iloc[inicio:inicio + filas_por_bloque]
+        bloque = bloque.astype(object).where(bloque.notna(), None)
+        yield from bloque.itertuples(index=False, name=None)
+
+
+def _archivo_temporal() -> BinaryIO:
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORIA)
+
+
+def _formato_excel(columna: Columna) -> Optional[str]:
+    if columna.formato is None:
+        return None
+    return FORMATOS.get(columna.formato, columna.formato)
+
+
+def _excel_xlsxwriter(hojas: Iterable[Hoja], archivo: BinaryIO):
+    workbook = xlsxwriter.Workbook(archivo, {
+        "constant_memory": True,
+        "nan_inf_to_errors": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    try:
+        encabezado = workbook.add_format({"bold": True})
+        formatos = {}
+        for hoja in hojas:
+            worksheet = workbook.add_worksheet(hoja.nombre[:31])
+            # En constant_memory los formatos de columna van antes de la primera fila
+            for i, columna in enumerate(hoja.columnas):
+                num_format = _formato_excel(columna)
+                if num_format and num_format not in formatos:
+                    formatos[num_format] = workbook.add_format({"num_format": num_format})
+                if columna.ancho is not None or num_format:
+                    worksheet.set_column(i, i, columna.ancho, formatos.get(num_format))
+            worksheet.write_row(0, 0, [columna.titulo for columna in hoja.columnas], encabezado)
+            for fila, valores in enumerate(hoja.filas, start=1):
+                worksheet.write_row(fila, 0, valores)
+    finally:
+        workbook.close()
+
+
+def _excel_openpyxl(hojas: Iterable[Hoja], archivo: BinaryIO):
+    workbook = OpenpyxlWorkbook(write_only=True)
+    negrita = Font(bold=True)
+    for hoja in hojas:
+        worksheet = workbook.create_sheet(hoja.nombre[:31])
+        # write_only no tiene formatos de columna: se aplican celda por celda
+        formatos = [_formato_excel(columna) for columna in hoja.columnas]
+        for i, columna in enumerate(hoja.columnas):
+            if columna.ancho is not None:
+                worksheet.column_dimensions[get_column_letter(i + 1)].width = columna.ancho
+
+        titulos = []
+        for columna in hoja.columnas:
+            celda = WriteOnlyCell(worksheet, value=columna.titulo)
+            celda.font = negrita
+            titulos.append(celda)
+        worksheet.append(titulos)
+
+        con_formato = [i for i, num_format in enumerate(formatos) if num_format]
+        for valores in hoja.filas:
+            if con_formato:
+                valores = list(valores)
+                for i in con_formato:
+                    if i < len(valores):
+                        celda = WriteOnlyCell(worksheet, value=valores[i])
+                        celda.number_format = formatos[i]
+                        valores[i] = celda
+            worksheet.append(valores)
+    workbook.save(archivo)
+
+
+def _contenido(escribir, *args, **kwargs) -> bytes:
+    """Escribe en un temporal y devuelve su contenido; el temporal se descarta"""
+    with _archivo_temporal() as archivo:
+        escribir(*args, destino=archivo, **kwargs)
+        archivo.seek(0)
+        return archivo.read()
+
+
+def escribir_excel(hojas: Iterable[Hoja], destino: BinaryIO):
+    """
+    Escribe las hojas en un archivo .xlsx abierto, fila por fila
+
+    Args:
+        hojas: Hojas a escribir, en orden
+        destino: Archivo binario abierto para escritura
+    """
+    if XLSXWRITER_AVAILABLE:
+        _excel_xlsxwriter(hojas, destino)
+    elif OPENPYXL_AVAILABLE:
+        _excel_openpyxl(hojas, destino)
+    else:
+        raise ImportError("Se necesita xlsxwriter u openpyxl para exportar a Excel")
+
+
+def exportar_excel(hojas: Iterable[Hoja]) -> bytes:
+    """
+    Archivo .xlsx con las hojas, escrito fila por fila en un temporal
+
+    Returns:
+        Contenido del archivo, listo para st.download_button
+    """
+    return _contenido(escribir_excel, hojas)
+
+
+def escribir_csv(columnas: Sequence[Columna], filas: Iterable[Sequence[Any]],
+                 destino: BinaryIO, separador: str = ",", encoding: str = "utf-8-sig"):
+    """
+    Escribe un CSV en un archivo binario abierto, por bloques de CSV_FILAS_POR_BLOQUE filas
+
+    El encoding por defecto incluye BOM para que Excel reconozca los acentos.
+    """
+    archivo = destino
+    texto = io.TextIOWrapper(archivo, encoding=encoding, newline="")
+    try:
+        writer = csv.writer(texto, delimiter=separador)
+        writer.writerow([columna.titulo for columna in columnas])
+        filas = iter(filas)
+        while True:
+            bloque = list(islice(filas, CSV_FILAS_POR_BLOQUE))
+            if not bloque:
+                break
+            writer.writerows(bloque)
+        texto.flush()
+    finally:
+        # Soltar el archivo sin cerrarlo: lo cierra quien lo abrió
+        texto.detach()
+
+
+def exportar_csv(columnas: Sequence[Columna], filas: Iterable[Sequence[Any]],
+                 separador: str = ",", encoding: str = "utf-8-sig") -> bytes:
+    """
+    CSV con las columnas y filas, escrito por bloques en un temporal
+
+    Returns:
+        Contenido del archivo, listo para st.download_button
+    """
+    return _contenido(escribir_csv, columnas, filas, separador=separador, encoding=encoding)